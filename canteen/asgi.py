@@ -10,7 +10,8 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
+from canteen.ws_auth import JWTAuthMiddlewareStack
+import orders.routing
 import tenants.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'canteen.settings')
@@ -21,8 +22,9 @@ application = ProtocolTypeRouter({
   "http": get_asgi_application(),
   
   # Rute WebSocket akan ditangani oleh URLRouter
-  "websocket": AuthMiddlewareStack(
+  # (access token JWT tanpa query database, fallback ke session)
+  "websocket": JWTAuthMiddlewareStack(
     URLRouter(
-      tenants.routing.websocket_urlpatterns
+      tenants.routing.websocket_urlpatterns + orders.routing.websocket_urlpatterns
     ))
 })
@@ -0,0 +1,157 @@
+import functools
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+# Read replica untuk query analitik (laporan, dashboard, daftar order besar).
+# Routing bersifat opt-in per view: hanya kode yang berjalan di dalam
+# read_from_replica() (lewat dekorator @replica_reads atau ReplicaReadMixin)
+# yang membaca dari alias 'replica'; semua tulis dan baca lainnya tetap ke
+# primary. Setelah user menulis (request non-GET), user itu di-pin ke primary
+# selama REPLICA_PIN_SECONDS agar perubahannya sendiri langsung terbaca
+# walau replica masih tertinggal (read-your-writes).
+PRIMARY_ALIAS = 'default'
+REPLICA_ALIAS = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+DEFAULT_PIN_SECONDS = 10
+DEFAULT_MAX_LAG_SECONDS = 5
+
+_reading_from_replica = ContextVar('reading_from_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def is_reading_from_replica():
+    return _reading_from_replica.get() and replica_configured()
+
+
+def replica_max_lag():
+    """Batas atas keterlambatan replica yang ditoleransi (timedelta)."""
+    return timedelta(seconds=getattr(settings, 'REPLICA_MAX_LAG_SECONDS', DEFAULT_MAX_LAG_SECONDS))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if is_reading_from_replica():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Eksplisit: instance yang dibaca dari replica tetap disimpan ke primary
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Kedua alias berisi data yang sama
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
+
+
+@contextmanager
+def read_from_replica():
+    token = _reading_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _reading_from_replica.reset(token)
+
+
+def _pin_key(user_id):
+    return f"db_primary_pin_{user_id}"
+
+
+def pin_to_primary(user):
+    """Arahkan baca user ini ke primary selama REPLICA_PIN_SECONDS."""
+    seconds = getattr(settings, 'REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+    try:
+        cache.set(_pin_key(user.pk), 1, timeout=seconds)
+    except Exception:
+        logger.warning(f"Gagal mencatat pin primary untuk user {user.pk}")
+
+
+def is_pinned_to_primary(user):
+    try:
+        return cache.get(_pin_key(user.pk)) is not None
+    except Exception:
+        # Status pin tidak diketahui: primary selalu benar
+        return True
+
+
+def should_use_replica(request):
+    if request.method not in SAFE_METHODS or not replica_configured():
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and is_pinned_to_primary(user):
+        return False
+    return True
+
+
+def _iterate_on_replica(content):
+    # Konten streaming dibaca setelah view selesai; setiap langkah iterasi
+    # dijalankan kembali di dalam konteks replica.
+    iterator = iter(content)
+    while True:
+        with read_from_replica():
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+def replica_reads(view_func):
+    """
+    Jalankan function view (di bawah @api_view, setelah autentikasi DRF) dengan
+    baca ke replica. StreamingHttpResponse ikut membaca dari replica.
+    """
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not should_use_replica(request):
+            return view_func(request, *args, **kwargs)
+        with read_from_replica():
+            response = view_func(request, *args, **kwargs)
+        if isinstance(response, StreamingHttpResponse):
+            response.streaming_content = _iterate_on_replica(response.streaming_content)
+        return response
+    return wrapper
+
+
+class ReplicaReadMixin:
+    """Mixin APIView: handler GET dijalankan dengan baca ke replica."""
+
+    def initial(self, request, *args, **kwargs):
+        # Autentikasi dan permission (di super().initial) tetap di primary
+        super().initial(request, *args, **kwargs)
+        if should_use_replica(request):
+            self._replica_token = _reading_from_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            self._replica_token = None
+            _reading_from_replica.reset(token)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReadYourWritesMiddleware:
+    """Pin user ke primary setelah setiap request tulis (POST/PUT/PATCH/DELETE)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF menyalin user hasil autentikasi (JWT/Token) ke request Django
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and user is not None and user.is_authenticated:
+            pin_to_primary(user)
+        return response
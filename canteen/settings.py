@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 from datetime import timedelta
 from pathlib import Path
+from celery.schedules import crontab
 import os
 from dotenv import load_dotenv
 
@@ -102,10 +103,23 @@ SIMPLE_JWT = {
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/1")
 CELERY_BEAT_SCHEDULE = {
+    # Jaring pengaman: expiry utama berjalan via task expire_order (ETA) per order
     'check_expired_orders_every_minute': {
         'task': 'orders.tasks.process_expired_orders', # <--- Pastikan nama ini sama persis dengan yang di tasks.py
         'schedule': 60.0,
     },
+    # Indeks popularitas menu: geser landmark peluruhan sekali sehari
+    'rebase_popularity_index_daily': {
+        'task': 'reports.tasks.rebase_popularity_index',
+        'schedule': 60.0 * 60 * 24,
+    },
+    # Tutup hari laporan kemarin (snapshot harian) setelah jendela pembayaran 10 menit
+    # order terakhir lewat (zona waktu Celery = TIME_ZONE); perubahan setelahnya
+    # menulis ulang snapshot hari itu (reports.snapshots)
+    'close_report_days_nightly': {
+        'task': 'reports.tasks.close_report_days_task',
+        'schedule': crontab(hour=0, minute=15),
+    },
 }
 
 MIDDLEWARE = [
@@ -120,7 +134,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'axes.middleware.AxesMiddleware'
+    'axes.middleware.AxesMiddleware',
+    'canteen.db_routers.ReadYourWritesMiddleware',
 ]
 
 ROOT_URLCONF = 'canteen.urls'
@@ -170,6 +185,26 @@ DATABASES = {
     }
 }
 
+# Read replica opsional untuk query analitik (lihat canteen.db_routers).
+# Aktif jika DB_REPLICA_HOST atau DB_REPLICA_NAME diisi; nilai lain mengikuti
+# primary. Untuk mencoba lokal dengan SQLite cukup DB_REPLICA_NAME=<file yang sama>.
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        # Saat test, replica menunjuk ke database test primary
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['canteen.db_routers.ReplicaRouter']
+# Lama user dibaca dari primary setelah menulis (read-your-writes)
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+# Perkiraan lag replica maksimum; token sinkronisasi order dimundurkan sebesar ini
+REPLICA_MAX_LAG_SECONDS = int(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -234,6 +269,14 @@ MEDIA_ROOT = BASE_DIR / 'media'
 MIDTRANS_IS_PRODUCTION = os.getenv('MIDTRANS_IS_PRODUCTION', 'False') == 'True'
 MIDTRANS_SERVER_KEY = os.getenv('MIDTRANS_SERVER_KEY')
 MIDTRANS_CLIENT_KEY = os.getenv('MIDTRANS_CLIENT_KEY')
+# Kosongkan untuk URL Snap resmi; isi mis. http://127.0.0.1:8765/snap/v1 untuk fake server lokal
+MIDTRANS_SNAP_BASE_URL = os.getenv('MIDTRANS_SNAP_BASE_URL', '')
+MIDTRANS_TIMEOUT = (
+    float(os.getenv('MIDTRANS_CONNECT_TIMEOUT', '3.05')),
+    float(os.getenv('MIDTRANS_READ_TIMEOUT', '10')),
+)
+# True: order TRANSFER langsung dikembalikan, snap token dibuat oleh Celery dan dibaca lewat meta.payment
+MIDTRANS_ASYNC_INITIATION = os.getenv('MIDTRANS_ASYNC_INITIATION', 'False') == 'True'
 
 AUTHENTICATION_BACKENDS = [
     'axes.backends.AxesBackend', # Harus di atas ModelBackend
@@ -269,6 +312,13 @@ CSRF_TRUSTED_ORIGINS = [
     o.strip() for o in os.getenv('CSRF_TRUSTED_ORIGINS', '').split(',') if o.strip()
 ]
 CORS_ALLOW_CREDENTIALS = True
+# Header Idempotency-Key dipakai frontend saat membuat order (lihat orders.idempotency)
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
+IDEMPOTENCY_RESPONSE_TIMEOUT = 60 * 15
+IDEMPOTENCY_LOCK_TIMEOUT = 15
+IDEMPOTENCY_LOCK_WAIT = 5
 
 # Konfigurasi Axes (Anti Brute-Force)
 AXES_FAILURE_LIMIT = 5
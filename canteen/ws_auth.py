@@ -0,0 +1,60 @@
+from urllib.parse import parse_qs
+from channels.auth import AuthMiddlewareStack
+from django.contrib.auth.models import AnonymousUser
+
+# Autentikasi WebSocket dengan access token SimpleJWT yang sama dengan API HTTP.
+# Token diverifikasi dari tanda tangan dan klaimnya saja (TokenUser), tanpa
+# query database. Browser tidak bisa mengirim header Authorization pada
+# WebSocket, jadi token bisa dikirim lewat:
+#   - subprotocol: new WebSocket(url, ['bearer', accessToken])
+#   - query string: ?access_token=<token>
+#   - header Authorization: Bearer <token> (klien non-browser)
+# Koneksi tanpa token tetap memakai session (AuthMiddlewareStack).
+JWT_SUBPROTOCOL = 'bearer'
+
+
+def _token_from_scope(scope):
+    """(token, subprotocol_yang_harus_diterima) atau (None, None)."""
+    subprotocols = scope.get('subprotocols') or []
+    if len(subprotocols) >= 2 and subprotocols[0] == JWT_SUBPROTOCOL:
+        return subprotocols[1], JWT_SUBPROTOCOL
+
+    params = parse_qs(scope.get('query_string', b'').decode())
+    if params.get('access_token'):
+        return params['access_token'][0], None
+
+    headers = dict(scope.get('headers', []))
+    auth_type, _, token = headers.get(b'authorization', b'').decode().partition(' ')
+    if auth_type == 'Bearer' and token:
+        return token, None
+    return None, None
+
+
+def get_token_user(raw_token):
+    """TokenUser dari access token yang valid, AnonymousUser jika tidak valid/kedaluwarsa."""
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.models import TokenUser
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    try:
+        return TokenUser(AccessToken(raw_token))
+    except TokenError:
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware:
+    def __init__(self, inner):
+        self.inner = inner
+        self.session_fallback = AuthMiddlewareStack(inner)
+
+    async def __call__(self, scope, receive, send):
+        raw_token, subprotocol = _token_from_scope(scope)
+        if raw_token is None:
+            return await self.session_fallback(scope, receive, send)
+        # Token tidak valid tidak jatuh ke session: koneksi diperlakukan anonim
+        scope = dict(scope, user=get_token_user(raw_token), auth_subprotocol=subprotocol)
+        return await self.inner(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    return JWTAuthMiddleware(inner)
@@ -1,10 +1,13 @@
 from django.urls import reverse
 from django.contrib.auth.models import User, Group
 from django.utils import timezone
+from unittest import mock
 from rest_framework.test import APITestCase
 from rest_framework import status
-from orders.models import Order, Customer
-from tenants.models import Tenant
+from orders.models import Order, OrderItem, Customer
+from orders.pins import hash_order_pin
+from orders.serializers import OrderSerializer
+from tenants.models import Tenant, MenuItem
 
 class CashierAPITests(APITestCase):
 
@@ -167,4 +170,72 @@ class CashierAPITests(APITestCase):
 
         # Cek status order di database telah diupdate menjadi EXPIRED
         expired_order.refresh_from_db()
-        self.assertEqual(expired_order.status, 'EXPIRED')
\ No newline at end of file
+        self.assertEqual(expired_order.status, 'EXPIRED')
+
+class VerifyOrderByHmacPinTests(APITestCase):
+    """Tes: Verifikasi PIN dengan skema HMAC (references_code + PIN)."""
+
+    def setUp(self):
+        self.cashier_user = User.objects.create_user(username='kasir_hmac', password='password123', is_staff=True)
+        self.tenant = Tenant.objects.create(name='Kantin HMAC')
+        self.order = Order.objects.create(
+            references_code='KNT-HMAC-0001',
+            tenant=self.tenant,
+            total=20000,
+            payment_method='CASH',
+            status='AWAITING_PAYMENT',
+            cashier_pin=hash_order_pin('KNT-HMAC-0001', '246810'),
+        )
+        self.url = reverse('cashier:verify-order-by-pin')
+
+    def test_verify_with_correct_pin(self):
+        self.client.force_authenticate(user=self.cashier_user)
+        response = self.client.post(self.url, {'references_code': 'KNT-HMAC-0001', 'pin': '246810'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['references_code'], 'KNT-HMAC-0001')
+
+    def test_verify_with_wrong_pin_increments_retry(self):
+        self.client.force_authenticate(user=self.cashier_user)
+        response = self.client.post(self.url, {'references_code': 'KNT-HMAC-0001', 'pin': '000000'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.meta['retry_count'], 1)
+
+    def test_pin_without_references_code_does_not_find_order(self):
+        self.client.force_authenticate(user=self.cashier_user)
+        response = self.client.post(self.url, {'pin': '246810'})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.order.refresh_from_db()
+        self.assertNotIn('retry_count', self.order.meta)
+
+
+class CashConfirmNotificationTests(APITestCase):
+    """Tes: Konfirmasi cash menserialisasi order sekali untuk respons dan notifikasi."""
+
+    def setUp(self):
+        self.cashier_user = User.objects.create_user(username='kasir_notif', password='password123', is_staff=True)
+        self.tenant = Tenant.objects.create(name='Kantin Notif')
+        self.order = Order.objects.create(tenant=self.tenant, total=20000, payment_method='CASH', status='AWAITING_PAYMENT')
+        for name in ('Es Teh', 'Nasi Goreng'):
+            menu = MenuItem.objects.create(tenant=self.tenant, name=name, price=10000, stock=10)
+            OrderItem.objects.create(order=self.order, menu_item=menu, qty=1, price=menu.price)
+        self.url = reverse('cashier:cash-confirm', args=[self.order.uuid])
+        publisher = mock.patch('orders.notifications.publish_tenant_event')
+        self.publish = publisher.start()
+        self.addCleanup(publisher.stop)
+
+    def test_confirm_serializes_once_for_response_and_notification(self):
+        self.client.force_authenticate(user=self.cashier_user)
+        with mock.patch('cashier.views.OrderSerializer', wraps=OrderSerializer) as serializer:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(serializer.call_count, 1)
+        self.publish.assert_called_once()
+        message = self.publish.call_args.args[1]
+        self.assertEqual(message['order'], response.data['order'])
+        self.assertEqual(len(response.data['order']['items']), 2)
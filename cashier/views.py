@@ -6,10 +6,11 @@ from rest_framework.response import Response
 from rest_framework.throttling import UserRateThrottle
 from rest_framework import status, generics
 from orders.models import Order
-from orders.tasks import send_order_paid_notification
+from orders.expiry import expire_orders
+from orders.notifications import schedule_paid_order_notification
 from orders.serializers import OrderSerializer
 from rest_framework.authentication import TokenAuthentication
-from django.contrib.auth.hashers import check_password
+from orders.pins import check_order_pin
 from rest_framework.permissions import IsAuthenticated
 from .permissions import IsCashierUser
 from channels.layers import get_channel_layer
@@ -33,9 +34,8 @@ class CashConfirmView(APIView):
     
     # Validasi awal: Cek status, metode pembayaran, dan kadaluwarsa
     if order.expired_at and timezone.now() > order.expired_at:
-      if order.status != "EXPIRED":
-        order.status = "EXPIRED"
-        order.save(update_fields=['status'])
+      # Expire lewat jalur set-based agar stok ikut dikembalikan
+      expire_orders([order.pk])
       return Response({"detail": "Order sudah kadaluarsa, silahkan buat order baru"}, status=status.HTTP_400_BAD_REQUEST)
 
     if order.payment_method != 'CASH':
@@ -46,8 +46,10 @@ class CashConfirmView(APIView):
     
     # Transaksi atomik untuk memastikan integritas data
     with transaction.atomic():
-      # Kunci order untuk mencegah race condition (SELECT FOR UPDATE)
-      order = Order.objects.select_for_update().get(pk=order.pk)
+      # Kunci order untuk mencegah race condition (SELECT FOR UPDATE); relasi
+      # serializer ikut dimuat agar respons dan notifikasi tidak memicu N+1.
+      # of=('self',): hanya baris order yang dikunci (join table/customer nullable)
+      order = Order.objects.with_detail_relations().select_for_update(of=('self',)).get(pk=order.pk)
       # Validasi ulang di dalam transaksi untuk keamanan
       if order.status.upper() != "AWAITING_PAYMENT":
         return Response({"detail": "Order sudah dibayar"}, status=status.HTTP_400_BAD_REQUEST)
@@ -64,12 +66,14 @@ class CashConfirmView(APIView):
       order.meta = meta
       order.save(update_fields=['status', 'paid_at', 'meta'])
 
-      # Panggil Celery task setelah transaksi berhasil lakukan
-      transaction.on_commit(lambda: send_order_paid_notification.delay(order.id))
+      # Serialisasi sekali, dipakai untuk notifikasi dapur (setelah commit,
+      # Celery hanya fallback) sekaligus respons
+      order_data = OrderSerializer(order).data
+      schedule_paid_order_notification(order, order_data)
 
     return Response({
       "detail": "Order dikonfirmasi lunas.",
-      "order": OrderSerializer(order).data,
+      "order": order_data,
     }, status=status.HTTP_200_OK)
 
 class VerifyPinThrottle(UserRateThrottle):
@@ -96,8 +100,7 @@ class VerifyOrderByPinView(APIView):
 
         # 6. Expiry Validation Ketat
         if order.expired_at and timezone.now() > order.expired_at:
-            order.status = "EXPIRED"
-            order.cancel_and_restock() # Langsung kembalikan stok
+            expire_orders([order.pk]) # Langsung kembalikan stok
             return Response({'detail': 'Pesanan sudah kadaluarsa.'}, status=400)
 
         # 5. PIN Retry Increment Logic
@@ -106,7 +109,7 @@ class VerifyOrderByPinView(APIView):
             security_logger.warning(f"Brute force detected on PIN for order {ref_code}")
             return Response({'detail': 'PIN terblokir karena terlalu banyak percobaan salah.'}, status=403)
 
-        if not check_password(pin, order.cashier_pin):
+        if not check_order_pin(order, pin):
             order.meta['retry_count'] = retry_count + 1
             order.save(update_fields=['meta'])
             return Response({'detail': f'PIN Salah. Sisa percobaan: {5 - order.meta["retry_count"]}'}, status=400)
@@ -0,0 +1,61 @@
+import json
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from .models import Order
+from .notifications import order_group_name
+from .permissions import check_order_token
+
+
+class OrderStatusConsumer(AsyncWebsocketConsumer):
+    """
+    Status satu order untuk guest, pengganti polling GET /api/orders/<uuid>/.
+    Autentikasi memakai token HMAC yang sama dengan header X-Order-Token,
+    dikirim lewat ?token= (browser tidak bisa mengatur header WebSocket) atau
+    header X-Order-Token untuk klien non-browser. Token diverifikasi tanpa
+    query database.
+    """
+
+    async def connect(self):
+        self.order_uuid = self.scope['url_route']['kwargs']['order_uuid']
+        if not check_order_token(self.order_uuid, self.get_token()):
+            await self.close()
+            return
+
+        self.group_name = order_group_name(self.order_uuid)
+        # Gabung grup dulu: transisi setelah snapshot di bawah pasti terkirim
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        snapshot = await self.get_status_snapshot()
+        if snapshot is None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.close()
+            return
+        await self.accept()
+        await self.send(text_data=json.dumps(snapshot))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    def get_token(self):
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        if params.get('token'):
+            return params['token'][0]
+        headers = dict(self.scope.get('headers', []))
+        return headers.get(b'x-order-token', b'').decode() or None
+
+    @database_sync_to_async
+    def get_status_snapshot(self):
+        order = Order.objects.filter(uuid=self.order_uuid).only('uuid', 'status', 'expired_at', 'updated_at').first()
+        if order is None:
+            return None
+        return {
+            'type': 'order_status',
+            'uuid': str(order.uuid),
+            'status': order.effective_status,
+            'updated_at': order.updated_at.isoformat() if order.updated_at else None,
+        }
+
+    # Transisi status dari orders.notifications
+    async def order_status(self, event):
+        await self.send(text_data=json.dumps(event['message']))
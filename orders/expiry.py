@@ -0,0 +1,123 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from tenants.stock import release_stock
+from .models import STATE_FIELDS, Order, OrderItem
+from .signals import order_changed
+
+# Jumlah order yang diproses per transaksi. Batch kecil menjaga lock
+# pada baris Order & MenuItem tetap singkat walau antrean expiry panjang.
+EXPIRY_BATCH_SIZE = 500
+
+
+def _expire_batch(order_ids):
+    """
+    Meng-expire satu batch order secara set-based di dalam transaksi yang
+    sedang berjalan. Mengembalikan Counter {tenant_id: jumlah_order}.
+    """
+    # Status hanya diubah jika order masih AWAITING_PAYMENT, sehingga
+    # order yang keburu dibayar/dibatalkan di transaksi lain tidak tersentuh.
+    expired_qs = Order.objects.filter(pk__in=order_ids, status='AWAITING_PAYMENT')
+    expired_rows = list(expired_qs.values(*STATE_FIELDS))
+    per_tenant = Counter(row['tenant_id'] for row in expired_rows)
+    if not per_tenant:
+        return per_tenant
+
+    restock = {
+        row['menu_item_id']: row['qty']
+        for row in OrderItem.objects.filter(order_id__in=order_ids)
+            .values('menu_item_id').annotate(qty=Sum('qty'))
+    }
+
+    # UPDATE massal tidak memicu auto_now: isi updated_at manual untuk delta-sync
+    now = timezone.now()
+    expired_qs.update(status='EXPIRED', stock_released=True, updated_at=now)
+    # UPDATE massal melewati save(): kirim hook perubahan (rollup laporan,
+    # notifikasi) sekali untuk seluruh batch
+    order_changed.send(
+        sender=Order, changes=[(row, {**row, 'status': 'EXPIRED'}) for row in expired_rows], updated_at=now
+    )
+
+    # Satu UPDATE teragregasi untuk semua MenuItem di batch ini
+    release_stock(restock)
+    return per_tenant
+
+
+def expire_due_orders(now=None, batch_size=EXPIRY_BATCH_SIZE):
+    """
+    Meng-expire semua order AWAITING_PAYMENT yang sudah melewati expired_at,
+    per batch. Aman dijalankan paralel oleh beberapa beat tick: setiap worker
+    mengunci kandidatnya dengan SKIP LOCKED sehingga batch tidak saling tumpang tindih.
+    """
+    now = now or timezone.now()
+    totals = Counter()
+    # Notifikasi semua batch digabung per tenant oleh debounce orders.notifications
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(status='AWAITING_PAYMENT', expired_at__lt=now)
+                .order_by('expired_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+            totals.update(_expire_batch(order_ids))
+        if len(order_ids) < batch_size:
+            break
+    return totals
+
+
+def expire_orders(order_ids, now=None):
+    """
+    Meng-expire order tertentu (jika memang sudah jatuh tempo) lewat jalur
+    set-based yang sama dengan beat task.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due_ids = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status='AWAITING_PAYMENT', expired_at__lt=now)
+            .values_list('id', flat=True)
+        )
+        if not due_ids:
+            return Counter()
+        return _expire_batch(due_ids)
+
+
+def _restock_quantities(orders):
+    return {
+        row['menu_item_id']: row['qty']
+        for row in OrderItem.objects.filter(order__in=orders).values('menu_item_id').annotate(qty=Sum('qty'))
+    }
+
+
+def restock_legacy_expired(batch_size=EXPIRY_BATCH_SIZE, dry_run=False):
+    """
+    Data fix sekali jalan: order EXPIRED yang ditulis versi lama (jalur baca
+    menandai EXPIRED tanpa mengembalikan stok) dikembalikan stoknya dan ditandai
+    stock_released, per batch. Order yang di-expire mesin di atas sudah
+    bertanda, jadi aman dijalankan ulang. Mengembalikan (jumlah_order, {menu_id: qty}).
+    """
+    legacy = Order.objects.filter(status='EXPIRED', stock_released=False)
+    if dry_run:
+        return legacy.count(), _restock_quantities(legacy)
+
+    total_orders, restocked = 0, Counter()
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                legacy.select_for_update(skip_locked=True).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+            restock = _restock_quantities(order_ids)
+            # Hanya penanda, status tidak berubah: tanpa hook order_changed
+            Order.objects.filter(pk__in=order_ids).update(stock_released=True)
+            release_stock(restock)
+        total_orders += len(order_ids)
+        restocked.update(restock)
+        if len(order_ids) < batch_size:
+            break
+    return total_orders, dict(restocked)
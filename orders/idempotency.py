@@ -0,0 +1,123 @@
+import functools
+import hashlib
+import json
+import logging
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# Header Idempotency-Key: retry dengan key & body yang sama dalam jendela waktu
+# ini mendapat respons 201 yang tersimpan di Redis tanpa menyentuh database.
+# Key di-scope ke pemilik: user login, atau untuk guest ke tenant tujuan. Guest
+# tidak punya identitas yang pasti ikut di setiap percobaan (double-tap atau
+# retry setelah respons hilang belum menerima cookie apa pun), jadi yang
+# mengikat percobaan adalah Idempotency-Key acak dari klien itu sendiri;
+# respons tersimpan hanya diputar ulang bila fingerprint body juga sama.
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+DEFAULT_RESPONSE_TIMEOUT = 60 * 15
+DEFAULT_LOCK_TIMEOUT = 15
+DEFAULT_LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.1
+
+
+def _owner(request):
+    """Pemilik key idempotency: user login, atau tenant tujuan untuk guest."""
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"guest:{request.data.get('tenant')}"
+
+
+def _cache_key(scope, owner, key):
+    # Di-scope ke pemilik agar key yang sama dari klien berbeda tidak saling bertabrakan
+    digest = hashlib.sha256(f"{scope}:{owner}:{key}".encode()).hexdigest()
+    return f"idempotency_{digest}"
+
+
+def _fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _replay(stored):
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _mismatch():
+    return Response(
+        {'detail': 'Idempotency-Key sudah dipakai untuk permintaan dengan isi berbeda.'},
+        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
+
+
+def idempotent(scope):
+    """
+    Decorator untuk method view POST. Tanpa header Idempotency-Key perilaku
+    view tidak berubah. Permintaan duplikat yang datang bersamaan menunggu
+    lock singkat lalu memutar ulang respons yang disimpan oleh permintaan pertama.
+    Hanya respons 201 yang disimpan; respons gagal boleh dicoba ulang.
+    """
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.META.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+            if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return Response({'detail': 'Idempotency-Key terlalu panjang.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            response_key = _cache_key(scope, _owner(request), key)
+            lock_key = f"lock_{response_key}"
+            lock_token = uuid.uuid4().hex
+            fingerprint = _fingerprint(request.data)
+            response_timeout = getattr(settings, 'IDEMPOTENCY_RESPONSE_TIMEOUT', DEFAULT_RESPONSE_TIMEOUT)
+            lock_timeout = getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+            lock_wait = getattr(settings, 'IDEMPOTENCY_LOCK_WAIT', DEFAULT_LOCK_WAIT)
+
+            try:
+                stored = cache.get(response_key)
+                if stored is None:
+                    deadline = time.monotonic() + lock_wait
+                    while not cache.add(lock_key, lock_token, timeout=lock_timeout):
+                        # Permintaan kembar sedang diproses: tunggu hasilnya
+                        if time.monotonic() >= deadline:
+                            return Response(
+                                {'detail': 'Permintaan dengan Idempotency-Key ini sedang diproses.'},
+                                status=status.HTTP_409_CONFLICT
+                            )
+                        time.sleep(LOCK_POLL_INTERVAL)
+                        stored = cache.get(response_key)
+                        if stored is not None:
+                            break
+            except Exception:
+                # Redis bermasalah: tetap layani order, hanya tanpa perlindungan duplikat
+                logger.warning("Cache idempotency tidak tersedia, memproses tanpa Idempotency-Key.")
+                return view_method(self, request, *args, **kwargs)
+
+            if stored is not None:
+                if stored['fingerprint'] != fingerprint:
+                    return _mismatch()
+                return _replay(stored)
+
+            try:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code == status.HTTP_201_CREATED:
+                    cache.set(response_key, {
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'data': response.data,
+                    }, timeout=response_timeout)
+                return response
+            finally:
+                # Hanya pemilik yang melepas lock: permintaan yang melewati
+                # lock_timeout tidak boleh menghapus lock permintaan berikutnya
+                if cache.get(lock_key) == lock_token:
+                    cache.delete(lock_key)
+        return wrapper
+    return decorator
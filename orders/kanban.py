@@ -0,0 +1,56 @@
+from django.db.models import F
+from .models import OrderItem
+
+# Proyeksi datar untuk papan kanban (GET /api/orders/?view=kanban).
+# Hanya kolom yang ditampilkan kartu kanban; meta, cashier_pin, deskripsi
+# dan gambar menu tidak pernah dimuat. Jumlah query tetap per halaman:
+# order, item, dan varian terpilih masing-masing satu query.
+KANBAN_ORDER_FIELDS = (
+    'id', 'uuid', 'references_code', 'payment_method', 'order_type',
+    'total', 'created_at', 'updated_at', 'paid_at', 'expired_at', 'tenant_id',
+)
+
+
+def kanban_queryset(queryset):
+    if 'annotated_status' not in queryset.query.annotations:
+        queryset = queryset.with_effective_status()
+    return queryset.prefetch_related(None).values(
+        *KANBAN_ORDER_FIELDS,
+        'annotated_status',
+        tenant_name=F('tenant__name'),
+        table_code=F('table__code'),
+        customer_name=F('customer__name'),
+    )
+
+
+def build_kanban_rows(orders):
+    """Lengkapi satu halaman baris order (dict) dengan item dan varian terpilihnya."""
+    orders = list(orders)
+    if not orders:
+        return []
+
+    items_by_order = {}
+    items_by_id = {}
+    item_rows = OrderItem.objects.filter(order_id__in=[o['id'] for o in orders]).values(
+        'id', 'order_id', 'menu_item_id', 'qty', 'price', 'note', menu_item_name=F('menu_item__name')
+    ).order_by('id')
+    for item in item_rows:
+        item['price'] = str(item['price'])
+        item['variants'] = []
+        items_by_id[item['id']] = item
+        items_by_order.setdefault(item.pop('order_id'), []).append(item)
+
+    if items_by_id:
+        variant_rows = OrderItem.selected_variants.through.objects.filter(
+            orderitem_id__in=items_by_id.keys()
+        ).values_list('orderitem_id', 'variantoption_id', 'variantoption__name', 'variantoption__price')
+        for orderitem_id, option_id, name, price in variant_rows:
+            items_by_id[orderitem_id]['variants'].append({'id': option_id, 'name': name, 'price': str(price)})
+
+    rows = []
+    for order in orders:
+        order['status'] = order.pop('annotated_status')
+        order['total'] = str(order['total'])
+        order['items'] = items_by_order.get(order['id'], [])
+        rows.append(order)
+    return rows
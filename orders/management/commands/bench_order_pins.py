@@ -0,0 +1,63 @@
+import statistics
+import time
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+from orders.models import generate_order_pin, generate_references_code
+from orders.pins import check_order_pin, hash_order_pin
+
+
+class _PinnedOrder:
+    """Objek ringan pengganti Order untuk benchmark tanpa database."""
+    def __init__(self, references_code, cashier_pin):
+        self.references_code = references_code
+        self.cashier_pin = cashier_pin
+
+
+class Command(BaseCommand):
+    help = "Bandingkan biaya CPU skema PIN kasir lama (PBKDF2) dan baru (HMAC) pada laju order tertentu."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate', type=int, default=100, help="Target order per detik (default: 100)")
+        parser.add_argument('--orders', type=int, default=50, help="Jumlah sampel order per skema")
+
+    def _measure(self, issue, verify, samples):
+        issue_times, verify_times = [], []
+        for _ in range(samples):
+            references_code = generate_references_code()
+            pin = generate_order_pin()
+
+            start = time.perf_counter()
+            order = _PinnedOrder(references_code, issue(references_code, pin))
+            issue_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            assert verify(order, pin)
+            verify_times.append(time.perf_counter() - start)
+        return issue_times, verify_times
+
+    def _report(self, label, issue_times, verify_times, rate):
+        def ms(values, q=None):
+            if q is None:
+                return statistics.mean(values) * 1000
+            return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+        # Beban CPU satu worker untuk membuat + memverifikasi `rate` order per detik
+        cpu_per_second = (statistics.mean(issue_times) + statistics.mean(verify_times)) * rate
+        self.stdout.write(
+            f"{label:<8} issue mean={ms(issue_times):9.3f}ms p95={ms(issue_times, 95):9.3f}ms | "
+            f"verify mean={ms(verify_times):9.3f}ms p95={ms(verify_times, 95):9.3f}ms | "
+            f"CPU @ {rate} order/s = {cpu_per_second * 100:7.1f}% satu core"
+        )
+
+    def handle(self, *args, **options):
+        rate, samples = options['rate'], max(options['orders'], 2)
+
+        legacy = self._measure(
+            lambda ref, pin: make_password(pin),
+            lambda order, pin: check_password(pin, order.cashier_pin),
+            samples,
+        )
+        hmac_scheme = self._measure(hash_order_pin, check_order_pin, samples)
+
+        self._report("PBKDF2", *legacy, rate)
+        self._report("HMAC", *hmac_scheme, rate)
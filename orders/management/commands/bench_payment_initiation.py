@@ -0,0 +1,69 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from orders.payments import create_snap_transaction
+from .fake_snap_server import start_fake_snap_server
+
+
+def _payload(i):
+    return {
+        "transaction_details": {"order_id": f"BENCH-{i}", "gross_amount": 25000},
+        "item_details": [{"id": 1, "price": 25000, "quantity": 1, "name": "Menu Bench"}],
+        "customer_details": {"first_name": "Bench", "email": "bench@example.com"},
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Bandingkan inisiasi Snap lama (midtransclient.Snap baru per order, tanpa keep-alive) "
+        "dengan client ter-pool (orders.payments) terhadap fake Snap server lokal."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--latency', type=float, default=0.02, help="Latensi buatan gateway (detik)")
+
+    def _legacy(self, base_url):
+        import midtransclient
+
+        def call(i):
+            snap = midtransclient.Snap(
+                is_production=False,
+                server_key=settings.MIDTRANS_SERVER_KEY or '',
+                client_key=settings.MIDTRANS_CLIENT_KEY or '',
+            )
+            snap.api_config.SNAP_SANDBOX_BASE_URL = base_url
+            return snap.create_transaction(_payload(i))
+        return call
+
+    def _pooled(self, base_url):
+        def call(i):
+            return create_snap_transaction(_payload(i), base_url=base_url)
+        return call
+
+    def _run(self, label, call, total, concurrency):
+        def timed(i):
+            start = time.perf_counter()
+            call(i)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, range(total)))
+        elapsed = time.perf_counter() - start
+        p95 = statistics.quantiles(latencies, n=100)[94] * 1000
+        self.stdout.write(
+            f"{label:<8} {total / elapsed:8.1f} req/s | mean={statistics.mean(latencies) * 1000:7.2f}ms "
+            f"p95={p95:7.2f}ms"
+        )
+
+    def handle(self, *args, **options):
+        server, base_url = start_fake_snap_server(latency=options['latency'])
+        try:
+            for label, factory in (('legacy', self._legacy), ('pooled', self._pooled)):
+                self._run(label, factory(base_url), options['requests'], options['concurrency'])
+        finally:
+            server.shutdown()
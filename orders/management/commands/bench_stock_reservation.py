@@ -0,0 +1,90 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from tenants.models import Tenant, MenuItem
+from tenants.stock import reserve_stock, InsufficientStock
+
+
+def _reserve_with_lock(tenant_id, menu_item_id, qty):
+    """Jalur lama: SELECT ... FOR UPDATE, cek stok di Python, lalu tulis ulang."""
+    menu_item = MenuItem.objects.select_for_update().get(pk=menu_item_id, tenant_id=tenant_id)
+    if not menu_item.available or menu_item.stock < qty:
+        raise InsufficientStock(menu_item_id)
+    menu_item.stock -= qty
+    MenuItem.objects.bulk_update([menu_item], ['stock'])
+
+
+def _reserve_conditional(tenant_id, menu_item_id, qty):
+    reserve_stock(tenant_id, {menu_item_id: qty})
+
+
+STRATEGIES = {
+    'lock': _reserve_with_lock,
+    'conditional': _reserve_conditional,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Stress test reservasi stok: banyak thread berebut satu menu. Membandingkan "
+        "jalur SELECT FOR UPDATE lama dengan UPDATE bersyarat (tenants.stock). "
+        "Jalankan di PostgreSQL; SQLite mengunci seluruh database saat menulis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=50, help="Percobaan order per thread")
+        parser.add_argument('--stock', type=int, default=500, help="Stok awal menu yang diperebutkan")
+
+    def _run(self, strategy, threads, attempts, stock):
+        tenant = Tenant.objects.create(name=f"Bench Stok {strategy}", active=True)
+        menu_item = MenuItem.objects.create(tenant=tenant, name="Menu Bench", price=1000, stock=stock)
+        reserve = STRATEGIES[strategy]
+        counts = {'ok': 0, 'sold_out': 0, 'error': 0}
+        counts_lock = threading.Lock()
+
+        def worker():
+            local = {'ok': 0, 'sold_out': 0, 'error': 0}
+            try:
+                for _ in range(attempts):
+                    try:
+                        with transaction.atomic():
+                            reserve(tenant.pk, menu_item.pk, 1)
+                        local['ok'] += 1
+                    except InsufficientStock:
+                        local['sold_out'] += 1
+                    except DatabaseError:
+                        local['error'] += 1
+            finally:
+                connection.close()
+                with counts_lock:
+                    for key, value in local.items():
+                        counts[key] += value
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        final_stock = MenuItem.objects.values_list('stock', flat=True).get(pk=menu_item.pk)
+        oversell = max(counts['ok'] - stock, 0) + max(-final_stock, 0)
+        consistent = final_stock == stock - counts['ok']
+        menu_item.delete()
+        tenant.delete()
+
+        total = threads * attempts
+        self.stdout.write(
+            f"{strategy:<12} {total / elapsed:9.1f} percobaan/s | terjual={counts['ok']} "
+            f"habis={counts['sold_out']} error={counts['error']} | sisa stok={final_stock} "
+            f"oversell={oversell} konsisten={'ya' if consistent else 'TIDAK'}"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stderr.write("Peringatan: SQLite tidak mendukung SELECT FOR UPDATE; hasil tidak representatif.")
+        for strategy in STRATEGIES:
+            self._run(strategy, options['threads'], options['attempts'], options['stock'])
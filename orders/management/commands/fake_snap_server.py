@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+
+
+class FakeSnapHandler(BaseHTTPRequestHandler):
+    """Tiruan endpoint POST /snap/v1/transactions milik Midtrans untuk uji & benchmark offline."""
+
+    # HTTP/1.1 agar klien bisa memakai ulang koneksi (keep-alive)
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def _send_json(self, status_code, data):
+        body = json.dumps(data).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        if not self.path.rstrip('/').endswith('/transactions'):
+            return self._send_json(404, {'error_messages': ['Not found']})
+        try:
+            payload = json.loads(raw or b'{}')
+            order_id = payload['transaction_details']['order_id']
+        except (ValueError, KeyError, TypeError):
+            return self._send_json(400, {'error_messages': ['transaction_details.order_id is required']})
+
+        if self.latency:
+            time.sleep(self.latency)
+        token = uuid.uuid4().hex
+        self.server.transactions += 1
+        return self._send_json(201, {
+            'token': token,
+            'redirect_url': f"http://{self.headers.get('Host')}/snap/v2/vtweb/{token}",
+            'order_id': order_id,
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_snap_server(host='127.0.0.1', port=0, latency=0.0):
+    """Jalankan fake server di thread latar. Mengembalikan (server, base_url)."""
+    handler = type('ConfiguredFakeSnapHandler', (FakeSnapHandler,), {'latency': latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.transactions = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/snap/v1"
+
+
+class Command(BaseCommand):
+    help = (
+        "Jalankan fake Midtrans Snap server lokal. Arahkan aplikasi ke sana dengan "
+        "MIDTRANS_SNAP_BASE_URL=http://127.0.0.1:<port>/snap/v1"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0, help="Latensi buatan per transaksi (detik)")
+
+    def handle(self, *args, **options):
+        server, base_url = start_fake_snap_server(options['host'], options['port'], options['latency'])
+        self.stdout.write(f"Fake Snap server berjalan di {base_url} (Ctrl+C untuk berhenti)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from orders.expiry import EXPIRY_BATCH_SIZE, restock_legacy_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Kembalikan stok order EXPIRED dari versi lama, yang ditandai EXPIRED oleh "
+        "jalur baca tanpa restock. Jalankan sekali setelah deploy mesin expiry; "
+        "order yang sudah dikembalikan stoknya (stock_released) dilewati sehingga "
+        "aman dijalankan ulang."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Hanya tampilkan jumlah, tanpa menulis")
+
+    def handle(self, *args, **options):
+        orders, restocked = restock_legacy_expired(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        for menu_item_id, qty in sorted(restocked.items()):
+            self.stdout.write(f"  menu {menu_item_id}: +{qty}")
+        verb = "akan dikembalikan" if options['dry_run'] else "dikembalikan"
+        self.stdout.write(self.style.SUCCESS(f"Stok {orders} order EXPIRED lama {verb}."))
@@ -1,14 +1,25 @@
 from django.db import models
-from django.db.models import Sum, F, DecimalField
+from django.db.models import Sum, F, DecimalField, Case, When, Value, CharField
+from django.db.models.functions import Now
 from django.utils import timezone
 from datetime import timedelta
 from django.db import transaction
 from tenants.models import Tenant, MenuItem, VariantOption
+from tenants.stock import release_stock
+from .signals import order_changed, order_items_changed
 import uuid
 import secrets
 import string
 from django.conf import settings
 
+# State order yang diteruskan ke hook order_changed (orders.signals): field
+# bucket rollup laporan, plus identitas untuk notifikasi dan cache laporan.
+STATE_FIELDS = (
+  'id', 'uuid', 'references_code', 'customer_id', 'tenant_id', 'status', 'payment_method', 'total', 'created_at',
+)
+# State item order untuk hook order_items_changed (rollup menu laporan)
+ITEM_STATE_FIELDS = ('id', 'order_id', 'menu_item_id', 'qty', 'price')
+
 def generate_references_code(prefix="KNT"):
     ts = timezone.now().strftime("%Y%m%d%H%M%S")
     # Gunakan secrets agar kriptografis aman dan ID tidak bisa ditebak
@@ -35,6 +46,29 @@ class Customer(models.Model):
   def __str__(self):
     return self.phone
   
+class OrderQuerySet(models.QuerySet):
+  def with_effective_status(self):
+    """
+    Anotasi status efektif langsung di query: order AWAITING_PAYMENT yang sudah
+    lewat expired_at dibaca sebagai EXPIRED tanpa perlu menulis ke database.
+    Transisi sebenarnya tetap dijalankan oleh task expiry di background.
+    """
+    return self.annotate(
+      annotated_status=Case(
+        When(status='AWAITING_PAYMENT', expired_at__lt=Now(), then=Value('EXPIRED')),
+        default=F('status'),
+        output_field=CharField(),
+      )
+    )
+
+  def with_detail_relations(self):
+    """Relasi yang dibutuhkan OrderSerializer, dimuat dengan jumlah query tetap."""
+    return self.select_related('tenant', 'table', 'customer').prefetch_related(
+      'items__menu_item__tenant',
+      'items__menu_item__variant_groups__options',
+      'items__selected_variants',
+    )
+
 class Order(models.Model):
   
   ORDER_TYPE_CHOICES = [('DINE_IN', 'Dine-In'), ('TAKEAWAY', 'Takeaway')]
@@ -57,17 +91,90 @@ class Order(models.Model):
   total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
   created_at = models.DateTimeField(auto_now_add=True, db_index=True)
   paid_at = models.DateTimeField(null=True, blank=True)
+  # True setelah stok item dikembalikan (orders.expiry / cancel_and_restock).
+  # Order EXPIRED dari versi lama ditulis jalur baca tanpa restock dan bernilai
+  # False: pulihkan dengan `manage.py restock_legacy_expired_orders`.
+  stock_released = models.BooleanField(default=False)
+  # High-water mark delta-sync papan order (orders.sync); UPDATE massal wajib ikut mengisinya
+  updated_at = models.DateTimeField(auto_now=True, db_index=True)
   meta = models.JSONField(default=dict, blank=True)
+
+  objects = OrderQuerySet.as_manager()
   
   class Meta:
     ordering = ['-created_at']
     # [PERBAIKAN COMPOSITE INDEX]: Tambahkan index gabungan untuk status dan created_at
     indexes = [
         models.Index(fields=['status', 'created_at']),
+        # Paginasi keyset per tenant: WHERE tenant_id = ? ORDER BY created_at DESC, id DESC
+        models.Index(fields=['tenant', '-created_at', '-id'], name='order_tenant_created_id_idx'),
+        # Delta-sync per tenant: WHERE tenant_id IN (...) AND updated_at >= ?
+        models.Index(fields=['tenant', 'updated_at'], name='order_tenant_updated_idx'),
     ]
     
   def __str__(self):
     return f"{self.references_code} ({self.tenant.name})"
+
+  @classmethod
+  def from_db(cls, db, field_names, values):
+    instance = super().from_db(db, field_names, values)
+    # State saat dimuat menjadi state lama untuk hook save, tanpa membaca ulang baris
+    instance._saved_state = instance.state() if set(STATE_FIELDS) <= set(field_names) else None
+    return instance
+
+  def refresh_from_db(self, using=None, fields=None, **kwargs):
+    super().refresh_from_db(using=using, fields=fields, **kwargs)
+    loaded_all = fields is None and not (self.get_deferred_fields() & set(STATE_FIELDS))
+    self._saved_state = self.state() if loaded_all else None
+
+  def state(self):
+    return {field: getattr(self, field) for field in STATE_FIELDS}
+
+  def lock_state(self):
+    """Kunci baris order dan jadikan isinya state lama untuk save berikutnya."""
+    self._saved_state = Order.objects.select_for_update().filter(pk=self.pk).values(*STATE_FIELDS).first()
+    return self._saved_state
+
+  def _old_state(self):
+    if self._state.adding:
+      return None
+    if getattr(self, '_saved_state', None) is None:
+      # Instance tidak dimuat utuh dari database (field state di-defer)
+      self._saved_state = Order.objects.filter(pk=self.pk).values(*STATE_FIELDS).first()
+    return self._saved_state
+
+  def _new_state(self, old_state, update_fields):
+    """State setelah save: save(update_fields=...) hanya menulis field yang disebut."""
+    state = self.state()
+    if old_state is None or update_fields is None:
+      return state
+    written = {self._meta.get_field(name).attname for name in update_fields}
+    return {field: state[field] if field in written else old_state[field] for field in STATE_FIELDS}
+
+  def save(self, *args, **kwargs):
+    # auto_now hanya ditulis jika field-nya ikut disimpan; save(update_fields=[...])
+    # tetap harus menaikkan updated_at agar perubahan terlihat oleh delta-sync.
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'updated_at' not in update_fields:
+      kwargs['update_fields'] = [*update_fields, 'updated_at']
+    old_state = self._old_state()
+    if old_state is not None and self._new_state(old_state, update_fields) == old_state:
+      # Tidak ada field state yang berubah (meta, paid_at, ...): tanpa hook, tanpa transaksi
+      super().save(*args, **kwargs)
+      return
+    # Satu transaksi dengan penerima hook (rollup laporan ditulis di dalamnya)
+    with transaction.atomic():
+      super().save(*args, **kwargs)
+      new_state = self._new_state(old_state, update_fields)
+      order_changed.send(sender=Order, changes=[(old_state, new_state)], updated_at=self.updated_at)
+    self._saved_state = new_state
+
+  @property
+  def effective_status(self):
+    """Padanan in-memory dari OrderQuerySet.with_effective_status() untuk serializer."""
+    if self.status == 'AWAITING_PAYMENT' and self.expired_at and timezone.now() > self.expired_at:
+      return 'EXPIRED'
+    return self.status
   
   def calculate_total(self):
     aggregated = self.items.aggregate(
@@ -81,7 +188,14 @@ class Order(models.Model):
         
         # Point 6: Gunakan update() ketimbang save() agar lebih ringan 
         # dan tidak memicu sinyal pre_save/post_save yang tidak perlu
-    Order.objects.filter(pk=self.pk).update(total=new_total)
+    with transaction.atomic():
+      old_state = self.lock_state()
+      updated_at = timezone.now()
+      Order.objects.filter(pk=self.pk).update(total=new_total, updated_at=updated_at)
+      # UPDATE langsung melewati save(): kirim hook perubahan secara manual
+      if old_state:
+        self._saved_state = {**old_state, 'total': new_total}
+        order_changed.send(sender=Order, changes=[(old_state, self._saved_state)], updated_at=updated_at)
     self.total = new_total # Update instance di memori agar tetap sinkron
         
     return self.total
@@ -90,13 +204,26 @@ class Order(models.Model):
     if self.status not in ['AWAITING_PAYMENT', 'EXPIRED']:
       return False
     with transaction.atomic():
-      order_items = self.items.select_related('menu_item').all()
-      menu_items_to_restock = {item.menu_item.id: item.menu_item for item in order_items}
-      for item in order_items:
-        menu_items_to_restock[item.menu_item.id].stock += item.qty
-      MenuItem.objects.bulk_update(menu_items_to_restock.values(), ['stock'])
+      # Kunci ulang order agar tidak balapan dengan mesin expiry (orders.expiry);
+      # state terkunci ini juga menjadi state lama untuk hook save di bawah
+      locked = self.lock_state()
+      if locked is None:
+        return False
+      current_status = locked['status']
+      if current_status not in ['AWAITING_PAYMENT', 'EXPIRED']:
+        self.status = current_status
+        return False
+      # Order yang di-expire mesin expiry stoknya sudah dikembalikan; EXPIRED
+      # lama (tanpa restock) belum, jadi yang menentukan adalah penandanya
+      if not Order.objects.filter(pk=self.pk).values_list('stock_released', flat=True).get():
+        # Increment atomik (stock = stock + qty), pasangan dari reserve_stock()
+        release_stock({
+          row['menu_item_id']: row['total_qty']
+          for row in self.items.values('menu_item_id').annotate(total_qty=Sum('qty'))
+        })
       self.status = 'CANCELLED'
-      self.save(update_fields=['status'])
+      self.stock_released = True
+      self.save(update_fields=['status', 'stock_released'])
     return True
   
 class OrderItem(models.Model):
@@ -109,11 +236,37 @@ class OrderItem(models.Model):
   
   def __str__(self):
     return f"{self.menu_item.name} x{self.qty} ({self.order.references_code})"
-  
+
+  @classmethod
+  def from_db(cls, db, field_names, values):
+    instance = super().from_db(db, field_names, values)
+    instance._saved_state = instance.state() if set(ITEM_STATE_FIELDS) <= set(field_names) else None
+    return instance
+
+  def state(self):
+    return {field: getattr(self, field) for field in ITEM_STATE_FIELDS}
+
+  def _old_state(self):
+    if self._state.adding:
+      return None
+    if getattr(self, '_saved_state', None) is None:
+      self._saved_state = OrderItem.objects.filter(pk=self.pk).values(*ITEM_STATE_FIELDS).first()
+    return self._saved_state
+
   def save(self, *args, **kwargs):
     if not self.price:
       self.price = self.menu_item.price
-    super().save(*args, **kwargs)
+    update_fields = kwargs.get('update_fields')
+    old_state = self._old_state()
+    with transaction.atomic():
+      super().save(*args, **kwargs)
+      new_state = self.state()
+      if old_state is not None and update_fields is not None:
+        written = {self._meta.get_field(name).attname for name in update_fields}
+        new_state = {field: new_state[field] if field in written else old_state[field] for field in ITEM_STATE_FIELDS}
+      if new_state != old_state:
+        order_items_changed.send(sender=OrderItem, changes=[(old_state, new_state)])
+    self._saved_state = new_state
   
   def get_subtotal(self):
     total_variant_price = sum(variant.price for variant in self.selected_variants.all())
@@ -0,0 +1,236 @@
+import json
+import logging
+from collections import defaultdict
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django_redis import get_redis_connection
+from tenants.notifications import publish_tenant_event
+
+logger = logging.getLogger(__name__)
+
+# Notifikasi realtime untuk SETIAP transisi status order (dibuat, dibayar,
+# diproses, dibatalkan, expired, ...). Dashboard menerima delta ringkas,
+# bukan OrderSerializer penuh, sehingga tidak perlu polling lagi.
+# Transisi di-debounce per tenant: setelah commit delta hanya ditambahkan ke
+# buffer Redis tenant itu. Penulis pertama dalam jendela
+# ORDER_TRANSITION_WINDOW_SECONDS (gate cache.add) menjadwalkan satu flush
+# (Celery, countdown = jendela); semua transisi tenant dalam jendela itu --
+# expiry per order, PATCH/cancel berurutan dari request berbeda -- terkirim
+# sebagai satu pesan. Order yang berubah beberapa kali dalam satu jendela
+# menjadi satu delta: status terakhir, previous_status dari transisi pertama.
+# Jendela <= 0 (atau Redis/broker bermasalah) mengirim langsung. Guest yang
+# memantau ordernya (orders.consumers) menerima transisi order itu saja lewat
+# grup order_<uuid>, ikut flush yang sama.
+ORDER_TRANSITION_EVENT = 'order_status_changed'
+PAID_ORDER_EVENT = 'new_paid_order'
+DEFAULT_TRANSITION_WINDOW_SECONDS = 1
+# Buffer yang tertinggal (mis. flush gagal) tidak menumpuk selamanya
+TRANSITION_BUFFER_TTL = 60 * 60
+
+
+def order_group_name(order_uuid):
+    return f"order_{order_uuid}"
+
+
+def transition_delta(order_id, order_uuid, references_code, status, previous_status, updated_at):
+    return {
+        'id': order_id,
+        'uuid': str(order_uuid),
+        'references_code': references_code,
+        'status': status,
+        'previous_status': previous_status,
+        # Channel layer (msgpack) tidak bisa membawa datetime
+        'updated_at': updated_at.isoformat() if updated_at else None,
+    }
+
+
+def order_transition(order, previous_status):
+    return transition_delta(
+        order.pk, order.uuid, order.references_code, order.status, previous_status, order.updated_at
+    )
+
+
+async def _send_to_guests(deltas):
+    channel_layer = get_channel_layer()
+    for delta in deltas:
+        await channel_layer.group_send(order_group_name(delta['uuid']), {
+            'type': 'order.status',
+            'message': {
+                'type': ORDER_TRANSITION_EVENT,
+                'uuid': delta['uuid'],
+                'status': delta['status'],
+                'previous_status': delta['previous_status'],
+                'updated_at': delta['updated_at'],
+            },
+        })
+
+
+def publish_transitions(by_tenant):
+    for tenant_id, deltas in by_tenant.items():
+        if not deltas:
+            continue
+        try:
+            publish_tenant_event(tenant_id, {'type': ORDER_TRANSITION_EVENT, 'orders': list(deltas.values())})
+        except Exception:
+            logger.warning(f"Gagal mengirim notifikasi transisi order tenant {tenant_id}.")
+        try:
+            async_to_sync(_send_to_guests)(list(deltas.values()))
+        except Exception:
+            logger.warning(f"Gagal mengirim status order ke guest tenant {tenant_id}.")
+
+
+class _TransitionBatch:
+    """Delta per tenant; order yang sama digabung menjadi satu delta."""
+
+    def __init__(self):
+        self.by_tenant = defaultdict(dict)
+
+    def add(self, tenant_id, delta):
+        # Order yang berubah beberapa kali dalam satu batch: status terakhir,
+        # status awal tetap dari transisi pertama.
+        previous = self.by_tenant[tenant_id].get(delta['id'])
+        if previous is not None:
+            delta = {**delta, 'previous_status': previous['previous_status']}
+        self.by_tenant[tenant_id][delta['id']] = delta
+
+
+def _pending_key(tenant_id):
+    return f"notif:transitions:{tenant_id}"
+
+
+def _first_status_key(tenant_id):
+    return f"notif:transitions:from:{tenant_id}"
+
+
+def _gate_key(tenant_id):
+    return f"order_transitions_gate_{tenant_id}"
+
+
+def _transition_window():
+    return getattr(settings, 'ORDER_TRANSITION_WINDOW_SECONDS', DEFAULT_TRANSITION_WINDOW_SECONDS)
+
+
+def _buffer_transitions(by_tenant):
+    """Tambahkan delta ke buffer Redis per tenant (satu pipeline)."""
+    redis = get_redis_connection('default')
+    with redis.pipeline(transaction=False) as pipe:
+        for tenant_id, deltas in by_tenant.items():
+            for order_id, delta in deltas.items():
+                pipe.hset(_pending_key(tenant_id), order_id, json.dumps(delta))
+                # previous_status pertama dalam jendela tidak ditimpa transisi berikutnya
+                pipe.hsetnx(_first_status_key(tenant_id), order_id, json.dumps(delta['previous_status']))
+            pipe.expire(_pending_key(tenant_id), TRANSITION_BUFFER_TTL)
+            pipe.expire(_first_status_key(tenant_id), TRANSITION_BUFFER_TTL)
+        pipe.execute()
+
+
+def _take_buffer(tenant_id):
+    """Baca dan kosongkan buffer tenant secara atomik (MULTI)."""
+    redis = get_redis_connection('default')
+    with redis.pipeline() as pipe:
+        pipe.hgetall(_pending_key(tenant_id))
+        pipe.hgetall(_first_status_key(tenant_id))
+        pipe.delete(_pending_key(tenant_id), _first_status_key(tenant_id))
+        pending, first_status, _ = pipe.execute()
+    deltas = {}
+    for order_id, raw in sorted(pending.items(), key=lambda item: int(item[0])):
+        delta = json.loads(raw)
+        if order_id in first_status:
+            delta['previous_status'] = json.loads(first_status[order_id])
+        deltas[delta['id']] = delta
+    return deltas
+
+
+def flush_tenant_transitions(tenant_id):
+    """
+    Tutup jendela tenant lalu kirim semua transisinya yang ter-buffer sebagai
+    satu pesan. Gate dihapus sebelum buffer diambil: delta yang masuk setelah
+    pengambilan membuka jendela (dan flush) baru, tidak tertinggal di buffer.
+    """
+    cache.delete(_gate_key(tenant_id))
+    deltas = _take_buffer(tenant_id)
+    if deltas:
+        publish_transitions({tenant_id: deltas})
+    return len(deltas)
+
+
+def _schedule_flush(tenant_id, window):
+    from .tasks import flush_order_transitions
+
+    try:
+        flush_order_transitions.apply_async(args=[tenant_id], countdown=window)
+    except Exception:
+        logger.warning(f"Gagal menjadwalkan flush notifikasi tenant {tenant_id}, dikirim langsung.")
+        flush_tenant_transitions(tenant_id)
+
+
+def dispatch_transitions(by_tenant):
+    window = _transition_window()
+    if window > 0:
+        try:
+            _buffer_transitions(by_tenant)
+            # Penulis pertama dalam jendela menjadwalkan flush; delta penulis
+            # berikutnya ikut terbawa flush itu
+            opened = [tenant_id for tenant_id in by_tenant if cache.add(_gate_key(tenant_id), 1, timeout=window)]
+        except Exception:
+            logger.warning("Buffer notifikasi transisi tidak tersedia, dikirim langsung.")
+        else:
+            for tenant_id in opened:
+                _schedule_flush(tenant_id, window)
+            return
+    publish_transitions(by_tenant)
+
+
+class _Transition:
+    """
+    Callback on_commit per pencatatan: transisi dari savepoint yang di-rollback
+    dibuang Django bersama callback ini, jadi tidak pernah ikut terkirim.
+    """
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+
+    def __call__(self):
+        batch = _TransitionBatch()
+        for tenant_id, delta in self.deltas:
+            batch.add(tenant_id, delta)
+        dispatch_transitions(batch.by_tenant)
+
+
+def schedule_order_transitions(deltas):
+    """
+    Catat [(tenant_id, delta), ...] untuk dikirim setelah transaksi commit
+    (langsung jika tidak di dalam transaksi), digabung per tenant per jendela.
+    """
+    if deltas:
+        transaction.on_commit(_Transition(deltas))
+
+
+def schedule_order_transition(order, previous_status):
+    schedule_order_transitions([(order.tenant_id, order_transition(order, previous_status))])
+
+
+def publish_paid_order(order, data):
+    """
+    Kirim order lunas langsung dari proses web, tanpa antre di worker Celery
+    (--pool=solo, bisa tertahan task email). `data` adalah OrderSerializer yang
+    sudah dibuat view untuk responsnya, jadi hook ini tidak membaca ulang DB.
+    Task Celery hanya dipakai jika pengiriman langsung gagal.
+    """
+    from .tasks import send_order_paid_notification
+
+    try:
+        publish_tenant_event(order.tenant_id, {'type': PAID_ORDER_EVENT, 'order': data})
+    except Exception:
+        logger.warning(f"Notifikasi order lunas {order.pk} gagal dikirim langsung, dialihkan ke Celery.")
+        try:
+            send_order_paid_notification.delay(order.pk)
+        except Exception:
+            logger.exception(f"Gagal menjadwalkan ulang notifikasi order lunas {order.pk}")
+
+
+def schedule_paid_order_notification(order, data):
+    transaction.on_commit(lambda: publish_paid_order(order, data))
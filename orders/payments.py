@@ -0,0 +1,135 @@
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+# Inisiasi pembayaran Midtrans Snap. Satu requests.Session per proses dipakai
+# ulang (koneksi keep-alive ke gateway), dengan timeout ketat agar latensi
+# gateway tidak menahan worker terlalu lama.
+SNAP_SANDBOX_BASE_URL = 'https://app.sandbox.midtrans.com/snap/v1'
+SNAP_PRODUCTION_BASE_URL = 'https://app.midtrans.com/snap/v1'
+DEFAULT_TIMEOUT = (3.05, 10)  # (connect, read) dalam detik
+POOL_MAXSIZE = 20
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class PaymentGatewayError(Exception):
+    """Gateway tidak bisa dihubungi, timeout, atau mengembalikan error."""
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Tanpa retry otomatis: POST transaksi tidak idempoten di sisi kita
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({
+                    'content-type': 'application/json',
+                    'accept': 'application/json',
+                })
+                _session = session
+    return _session
+
+
+def get_snap_base_url():
+    # MIDTRANS_SNAP_BASE_URL bisa diarahkan ke fake server lokal (manage.py fake_snap_server)
+    base_url = getattr(settings, 'MIDTRANS_SNAP_BASE_URL', None)
+    if base_url:
+        return base_url.rstrip('/')
+    if getattr(settings, 'MIDTRANS_IS_PRODUCTION', False):
+        return SNAP_PRODUCTION_BASE_URL
+    return SNAP_SANDBOX_BASE_URL
+
+
+def create_snap_transaction(payload, base_url=None):
+    """POST ke Snap API lewat session ter-pool. Mengembalikan dict berisi token & redirect_url."""
+    timeout = getattr(settings, 'MIDTRANS_TIMEOUT', DEFAULT_TIMEOUT)
+    try:
+        response = _get_session().post(
+            f"{base_url or get_snap_base_url()}/transactions",
+            json=payload,
+            auth=(settings.MIDTRANS_SERVER_KEY or '', ''),
+            timeout=timeout,
+        )
+    except requests.RequestException as e:
+        raise PaymentGatewayError(f"Gagal menghubungi Midtrans: {e}") from e
+
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    if response.status_code >= 400 or 'token' not in data:
+        raise PaymentGatewayError(f"Midtrans mengembalikan HTTP {response.status_code}: {response.text[:200]}")
+    return data
+
+
+def payment_queryset():
+    """Order beserta customer dan baris item (menu dimuat sekaligus) untuk payload Snap."""
+    return Order.objects.select_related('customer').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('menu_item').only(
+            'id', 'order_id', 'qty', 'price', 'menu_item__id', 'menu_item__name'
+        ))
+    )
+
+
+def build_snap_payload(order):
+    """Payload Snap dari order yang item-nya sudah di-prefetch (lihat payment_queryset)."""
+    customer = order.customer
+    return {
+        "transaction_details": {
+            "order_id": order.references_code,
+            "gross_amount": int(float(order.total))
+        },
+        "item_details": [{
+            "id": item.menu_item.id,
+            "price": int(float(item.price)),
+            "quantity": item.qty,
+            "name": item.menu_item.name
+        } for item in order.items.all()],
+        "customer_details": {
+            "first_name": customer.name if customer else None,
+            "email": customer.email if customer else None,
+        }
+    }
+
+
+def _store_payment_state(order_id, state):
+    # Kunci baris agar tidak menimpa perubahan meta lain (mis. retry PIN, log pembayaran)
+    with transaction.atomic():
+        order = Order.objects.select_for_update().only('id', 'meta').get(pk=order_id)
+        meta = order.meta or {}
+        meta['payment'] = state
+        order.meta = meta
+        order.save(update_fields=['meta'])
+    return state
+
+
+def mark_payment_failed(order_id):
+    return _store_payment_state(order_id, {'status': 'FAILED'})
+
+
+def initiate_payment(order_id):
+    """
+    Buat transaksi Snap untuk order dan simpan hasilnya di order.meta['payment']
+    agar bisa di-poll klien (GET detail order). Mengembalikan respons Snap.
+    """
+    order = payment_queryset().get(pk=order_id)
+    snap_response = create_snap_transaction(build_snap_payload(order))
+    _store_payment_state(order_id, {
+        'status': 'READY',
+        'token': snap_response.get('token'),
+        'redirect_url': snap_response.get('redirect_url'),
+    })
+    return snap_response
@@ -58,8 +58,19 @@ class IsGuestOrderOwner(permissions.BasePermission):
         Helper method untuk generate HMAC token. 
         Sekarang sudah berada di dalam class IsGuestOrderOwner.
         """
-        return hmac.new(
-            settings.SECRET_KEY.encode(),
-            order_uuid.encode(),
-            hashlib.sha256,
-        ).hexdigest()
+        return generate_order_token(order_uuid)
+
+
+def generate_order_token(order_uuid):
+    """Token guest (X-Order-Token) untuk order: HMAC-SHA256 dari uuid, tanpa query database."""
+    return hmac.new(
+        settings.SECRET_KEY.encode(),
+        str(order_uuid).encode(),
+        hashlib.sha256,
+    ).hexdigest()
+
+
+def check_order_token(order_uuid, token):
+    if not token:
+        return False
+    return hmac.compare_digest(token.encode(), generate_order_token(order_uuid).encode())
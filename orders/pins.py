@@ -0,0 +1,82 @@
+import logging
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare, salted_hmac
+from .models import generate_order_pin
+
+logger = logging.getLogger(__name__)
+
+# PIN kasir di-hash dengan HMAC-SHA256 berkunci (SECRET_KEY) yang di-scope ke
+# references_code. Cukup satu hash cepat per pembuatan/verifikasi, berbeda
+# dengan PBKDF2 (make_password) yang memakan ratusan milidetik per panggilan.
+# Brute force dibatasi oleh retry_count & throttle di VerifyOrderByPinView.
+PIN_HASH_PREFIX = "hmac_sha256$"
+PIN_KEY_SALT = "orders.pins.cashier_pin"
+
+# Set "PIN aktif" di Redis agar dua order yang masih menunggu pembayaran
+# tidak mendapat PIN yang sama. Berlaku sedikit lebih lama dari masa expiry order.
+# Order selalu dicari lewat references_code; PIN saja tidak pernah dipakai
+# untuk mencari order.
+PIN_RESERVATION_TIMEOUT = 60 * 15
+PIN_RESERVATION_ATTEMPTS = 5
+
+
+class PinUnavailable(Exception):
+    """Semua percobaan reservasi PIN bertabrakan dengan PIN aktif lain."""
+
+
+def _reservation_key(pin):
+    return f"active_cashier_pin_{pin}"
+
+
+def hash_order_pin(references_code, pin):
+    digest = salted_hmac(PIN_KEY_SALT, f"{references_code}:{pin}", algorithm="sha256").hexdigest()
+    return f"{PIN_HASH_PREFIX}{digest}"
+
+
+def check_order_pin(order, pin):
+    """Verifikasi PIN order; PIN lama (PBKDF2) tetap didukung."""
+    if not pin or not order.cashier_pin:
+        return False
+    if order.cashier_pin.startswith(PIN_HASH_PREFIX):
+        return constant_time_compare(order.cashier_pin, hash_order_pin(order.references_code, str(pin)))
+    return check_password(pin, order.cashier_pin)
+
+
+def _reserve_pin(pin, references_code):
+    try:
+        return cache.add(_reservation_key(pin), references_code, timeout=PIN_RESERVATION_TIMEOUT)
+    except Exception:
+        # Reservasi hanya optimasi; verifikasi tetap aman karena di-scope ke references_code
+        logger.warning("Reservasi PIN kasir di cache gagal, lanjut tanpa cek keunikan.")
+        return True
+
+
+def release_order_pin(pin, references_code):
+    """
+    Lepas reservasi PIN order yang gagal dibuat (stok kurang, validasi, error
+    lain) agar PIN-nya tidak terkunci sampai PIN_RESERVATION_TIMEOUT. Hanya
+    reservasi milik references_code ini yang dihapus.
+    """
+    if pin is None:
+        return
+    try:
+        if cache.get(_reservation_key(pin)) == references_code:
+            cache.delete(_reservation_key(pin))
+    except Exception:
+        logger.warning("Gagal melepas reservasi PIN kasir di cache; kedaluwarsa sendiri setelah timeout.")
+
+
+def issue_order_pin(references_code):
+    """
+    Buat PIN baru untuk order. Mengembalikan (pin_asli, pin_hash).
+    Biaya konstan: paling banyak PIN_RESERVATION_ATTEMPTS kali cache.add,
+    tanpa query database dan tanpa PBKDF2. PinUnavailable jika tidak ada PIN
+    yang berhasil direservasi.
+    """
+    for _ in range(PIN_RESERVATION_ATTEMPTS):
+        pin = generate_order_pin()
+        if _reserve_pin(pin, references_code):
+            return pin, hash_order_pin(references_code, pin)
+    raise PinUnavailable()
+
@@ -0,0 +1,6 @@
+from django.urls import re_path
+from . import consumers
+
+websocket_urlpatterns = [
+    re_path(r'ws/orders/(?P<order_uuid>[0-9a-f-]{36})/status/$', consumers.OrderStatusConsumer.as_asgi()),
+]
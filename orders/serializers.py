@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from tenants.serializers import MenuItemSerializer, StandSerializer, VariantOptionSerializer
+from tenants.catalog import get_price_catalog
 from .models import Customer, MenuItem, Order, OrderItem, Tenant, Table
 from django.contrib.auth.models import User, Group
 import random 
@@ -31,19 +32,27 @@ class OrderCreateSerializer(serializers.Serializer):
     items = OrderItemCreateSerializer(many=True)
   
     def validate_tenant(self, value):
-        if not Tenant.objects.filter(pk=value, active=True).exists():
+        # Katalog harga tenant dimuat sekali per request (dari cache jika ada),
+        # lalu dipakai ulang untuk validasi item, varian, dan perhitungan harga di view.
+        self.catalog = get_price_catalog(value)
+        if not self.catalog or not self.catalog['active']:
             raise serializers.ValidationError("Tenant tidak ditemukan atau tidak aktif")
         return value
   
     def validate(self, data):
         items = data.get('items')
-        tenant_id = data.get('tenant')
         if not items:
             raise serializers.ValidationError("Item tidak boleh kosong")
-        item_ids = [item['menu_item'] for item in items]
-        valid_items_count = MenuItem.objects.filter(id__in=item_ids, tenant_id=tenant_id).count()
-        if valid_items_count != len(item_ids):
-            raise serializers.ValidationError("Terdapat satu atau lebih item yang bukan milik tenant ini.")
+        catalog_items = self.catalog['items']
+        for item in items:
+            catalog_item = catalog_items.get(item['menu_item'])
+            if catalog_item is None:
+                raise serializers.ValidationError("Terdapat satu atau lebih item yang bukan milik tenant ini.")
+            if not catalog_item['available']:
+                raise serializers.ValidationError(f"Stok untuk '{catalog_item['name']}' tidak mencukupi atau tidak tersedia.")
+            variant_ids = item.get('variants') or []
+            if len(set(variant_ids)) != len(variant_ids) or not set(variant_ids) <= catalog_item['option_ids']:
+                raise serializers.ValidationError("Terdapat varian yang tidak valid untuk menu yang dipilih.")
         return data
   
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -58,6 +67,8 @@ class OrderSerializer(serializers.ModelSerializer):
     tenant = StandSerializer() 
     table = TableSerializer(allow_null=True)      # <-- TAMBAHKAN INI
     customer = CustomerSerializer(allow_null=True)  # <-- TAMBAHKAN INI
+    # Status efektif: order yang lewat expired_at langsung terbaca EXPIRED
+    status = serializers.CharField(source='effective_status', read_only=True)
     class Meta:
         model = Order
-        fields = ['id','uuid','cashier_pin', 'references_code', 'tenant', 'table', 'customer', 'status', 'payment_method', 'total', 'items', 'created_at', 'paid_at', 'meta']
+        fields = ['id','uuid','cashier_pin', 'references_code', 'tenant', 'table', 'customer', 'status', 'payment_method', 'total', 'items', 'created_at', 'updated_at', 'paid_at', 'meta']
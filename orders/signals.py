@@ -1,25 +1,44 @@
-from django.core.cache import cache
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from orders.models import Order # Sesuaikan import model Order Anda
-
-CACHE_VERSION = "v1"
-
-@receiver(post_save, sender=Order)
-def invalidate_dashboard_cache(sender, instance, created, **kwargs):
-    """
-    Fungsi ini akan otomatis terpanggil setiap kali ada Order baru (created)
-    atau ketika status Order di-update (termasuk pembayaran sukses/batal).
-    """
-    stand_id = instance.tenant_id # Ambil ID stand dari pesanan terkait
-    
-    # Kumpulkan daftar keys yang mungkin perlu dihapus
-    keys_to_delete = [
-        f"{CACHE_VERSION}_dashboard_report_hari-ini_{stand_id}",
-        f"{CACHE_VERSION}_dashboard_report_hari-ini_semua",
-        f"{CACHE_VERSION}_dashboard_report_7-hari_{stand_id}",
-        f"{CACHE_VERSION}_dashboard_report_7-hari_semua",
-    ]
-    
-    # Hapus cache tersebut dari Redis
-    cache.delete_many(keys_to_delete)
\ No newline at end of file
+from django.db.models.signals import post_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from .notifications import schedule_order_transitions, transition_delta
+
+# Hook perubahan order untuk app lain (laporan, notifikasi). Dikirim di dalam
+# transaksi perubahannya oleh Order.save(), penghapusan order, dan jalur UPDATE
+# massal (orders.expiry, Order.calculate_total), dengan argumen:
+#   changes    [(state_lama, state_baru), ...]; state = dict Order.STATE_FIELDS,
+#              None jika order belum ada / sudah dihapus
+#   updated_at waktu perubahan
+# State lama diteruskan oleh pengirim (state saat dimuat atau dibaca di bawah
+# lock), jadi penerima tidak perlu membaca ulang baris order.
+order_changed = Signal()
+
+# Hook perubahan item order, dikirim di dalam transaksinya oleh OrderItem.save(),
+# penghapusan item (termasuk cascade dari order) dan bulk_create di
+# CreateOrderView, dengan argumen changes [(state_lama, state_baru), ...];
+# state = dict OrderItem.ITEM_STATE_FIELDS, None jika item belum ada / dihapus.
+order_items_changed = Signal()
+
+
+# Sender berupa label agar modul ini bisa diimpor oleh orders.models
+@receiver(post_delete, sender='orders.Order')
+def send_order_deleted(sender, instance, **kwargs):
+    order_changed.send(sender=sender, changes=[(instance.state(), None)], updated_at=timezone.now())
+
+
+@receiver(post_delete, sender='orders.OrderItem')
+def send_order_item_deleted(sender, instance, **kwargs):
+    order_items_changed.send(sender=sender, changes=[(instance.state(), None)])
+
+
+@receiver(order_changed)
+def notify_order_transitions(sender, changes, updated_at, **kwargs):
+    # Setiap transisi status (termasuk order baru) dikirim ke dashboard tenant dan guest
+    schedule_order_transitions([
+        (new_state['tenant_id'], transition_delta(
+            new_state['id'], new_state['uuid'], new_state['references_code'], new_state['status'],
+            old_state['status'] if old_state else None, updated_at,
+        ))
+        for old_state, new_state in changes
+        if new_state is not None and (old_state is None or old_state['status'] != new_state['status'])
+    ])
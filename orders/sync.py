@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.utils import timezone
+from rest_framework import serializers
+
+# Delta-sync papan order (GET /api/orders/all/?since=<token>).
+# Token adalah high-water mark updated_at (mikrodetik epoch) yang diambil
+# di AWAL request. updated_at diisi saat save() sebelum transaksi commit,
+# sehingga order yang commit belakangan bisa punya updated_at sedikit lebih
+# lama dari token; SYNC_OVERLAP membaca ulang jendela itu. Klien cukup
+# meng-upsert berdasarkan id, jadi baris ganda tidak masalah.
+SYNC_OVERLAP = timedelta(seconds=5)
+# Lebih dari ini klien diminta memuat ulang daftar penuh (reset)
+SYNC_MAX_CHANGES = 500
+
+
+def issue_sync_token(now=None):
+    now = now or timezone.now()
+    return str(int(now.timestamp()) * 1_000_000 + now.microsecond)
+
+
+def decode_sync_token(token):
+    try:
+        micros = int(token)
+        if micros < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({'since': 'Token sinkronisasi tidak valid.'})
+    seconds, micro = divmod(micros, 1_000_000)
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc) + timedelta(microseconds=micro)
+
+
+def changed_since(queryset, token):
+    """Order di scope yang dibuat/berubah sejak token (dengan jendela overlap)."""
+    return queryset.filter(updated_at__gte=decode_sync_token(token) - SYNC_OVERLAP)
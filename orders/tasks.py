@@ -2,8 +2,6 @@ from celery import shared_task
 from .models import Order
 from django.conf import settings
 from .serializers import OrderSerializer
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.core.validators import validate_email
@@ -12,33 +10,38 @@ import socket
 from django.utils import timezone
 from datetime import timedelta
 from .models import PaymentWebhookLog
+from .expiry import expire_due_orders, expire_orders
+from .notifications import flush_tenant_transitions
+from .payments import PaymentGatewayError, initiate_payment, mark_payment_failed
+from tenants.notifications import publish_tenant_event
+import logging
 
-@shared_task
-def send_order_paid_notification(order_id):
+logger = logging.getLogger(__name__)
+
+@shared_task(bind=True, max_retries=3)
+def send_order_paid_notification(self, order_id):
     """
     Kirim notifikasi ke tenant (dashboard push via websockets)
     dan kirim WhatsApp/Email ke customer.
+    Jalur utama kini orders.notifications.publish_paid_order (langsung dari
+    proses web); task ini fallback jika pengiriman langsung gagal.
     """
     try:
-        order = Order.objects.select_related('tenant').get(pk=order_id)
+        order = Order.objects.with_detail_relations().get(pk=order_id)
     except Order.DoesNotExist:
         return False
     
-    # Implementasi notifikasi realtime ke dashboard
-    channel_layer = get_channel_layer()
-    tenant_group_name = f'tenant_{order.tenant.pk}'
-    
     # Siapkan data yang akan dikirim ke frontend
     notification_data = {
         'type': 'new_paid_order', # Tipe event untuk diidentifikasi oleh frontend
         'order': OrderSerializer(order).data
     }
     
-    # Kirim pesan ke group tenant
-    async_to_sync(channel_layer.group_send)(
-        tenant_group_name,
-        {'type': 'order.notification', 'message': notification_data}
-    )
+    # Kirim pesan ke group tenant (bernomor urut, bisa di-replay saat reconnect)
+    try:
+        publish_tenant_event(order.tenant_id, notification_data)
+    except Exception as e:
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
     return True
 
 def is_disposable_email(email):
@@ -120,20 +123,49 @@ def cleanup_old_webhook_logs():
 def process_expired_orders():
     """
     Mengecek order yang AWAITING_PAYMENT dan sudah melewati waktu expired_at.
-    Lalu mengubah statusnya menjadi EXPIRED dan mengembalikan stok.
+    Lalu mengubah statusnya menjadi EXPIRED dan mengembalikan stok secara
+    set-based per batch (lihat orders.expiry).
     """
-    expired_orders = Order.objects.filter(
-        status='AWAITING_PAYMENT',
-        expired_at__lt=timezone.now()
-    )
-    
-    count = 0
-    for order in expired_orders:
-        order.status = 'EXPIRED'
-        order.save(update_fields=['status'])
-        
-        # Penting: kembalikan stok menu yang tadinya di-reserve
-        order.cancel_and_restock() 
-        count += 1
-        
-    return f"{count} pesanan berhasil di-expired dan stok dikembalikan."
\ No newline at end of file
+    per_tenant = expire_due_orders()
+    count = sum(per_tenant.values())
+    if count:
+        logger.info(f"Expired orders per tenant: {dict(per_tenant)}")
+
+    return f"{count} pesanan berhasil di-expired dan stok dikembalikan. Per tenant: {dict(per_tenant)}"
+
+@shared_task(ignore_result=True)
+def expire_order(order_id):
+    """
+    Dijadwalkan dengan ETA = expired_at saat order dibuat, sehingga order
+    kedaluwarsa ~1 detik setelah tenggatnya. process_expired_orders tetap
+    berjalan tiap menit sebagai jaring pengaman jika task ini hilang.
+    """
+    return bool(expire_orders([order_id]))
+
+
+@shared_task(ignore_result=True)
+def flush_order_transitions(tenant_id):
+    """
+    Akhir jendela debounce notifikasi transisi tenant: semua transisi yang
+    ter-buffer selama jendela dikirim sebagai satu pesan (orders.notifications).
+    """
+    return flush_tenant_transitions(tenant_id)
+
+
+@shared_task(bind=True, max_retries=3, ignore_result=True)
+def initiate_order_payment(self, order_id):
+    """
+    Mode async inisiasi pembayaran: buat snap token di luar request.
+    Hasilnya disimpan di order.meta['payment'] dan di-poll lewat detail order.
+    """
+    try:
+        initiate_payment(order_id)
+    except Order.DoesNotExist:
+        return f"Order {order_id} tidak ditemukan"
+    except PaymentGatewayError as e:
+        if self.request.retries >= self.max_retries:
+            mark_payment_failed(order_id)
+            logger.error(f"Inisiasi pembayaran order {order_id} gagal: {e}")
+            return f"Inisiasi pembayaran order {order_id} gagal"
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
+    return f"Snap token order {order_id} siap"
@@ -1,12 +1,41 @@
 # orders/tests_all_features.py
 import hashlib
+import threading
+import uuid
 from django.urls import reverse
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.test import APITestCase
 from django.contrib.auth.models import User, Group
-from tenants.models import Tenant, MenuItem
-from orders.models import Order
+from tenants.models import Tenant, MenuItem, VariantGroup, VariantOption
+from orders.models import Order, OrderItem
+from orders.serializers import OrderSerializer
+from orders.expiry import expire_due_orders, expire_orders
+from orders.notifications import (
+    ORDER_TRANSITION_EVENT, PAID_ORDER_EVENT, flush_tenant_transitions, schedule_paid_order_notification,
+)
+from orders.tasks import expire_order, initiate_order_payment
+from orders.payments import build_snap_payload, payment_queryset
+from orders.management.commands.fake_snap_server import start_fake_snap_server
+from orders.permissions import IsGuestOrderOwner, generate_order_token
+from orders import routing as order_routing
+from tenants.stock import reserve_stock, InsufficientStock
+from orders.pins import (
+    PinUnavailable, _reservation_key, check_order_pin, hash_order_pin, issue_order_pin, release_order_pin,
+)
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings, skipUnlessDBFeature
+from asgiref.sync import sync_to_async
+from tenants.tests import IN_MEMORY_CHANNEL_LAYERS, WebsocketClient
+from django.test.utils import CaptureQueriesContext
 from django.conf import settings
+from django.core.management import call_command
+from io import StringIO
+from django.core.cache import cache
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
 class BackendMasterTestSuite(APITestCase):
     def setUp(self):
@@ -108,3 +137,933 @@ class BackendMasterTestSuite(APITestCase):
             print(f"✅ [FITUR 4] API Dashboard Laporan Merespons (Status: {response.status_code}).")
         except Exception as e:
             print(f"⚠️ [FITUR 4] Terjadi peringatan: Cek penamaan URL laporan Anda. Detail: {e}")
+
+
+class ExpiredOrdersEngineTests(APITestCase):
+    """Tes untuk mesin expiry set-based (orders.expiry)."""
+
+    def setUp(self):
+        self.tenant_a = Tenant.objects.create(name="Stand A", active=True)
+        self.tenant_b = Tenant.objects.create(name="Stand B", active=True)
+        self.menu_a = MenuItem.objects.create(tenant=self.tenant_a, name="Es Teh", price=5000, stock=10)
+        self.menu_b = MenuItem.objects.create(tenant=self.tenant_b, name="Nasi Goreng", price=15000, stock=10)
+        self.past = timezone.now() - timedelta(minutes=1)
+
+    def _order(self, tenant, menu, qty, status='AWAITING_PAYMENT', expired_at=None):
+        order = Order.objects.create(
+            tenant=tenant, payment_method='CASH', status=status,
+            expired_at=expired_at or self.past
+        )
+        OrderItem.objects.create(order=order, menu_item=menu, qty=qty, price=menu.price)
+        return order
+
+    def test_expire_due_orders_restocks_and_counts_per_tenant(self):
+        """Tes: Order jatuh tempo di-expire per batch, stok dikembalikan teragregasi."""
+        expired = [self._order(self.tenant_a, self.menu_a, 2) for _ in range(3)]
+        expired.append(self._order(self.tenant_b, self.menu_b, 4))
+        paid = self._order(self.tenant_a, self.menu_a, 5, status='PAID')
+        pending = self._order(self.tenant_a, self.menu_a, 1, expired_at=timezone.now() + timedelta(minutes=5))
+
+        per_tenant = expire_due_orders(batch_size=2)
+
+        self.assertEqual(per_tenant, {self.tenant_a.id: 3, self.tenant_b.id: 1})
+        for order in expired:
+            order.refresh_from_db()
+            self.assertEqual(order.status, 'EXPIRED')
+        paid.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual(paid.status, 'PAID')
+        self.assertEqual(pending.status, 'AWAITING_PAYMENT')
+
+        self.menu_a.refresh_from_db()
+        self.menu_b.refresh_from_db()
+        self.assertEqual(self.menu_a.stock, 16)
+        self.assertEqual(self.menu_b.stock, 14)
+
+        # Tick berikutnya tidak boleh restock ulang
+        self.assertEqual(expire_due_orders(), {})
+        self.menu_a.refresh_from_db()
+        self.assertEqual(self.menu_a.stock, 16)
+
+    def test_cancel_expired_order_does_not_restock_twice(self):
+        """Tes: Membatalkan order yang sudah EXPIRED tidak menambah stok lagi."""
+        order = self._order(self.tenant_a, self.menu_a, 3)
+        expire_orders([order.pk])
+        order.refresh_from_db()
+        self.assertTrue(order.cancel_and_restock())
+
+        order.refresh_from_db()
+        self.menu_a.refresh_from_db()
+        self.assertEqual(order.status, 'CANCELLED')
+        self.assertEqual(self.menu_a.stock, 13)
+
+    def test_legacy_expired_orders_are_restocked_once(self):
+        """Tes: EXPIRED dari versi lama (tanpa restock) dipulihkan data fix sekali saja."""
+        legacy = [self._order(self.tenant_a, self.menu_a, 2, status='EXPIRED') for _ in range(3)]
+        engine = self._order(self.tenant_b, self.menu_b, 4)
+        expire_orders([engine.pk])
+        self.menu_b.refresh_from_db()
+        self.assertEqual(self.menu_b.stock, 14)
+
+        out = StringIO()
+        call_command('restock_legacy_expired_orders', '--dry-run', stdout=out)
+        self.assertIn("Stok 3 order", out.getvalue())
+        self.menu_a.refresh_from_db()
+        self.assertEqual(self.menu_a.stock, 10)
+
+        call_command('restock_legacy_expired_orders', '--batch-size', '2', stdout=StringIO())
+        call_command('restock_legacy_expired_orders', stdout=StringIO())
+        self.menu_a.refresh_from_db()
+        self.menu_b.refresh_from_db()
+        self.assertEqual(self.menu_a.stock, 16)
+        self.assertEqual(self.menu_b.stock, 14)
+        self.assertFalse(Order.objects.filter(pk__in=[o.pk for o in legacy], stock_released=False).exists())
+
+    def test_cancel_legacy_expired_order_restocks(self):
+        """Tes: Membatalkan EXPIRED lama yang belum dipulihkan tetap mengembalikan stok."""
+        order = self._order(self.tenant_a, self.menu_a, 3, status='EXPIRED')
+        self.assertTrue(order.cancel_and_restock())
+        self.assertFalse(order.cancel_and_restock())
+        self.menu_a.refresh_from_db()
+        self.assertEqual(self.menu_a.stock, 13)
+
+
+class OrderListReadOnlyTests(APITestCase):
+    """Tes: Polling daftar order tidak boleh menulis ke database."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin_list', password='password123', is_staff=True)
+        self.tenant = Tenant.objects.create(name="Stand List", active=True)
+        self.overdue = Order.objects.create(
+            tenant=self.tenant, payment_method='CASH', status='AWAITING_PAYMENT',
+            expired_at=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_order_list_does_not_expire_orders(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('order-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.overdue.refresh_from_db()
+        self.assertEqual(self.overdue.status, 'AWAITING_PAYMENT')
+
+    def test_expire_order_task_runs_engine(self):
+        """Tes: Task ETA expire_order meng-expire order yang sudah jatuh tempo."""
+        self.assertTrue(expire_order(self.overdue.pk))
+        self.overdue.refresh_from_db()
+        self.assertEqual(self.overdue.status, 'EXPIRED')
+
+
+class EffectiveStatusTests(APITestCase):
+    """Tes: Status efektif dibaca tanpa menulis ke database."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Detail", active=True)
+        self.order = Order.objects.create(
+            tenant=self.tenant, payment_method='CASH', status='AWAITING_PAYMENT',
+            expired_at=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_guest_poll_reads_expired_without_writing(self):
+        token = IsGuestOrderOwner().generate_order_token(str(self.order.uuid))
+        url = reverse('order-detail', kwargs={'order_uuid': self.order.uuid})
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_X_ORDER_TOKEN=token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'EXPIRED')
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'AWAITING_PAYMENT')
+
+    def test_queryset_annotation_matches_property(self):
+        annotated = Order.objects.with_effective_status().get(pk=self.order.pk)
+        self.assertEqual(annotated.annotated_status, 'EXPIRED')
+        self.assertEqual(annotated.effective_status, 'EXPIRED')
+
+
+class CreateOrderCatalogTests(APITestCase):
+    """Tes: Pembuatan order memakai katalog harga per tenant dengan query konstan."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Katalog", active=True)
+        self.group = VariantGroup.objects.create(tenant=self.tenant, name="Level")
+        self.option = VariantOption.objects.create(group=self.group, name="Pedas", price=2000)
+        self.menus = []
+        for i in range(10):
+            menu = MenuItem.objects.create(tenant=self.tenant, name=f"Menu {i}", price=10000, stock=100)
+            menu.variant_groups.add(self.group)
+            self.menus.append(menu)
+
+    def _payload(self, menus):
+        return {
+            "tenant": self.tenant.id,
+            "name": "Pembeli",
+            "email": "pembeli@example.com",
+            "payment_method": "CASH",
+            "items": [{"menu_item": m.id, "qty": 1, "variants": [self.option.id]} for m in menus],
+        }
+
+    def _count_queries(self, menus):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('create-order'), self._payload(menus), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_is_constant_in_cart_size(self):
+        self._count_queries(self.menus[:1])  # Hangatkan katalog & customer
+        single, _ = self._count_queries(self.menus[:1])
+        ten, response = self._count_queries(self.menus)
+
+        self.assertEqual(single, ten)
+        self.assertEqual(Decimal(response.data['order']['total']), Decimal('120000'))
+
+    def test_catalog_invalidated_on_price_change(self):
+        self._count_queries(self.menus[:1])
+        self.menus[0].price = 20000
+        self.menus[0].save()
+
+        _, response = self._count_queries(self.menus[:1])
+        self.assertEqual(Decimal(response.data['order']['total']), Decimal('22000'))
+
+    def test_rejects_variant_from_other_menu(self):
+        other_group = VariantGroup.objects.create(tenant=self.tenant, name="Ukuran")
+        other_option = VariantOption.objects.create(group=other_group, name="Besar", price=3000)
+        payload = self._payload(self.menus[:1])
+        payload['items'][0]['variants'] = [other_option.id]
+
+        response = self.client.post(reverse('create-order'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderPinTests(APITestCase):
+    """Tes untuk skema PIN kasir berbasis HMAC (orders.pins)."""
+
+    def test_pin_hash_is_scoped_to_references_code(self):
+        order = Order(references_code="KNT-1", cashier_pin=hash_order_pin("KNT-1", "123456"))
+        self.assertTrue(check_order_pin(order, "123456"))
+        self.assertFalse(check_order_pin(order, "654321"))
+
+        other = Order(references_code="KNT-2", cashier_pin=order.cashier_pin)
+        self.assertFalse(check_order_pin(other, "123456"))
+
+    def test_legacy_pbkdf2_pin_still_verifies(self):
+        order = Order(references_code="KNT-3", cashier_pin=make_password("111222"))
+        self.assertTrue(check_order_pin(order, "111222"))
+
+    def test_issued_pin_is_reserved(self):
+        pin, hashed = issue_order_pin("KNT-4")
+        self.assertEqual(cache.get(_reservation_key(pin)), "KNT-4")
+        self.assertEqual(hashed, hash_order_pin("KNT-4", pin))
+
+    def test_unreserved_pin_is_never_returned(self):
+        # Semua PIN yang dicoba sudah aktif untuk order lain
+        cache.set(_reservation_key("135790"), "KNT-LAIN", timeout=60)
+        with mock.patch('orders.pins.generate_order_pin', return_value="135790"):
+            with self.assertRaises(PinUnavailable):
+                issue_order_pin("KNT-5")
+        self.assertEqual(cache.get(_reservation_key("135790")), "KNT-LAIN")
+        cache.delete(_reservation_key("135790"))
+
+    def test_release_only_drops_own_reservation(self):
+        pin, _ = issue_order_pin("KNT-6")
+        release_order_pin(pin, "KNT-LAIN")
+        self.assertEqual(cache.get(_reservation_key(pin)), "KNT-6")
+        release_order_pin(pin, "KNT-6")
+        self.assertIsNone(cache.get(_reservation_key(pin)))
+
+
+class StockReservationTests(APITestCase):
+    """Tes: Reservasi stok memakai UPDATE bersyarat (tenants.stock)."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Stok", active=True)
+        self.menu = MenuItem.objects.create(tenant=self.tenant, name="Es Teh", price=5000, stock=3)
+        self.other = MenuItem.objects.create(tenant=self.tenant, name="Kopi", price=8000, stock=10)
+
+    def _order(self, items):
+        payload = {
+            "tenant": self.tenant.id,
+            "name": "Pembeli",
+            "email": "pembeli@example.com",
+            "payment_method": "CASH",
+            "items": items,
+        }
+        return self.client.post(reverse('create-order'), payload, format='json')
+
+    def test_duplicate_lines_are_aggregated_before_reserving(self):
+        # 2 + 2 > stok 3: tidak boleh lolos walau tiap baris sendiri-sendiri cukup
+        response = self._order([
+            {"menu_item": self.other.id, "qty": 1},
+            {"menu_item": self.menu.id, "qty": 2},
+            {"menu_item": self.menu.id, "qty": 2},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Es Teh", str(response.data))
+
+        # Pengurangan stok item lain di transaksi yang sama ikut di-rollback
+        self.menu.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.menu.stock, 3)
+        self.assertEqual(self.other.stock, 10)
+        self.assertFalse(Order.objects.exists())
+
+    def test_failed_order_releases_pin_reservation(self):
+        cache.delete(_reservation_key("864201"))
+        with mock.patch('orders.pins.generate_order_pin', return_value="864201"):
+            response = self._order([{"menu_item": self.menu.id, "qty": 4}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(cache.get(_reservation_key("864201")))
+
+    def test_cancel_restocks_atomically(self):
+        response = self._order([{"menu_item": self.menu.id, "qty": 1}, {"menu_item": self.menu.id, "qty": 2}])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.menu.refresh_from_db()
+        self.assertEqual(self.menu.stock, 0)
+
+        # Stok berubah di tempat lain sebelum cancel: increment tidak boleh menimpanya
+        MenuItem.objects.filter(pk=self.menu.pk).update(stock=5)
+        order = Order.objects.get()
+        self.assertTrue(order.cancel_and_restock())
+        self.menu.refresh_from_db()
+        self.assertEqual(self.menu.stock, 8)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StockReservationConcurrencyTests(TransactionTestCase):
+    """Stress test: banyak thread berebut satu menu, stok tidak boleh minus/oversell."""
+
+    THREADS = 8
+    ATTEMPTS = 10
+    STOCK = 25
+
+    def test_concurrent_reservations_never_oversell(self):
+        tenant = Tenant.objects.create(name="Stand Rebutan", active=True)
+        menu = MenuItem.objects.create(tenant=tenant, name="Nasi Goreng", price=12000, stock=self.STOCK)
+        sold = []
+
+        def worker():
+            try:
+                for _ in range(self.ATTEMPTS):
+                    try:
+                        with transaction.atomic():
+                            reserve_stock(tenant.pk, {menu.pk: 1})
+                        sold.append(1)
+                    except InsufficientStock:
+                        pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        menu.refresh_from_db()
+        self.assertEqual(len(sold), self.STOCK)
+        self.assertEqual(menu.stock, 0)
+
+
+class PaymentInitiationTests(APITestCase):
+    """Tes: Inisiasi Snap lewat client ter-pool terhadap fake Snap server lokal."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.snap_server, cls.snap_base_url = start_fake_snap_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.snap_server.shutdown()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Transfer", active=True)
+        self.menus = [
+            MenuItem.objects.create(tenant=self.tenant, name=f"Menu {i}", price=10000, stock=50)
+            for i in range(5)
+        ]
+
+    def _create(self, menus):
+        payload = {
+            "tenant": self.tenant.id,
+            "name": "Pembeli",
+            "email": "pembeli@example.com",
+            "payment_method": "TRANSFER",
+            "items": [{"menu_item": m.id, "qty": 2} for m in menus],
+        }
+        return self.client.post(reverse('create-order'), payload, format='json')
+
+    def test_sync_initiation_returns_snap_token(self):
+        with self.settings(MIDTRANS_SNAP_BASE_URL=self.snap_base_url):
+            response = self._create(self.menus)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertTrue(response.data['snap_token'])
+        self.assertEqual(response.data['payment_status'], 'READY')
+        order = Order.objects.get(uuid=response.data['order']['uuid'])
+        self.assertEqual(order.meta['payment']['token'], response.data['snap_token'])
+
+    def test_payload_query_count_is_constant(self):
+        with self.settings(MIDTRANS_SNAP_BASE_URL=self.snap_base_url):
+            order_id = Order.objects.get(uuid=self._create(self.menus).data['order']['uuid']).pk
+        with CaptureQueriesContext(connection) as ctx:
+            payload = build_snap_payload(payment_queryset().get(pk=order_id))
+        # Order + customer (join) dan satu prefetch item beserta menu
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(len(payload['item_details']), 5)
+        self.assertEqual(payload['transaction_details']['gross_amount'], 100000)
+
+    def test_gateway_down_does_not_fail_order(self):
+        with self.settings(MIDTRANS_SNAP_BASE_URL='http://127.0.0.1:1/snap/v1', MIDTRANS_TIMEOUT=(0.5, 0.5)):
+            response = self._create(self.menus[:1])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(response.data['snap_token'])
+        self.assertEqual(response.data['payment_status'], 'FAILED')
+
+    def test_async_initiation_returns_pending_then_token(self):
+        with self.settings(MIDTRANS_SNAP_BASE_URL=self.snap_base_url, MIDTRANS_ASYNC_INITIATION=True):
+            with self.captureOnCommitCallbacks(execute=False):
+                response = self._create(self.menus[:1])
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertIsNone(response.data['snap_token'])
+            self.assertEqual(response.data['payment_status'], 'PENDING')
+
+            order = Order.objects.get(uuid=response.data['order']['uuid'])
+            initiate_order_payment.apply(args=[order.pk])
+
+        order.refresh_from_db()
+        self.assertEqual(order.meta['payment']['status'], 'READY')
+        self.assertTrue(order.meta['payment']['token'])
+
+
+class CreateOrderIdempotencyTests(APITestCase):
+    """Tes: Header Idempotency-Key pada pembuatan order."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Idempoten", active=True)
+        self.menu = MenuItem.objects.create(tenant=self.tenant, name="Bakso", price=15000, stock=10)
+        self.payload = {
+            "tenant": self.tenant.id,
+            "name": "Pembeli",
+            "email": "pembeli@example.com",
+            "payment_method": "CASH",
+            "items": [{"menu_item": self.menu.id, "qty": 1}],
+        }
+        self.key_suffix = uuid.uuid4().hex
+
+    def _post(self, key, payload=None):
+        # Key unik per test agar respons tersimpan di Redis tidak bocor antar run
+        key = f"{key}-{self.key_suffix}"
+        return self.client.post(
+            reverse('create-order'), payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_stored_response_without_database(self):
+        first = self._post("tap-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED, first.data)
+
+        # Hanya lookup sesi oleh autentikasi DRF; tidak ada query order/stok
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self._post("tap-1")
+        self.assertFalse([q for q in ctx.captured_queries if 'django_session' not in q['sql']])
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['order']['uuid'], first.data['order']['uuid'])
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.menu.refresh_from_db()
+        self.assertEqual(self.menu.stock, 9)
+
+    def test_same_key_with_different_body_is_rejected(self):
+        self._post("tap-2")
+        payload = {**self.payload, "items": [{"menu_item": self.menu.id, "qty": 3}]}
+        response = self._post("tap-2", payload)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_duplicate_waits_on_lock(self):
+        # Simulasikan permintaan pertama yang masih memegang lock
+        from orders.idempotency import _cache_key
+        user = User.objects.create_user(username="pembeli_idempoten", password="x")
+        self.client.force_authenticate(user)
+        cache.add(f"lock_{_cache_key('create-order', f'user:{user.pk}', f'tap-3-{self.key_suffix}')}", 'x', timeout=5)
+
+        with self.settings(IDEMPOTENCY_LOCK_WAIT=0.2):
+            response = self._post("tap-3")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Order.objects.exists())
+
+    def test_cookieless_guest_retry_is_replayed(self):
+        # Double-tap / retry setelah respons hilang: klien belum pernah menerima cookie
+        first = self._post("tap-4")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.client.cookies.clear()
+        retry = self._post("tap-4")
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['order']['uuid'], first.data['order']['uuid'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_same_guest_key_for_other_tenant_is_not_replayed(self):
+        other_tenant = Tenant.objects.create(name="Stand Lain", active=True)
+        other_menu = MenuItem.objects.create(tenant=other_tenant, name="Soto", price=12000, stock=10)
+        self._post("tap-6")
+        payload = {**self.payload, "tenant": other_tenant.id, "items": [{"menu_item": other_menu.id, "qty": 1}]}
+        response = self._post("tap-6", payload)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_lock_is_only_released_by_its_owner(self):
+        from orders.idempotency import _cache_key
+        user = User.objects.create_user(username="pembeli_lambat", password="x")
+        self.client.force_authenticate(user)
+        lock_key = f"lock_{_cache_key('create-order', f'user:{user.pk}', f'tap-5-{self.key_suffix}')}"
+
+        def slow_create(serializer_self, *args, **kwargs):
+            # Lock permintaan ini kedaluwarsa dan diambil permintaan lain
+            cache.set(lock_key, 'milik-permintaan-lain', timeout=5)
+            raise serializers.ValidationError('gagal')
+
+        with mock.patch('orders.views.OrderCreateSerializer.is_valid', slow_create):
+            self._post("tap-5")
+        self.assertEqual(cache.get(lock_key), 'milik-permintaan-lain')
+        cache.delete(lock_key)
+
+
+class OrderKanbanTests(APITestCase):
+    """Tes: Mode ?view=kanban pada OrderListView memakai proyeksi ringan dengan budget query."""
+
+    # Admin: COUNT halaman + order + item + varian terpilih
+    KANBAN_QUERY_BUDGET = 4
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_kanban", password="x", is_staff=True)
+        self.tenant = Tenant.objects.create(name="Stand Kanban", active=True)
+        self.group = VariantGroup.objects.create(tenant=self.tenant, name="Level")
+        self.option = VariantOption.objects.create(group=self.group, name="Pedas", price=1000)
+        self.menu = MenuItem.objects.create(tenant=self.tenant, name="Mie Ayam", price=12000, stock=100)
+        self.client.force_authenticate(self.admin)
+
+    def _make_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(tenant=self.tenant, payment_method="CASH", status="PAID", total=13000)
+            for _ in range(2):
+                item = OrderItem.objects.create(order=order, menu_item=self.menu, qty=1, price=13000)
+                item.selected_variants.add(self.option)
+
+    def _kanban(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('order-list'), {'view': 'kanban', 'page_size': 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries), response
+
+    def test_query_budget_is_constant_in_page_size(self):
+        self._make_orders(1)
+        single, _ = self._kanban()
+        self._make_orders(30)
+        many, response = self._kanban()
+
+        self.assertLessEqual(many, self.KANBAN_QUERY_BUDGET)
+        self.assertEqual(single, many)
+        self.assertEqual(response.data['count'], 31)
+
+    def test_projection_is_flat_and_omits_sensitive_fields(self):
+        self._make_orders(1)
+        _, response = self._kanban()
+        row = response.data['results'][0]
+
+        self.assertNotIn('meta', row)
+        self.assertNotIn('cashier_pin', row)
+        self.assertEqual(row['tenant_name'], "Stand Kanban")
+        self.assertEqual(row['status'], 'PAID')
+        self.assertEqual(len(row['items']), 2)
+        self.assertEqual(row['items'][0]['menu_item_name'], "Mie Ayam")
+        self.assertEqual(row['items'][0]['variants'][0]['name'], "Pedas")
+
+    def test_kanban_reports_effective_status(self):
+        Order.objects.create(
+            tenant=self.tenant, payment_method="CASH", status="AWAITING_PAYMENT",
+            expired_at=timezone.now() - timedelta(minutes=1)
+        )
+        _, response = self._kanban()
+        self.assertEqual(response.data['results'][0]['status'], 'EXPIRED')
+
+
+class OrderListKeysetPaginationTests(APITestCase):
+    """Tes: ?pagination=cursor pada OrderListView (keyset created_at, id)."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_cursor", password="x", is_staff=True)
+        self.tenant = Tenant.objects.create(name="Stand Cursor", active=True)
+        for _ in range(25):
+            Order.objects.create(tenant=self.tenant, payment_method="CASH", status="PAID", total=1000)
+        # Beberapa order dengan created_at identik: id menjadi pemecah seri
+        same_time = timezone.now() - timedelta(hours=1)
+        Order.objects.filter(pk__in=list(Order.objects.values_list('pk', flat=True)[:6])).update(created_at=same_time)
+        self.client.force_authenticate(self.admin)
+
+    def _walk(self, params):
+        url, seen, query_counts = reverse('order-list'), [], []
+        params = {'pagination': 'cursor', 'page_size': 10, **params}
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            query_counts.append(len(ctx.captured_queries))
+            seen.extend(row['id'] for row in response.data['results'])
+            url, params = response.data['next'], None
+        return seen, query_counts
+
+    def test_walks_every_order_once_with_constant_queries(self):
+        seen, query_counts = self._walk({'view': 'kanban'})
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(query_counts), 3)
+        self.assertEqual(len(set(query_counts)), 1)
+
+    def test_serializer_mode_supports_cursor(self):
+        seen, _ = self._walk({})
+        self.assertEqual(len(seen), 25)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('order-list'), {'pagination': 'cursor', 'cursor': 'bukan-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class OrderDeltaSyncTests(APITestCase):
+    """Tes: Mode ?since=<token> pada OrderListView (updated_at high-water mark)."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Sinkron", active=True)
+        self.staff = User.objects.create_user(username="staff_sinkron", password="x")
+        self.tenant.staff.add(self.staff)
+        self.orders = [
+            Order.objects.create(tenant=self.tenant, payment_method="CASH", status="PAID", total=1000)
+            for _ in range(5)
+        ]
+        self.client.force_authenticate(self.staff)
+
+    def _sync_token(self):
+        response = self.client.get(reverse('order-list'), {'view': 'kanban'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Mundurkan semua updated_at agar keluar dari jendela overlap
+        Order.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+        return response['X-Sync-Token']
+
+    def _delta(self, token, **params):
+        return self.client.get(reverse('order-list'), {'since': token, **params})
+
+    def test_save_with_update_fields_bumps_updated_at(self):
+        order = self.orders[0]
+        before = order.updated_at
+        order.status = 'PROCESSING'
+        order.save(update_fields=['status'])
+        order.refresh_from_db()
+        self.assertGreater(order.updated_at, before)
+
+    def test_returns_only_changed_orders_and_tombstones(self):
+        token = self._sync_token()
+        moved, finished = self.orders[0], self.orders[1]
+        moved.status = 'PROCESSING'
+        moved.save(update_fields=['status'])
+        finished.status = 'COMPLETED'
+        finished.save(update_fields=['status'])
+        new_order = Order.objects.create(tenant=self.tenant, payment_method="CASH", status="PAID", total=500)
+
+        response = self._delta(token, view='kanban')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['reset'])
+        self.assertEqual({row['id'] for row in response.data['results']}, {moved.id, new_order.id})
+        # Order COMPLETED keluar dari papan tenant: dikirim sebagai tombstone
+        self.assertEqual(response.data['removed'], [finished.id])
+        self.assertTrue(response.data['since'])
+
+    def test_bulk_expiry_is_visible_to_delta_sync(self):
+        order = Order.objects.create(
+            tenant=self.tenant, payment_method="CASH", status="AWAITING_PAYMENT",
+            expired_at=timezone.now() - timedelta(minutes=1)
+        )
+        token = self._sync_token()
+        expire_due_orders()
+
+        response = self._delta(token)
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['removed'], [order.id])
+
+    def test_no_changes_is_cheap_and_empty(self):
+        token = self._sync_token()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._delta(token, view='kanban')
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['removed'], [])
+        # Cek grup kasir + satu query id order yang berubah
+        self.assertLessEqual(len(ctx.captured_queries), 2)
+
+    def test_invalid_token_is_rejected(self):
+        response = self._delta('bukan-token')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderTransitionNotificationTests(APITestCase):
+    """Tes: Setiap transisi status order dikirim ke dashboard tenant, digabung per tenant."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_notifikasi", password="x", is_staff=True)
+        self.tenant_a = Tenant.objects.create(name="Stand Notif A", active=True)
+        self.tenant_b = Tenant.objects.create(name="Stand Notif B", active=True)
+        self.menu = MenuItem.objects.create(tenant=self.tenant_a, name="Es Jeruk", price=5000, stock=20)
+        publisher = mock.patch('orders.notifications.publish_tenant_event')
+        self.publish = publisher.start()
+        self.addCleanup(publisher.stop)
+        scheduler = mock.patch('orders.tasks.flush_order_transitions.apply_async')
+        self.schedule_flush = scheduler.start()
+        self.addCleanup(scheduler.stop)
+        self.client.force_authenticate(self.admin)
+
+    def _order(self, tenant, status='AWAITING_PAYMENT'):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(
+                tenant=tenant, payment_method='CASH', status=status,
+                expired_at=timezone.now() - timedelta(minutes=1),
+            )
+        return order
+
+    def _start_window(self):
+        # id tenant dipakai ulang antar test: buang buffer dan gate yang tersisa
+        for tenant in (self.tenant_a, self.tenant_b):
+            flush_tenant_transitions(tenant.id)
+        self.publish.reset_mock()
+        self.schedule_flush.reset_mock()
+
+    def _end_window(self):
+        """Jalankan flush yang dijadwalkan (di produksi: Celery, countdown = jendela)."""
+        for call in self.schedule_flush.call_args_list:
+            flush_tenant_transitions(*call.kwargs['args'])
+
+    def _published(self):
+        return {call.args[0]: call.args[1]['orders'] for call in self.publish.call_args_list}
+
+    def test_status_update_publishes_compact_delta(self):
+        order = self._order(self.tenant_a, status='PAID')
+        self._start_window()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('update-order-status', args=[order.uuid]), {'status': 'PROCESSING'}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.publish.assert_not_called()
+        self.schedule_flush.assert_called_once_with(args=[self.tenant_a.id], countdown=1)
+
+        self._end_window()
+        self.publish.assert_called_once()
+        tenant_id, message = self.publish.call_args.args
+        self.assertEqual(tenant_id, self.tenant_a.id)
+        self.assertEqual(message['type'], ORDER_TRANSITION_EVENT)
+        [delta] = message['orders']
+        self.assertIsNotNone(delta.pop('updated_at'))
+        self.assertEqual(delta, {
+            'id': order.id, 'uuid': str(order.uuid), 'references_code': order.references_code,
+            'status': 'PROCESSING', 'previous_status': 'PAID',
+        })
+
+    def test_bulk_expiry_sends_one_message_per_tenant(self):
+        orders_a = [self._order(self.tenant_a) for _ in range(3)]
+        orders_b = [self._order(self.tenant_b) for _ in range(2)]
+        self._start_window()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            expire_due_orders(batch_size=2)
+        self.assertEqual(self.schedule_flush.call_count, 2)
+        self._end_window()
+
+        self.assertEqual(self.publish.call_count, 2)
+        published = self._published()
+        self.assertEqual([delta['id'] for delta in published[self.tenant_a.id]], [o.id for o in orders_a])
+        self.assertEqual([delta['id'] for delta in published[self.tenant_b.id]], [o.id for o in orders_b])
+        for delta in published[self.tenant_a.id] + published[self.tenant_b.id]:
+            self.assertEqual((delta['previous_status'], delta['status']), ('AWAITING_PAYMENT', 'EXPIRED'))
+
+    def test_per_order_expiry_tasks_in_one_window_send_one_message(self):
+        orders_a = [self._order(self.tenant_a) for _ in range(3)]
+        self._start_window()
+
+        # Jalur utama: satu task ETA expire_order per order
+        for order in orders_a:
+            with self.captureOnCommitCallbacks(execute=True):
+                expire_order(order.pk)
+        self.schedule_flush.assert_called_once()
+        self._end_window()
+
+        self.publish.assert_called_once()
+        self.assertEqual([delta['id'] for delta in self._published()[self.tenant_a.id]], [o.id for o in orders_a])
+
+    def test_rolled_back_transition_is_not_published(self):
+        kept = self._order(self.tenant_a, status='PAID')
+        rolled_back = self._order(self.tenant_a, status='PAID')
+        self._start_window()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            kept.status = 'PROCESSING'
+            kept.save(update_fields=['status'])
+            try:
+                with transaction.atomic():
+                    rolled_back.status = 'PROCESSING'
+                    rolled_back.save(update_fields=['status'])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self._end_window()
+
+        self.publish.assert_called_once()
+        self.assertEqual([delta['id'] for delta in self._published()[self.tenant_a.id]], [kept.id])
+
+    def test_requests_in_one_window_merge_per_order(self):
+        order = self._order(self.tenant_a, status='PAID')
+        self._start_window()
+
+        # Dua PATCH dari request terpisah yang berdekatan
+        for new_status in ('PROCESSING', 'READY'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(reverse('update-order-status', args=[order.uuid]), {'status': new_status}, format='json')
+        self.publish.assert_not_called()
+        self._end_window()
+
+        self.publish.assert_called_once()
+        [delta] = self._published()[self.tenant_a.id]
+        self.assertEqual((delta['previous_status'], delta['status']), ('PAID', 'READY'))
+
+    def test_transition_after_flush_opens_new_window(self):
+        order = self._order(self.tenant_a, status='PAID')
+        self._start_window()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'PROCESSING'
+            order.save(update_fields=['status'])
+        self._end_window()
+        self.schedule_flush.reset_mock()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'READY'
+            order.save(update_fields=['status'])
+        self.schedule_flush.assert_called_once()
+        self._end_window()
+        self.assertEqual(self.publish.call_count, 2)
+
+    def test_unavailable_broker_publishes_directly(self):
+        order = self._order(self.tenant_a, status='PAID')
+        self._start_window()
+        self.schedule_flush.side_effect = ConnectionError
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'PROCESSING'
+            order.save(update_fields=['status'])
+        self.publish.assert_called_once()
+
+    def test_scheduling_leaves_other_on_commit_callbacks_in_place(self):
+        order = self._order(self.tenant_a, status='PAID')
+        self._start_window()
+        # Transisi lain yang masih menunggu commit transaksi luar
+        other = Order.objects.create(tenant=self.tenant_a, payment_method='CASH')
+
+        ran = []
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'PROCESSING'
+            order.save(update_fields=['status'])
+            transaction.on_commit(lambda: ran.append(True))
+        self.assertEqual(ran, [True])
+        self._end_window()
+        self.assertEqual([delta['id'] for delta in self._published()[self.tenant_a.id]], [order.id])
+        self.assertNotIn(other.id, [delta['id'] for delta in self._published()[self.tenant_a.id]])
+
+
+class PaidOrderNotificationTests(APITestCase):
+    """Tes: Notifikasi order lunas dikirim langsung dari proses web, Celery hanya fallback."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Lunas", active=True)
+        self.order = Order.objects.create(tenant=self.tenant, payment_method='CASH', status='PAID', total=12000)
+        publisher = mock.patch('orders.notifications.publish_tenant_event')
+        self.publish = publisher.start()
+        self.addCleanup(publisher.stop)
+        fallback = mock.patch('orders.tasks.send_order_paid_notification.delay')
+        self.delay = fallback.start()
+        self.addCleanup(fallback.stop)
+
+    def test_paid_order_is_published_after_commit_without_celery(self):
+        data = OrderSerializer(Order.objects.with_detail_relations().get(pk=self.order.pk)).data
+        with self.captureOnCommitCallbacks() as callbacks:
+            schedule_paid_order_notification(self.order, data)
+            self.publish.assert_not_called()
+        # Payload dari view dipakai apa adanya, hook tidak membaca ulang DB
+        with self.assertNumQueries(0):
+            for callback in callbacks:
+                callback()
+
+        self.publish.assert_called_once()
+        tenant_id, message = self.publish.call_args.args
+        self.assertEqual(tenant_id, self.tenant.id)
+        self.assertEqual(message['type'], PAID_ORDER_EVENT)
+        self.assertEqual(message['order']['uuid'], str(self.order.uuid))
+        self.delay.assert_not_called()
+
+    def test_failed_direct_publish_falls_back_to_celery(self):
+        self.publish.side_effect = ConnectionError("channel layer down")
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_paid_order_notification(self.order, {'uuid': str(self.order.uuid)})
+        self.delay.assert_called_once_with(self.order.pk)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, ORDER_TRANSITION_WINDOW_SECONDS=0)
+class GuestOrderStatusChannelTests(TransactionTestCase):
+    """Tes: Guest memantau status ordernya lewat WebSocket dengan token X-Order-Token."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Guest", active=True)
+        self.order = Order.objects.create(tenant=self.tenant, payment_method='CASH', status='PAID')
+        self.other = Order.objects.create(tenant=self.tenant, payment_method='CASH', status='PAID')
+        self.path = f"/ws/orders/{self.order.uuid}/status/"
+
+    def _client(self, token):
+        return WebsocketClient(
+            self.path, urlpatterns=order_routing.websocket_urlpatterns, query_string=f"token={token}".encode()
+        )
+
+    async def test_guest_receives_snapshot_then_transitions(self):
+        client = self._client(generate_order_token(str(self.order.uuid)))
+        self.assertTrue(await client.connect())
+        snapshot = await client.receive_json()
+        self.assertEqual((snapshot['type'], snapshot['status']), ('order_status', 'PAID'))
+
+        await sync_to_async(self._advance)(self.other, 'PROCESSING')
+        await sync_to_async(self._advance)(self.order, 'PROCESSING')
+        event = await client.receive_json()
+        self.assertEqual(event['uuid'], str(self.order.uuid))
+        self.assertEqual((event['previous_status'], event['status']), ('PAID', 'PROCESSING'))
+        # Transisi order lain tidak dikirim ke guest ini
+        self.assertTrue(await client.receive_nothing(0.1))
+        await client.disconnect()
+
+    async def test_token_header_is_accepted(self):
+        client = WebsocketClient(
+            self.path, urlpatterns=order_routing.websocket_urlpatterns,
+            headers=[(b'x-order-token', generate_order_token(str(self.order.uuid)).encode())],
+        )
+        self.assertTrue(await client.connect())
+        await client.disconnect()
+
+    async def test_invalid_token_is_rejected(self):
+        # Token order lain tidak berlaku
+        client = self._client(generate_order_token(str(self.other.uuid)))
+        self.assertFalse(await client.connect())
+
+    def _advance(self, order, new_status):
+        order.status = new_status
+        order.save(update_fields=['status'])
@@ -19,7 +19,6 @@ from rest_framework.throttling import ScopedRateThrottle
 from decimal import Decimal
 from rest_framework.throttling import AnonRateThrottle
 
-from django.contrib.auth.hashers import make_password
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions, generics, viewsets, serializers
@@ -27,83 +26,116 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated, OR
 from rest_framework.throttling import AnonRateThrottle
 
-from .models import Order, OrderItem, Customer, MenuItem, Tenant, Table, generate_order_pin, PaymentWebhookLog
+from .models import Order, OrderItem, Customer, MenuItem, Tenant, Table, generate_references_code, PaymentWebhookLog
+from .pins import PinUnavailable, issue_order_pin, release_order_pin
+from .idempotency import idempotent
+from .kanban import kanban_queryset, build_kanban_rows
+from canteen.db_routers import ReplicaReadMixin, is_reading_from_replica, replica_max_lag
+from canteen.pagination import KeysetPaginationMixin
+from .sync import SYNC_MAX_CHANGES, changed_since, issue_sync_token
 from .serializers import (
     OrderSerializer, OrderCreateSerializer
 )
 from .permissions import (
     IsOrderTenantStaff, IsGuestOrderOwner
 )
-from .tasks import send_order_paid_notification, send_cash_order_invoice
+from .tasks import send_cash_order_invoice, expire_order, initiate_order_payment
+from .notifications import schedule_paid_order_notification
+from .signals import order_items_changed
+from .payments import PaymentGatewayError, initiate_payment, mark_payment_failed
 from tenants.models import Tenant, MenuItem, VariantOption
+from tenants.stock import reserve_stock, InsufficientStock
 from tenants.serializers import MenuItemSerializer
+from reports.dashboard import get_dashboard
+from reports.popularity import (
+    DEFAULT_WINDOW as DEFAULT_POPULARITY_WINDOW, WINDOWS as POPULARITY_WINDOWS, top_menu_ids
+)
 import qrcode
 import io
 
+logger = logging.getLogger(__name__)
+
 # Placeholder: dummy gateway payment
 def initiate_payment_for_order(order: Order):
-    import midtransclient
-    snap = midtransclient.Snap(
-        is_production=False,
-        server_key=settings.MIDTRANS_SERVER_KEY,
-        client_key=settings.MIDTRANS_CLIENT_KEY
-    )
-
-    param = {
-        "transaction_details": {
-            "order_id": order.references_code,
-            "gross_amount": int(float(order.total))
-        },
-        "item_details": [{
-            "id": item.menu_item.id,
-            "price": int(float(item.price)),
-            "quantity": item.qty,
-            "name": item.menu_item.name
-        } for item in order.items.all()],
-        "customer_details": {
-            "first_name": order.customer.name,
-            "email": order.customer.email,
-        }
-    }
+    """
+    Inisiasi Snap secara sinkron lewat client ter-pool (orders.payments).
+    Gateway yang gagal/timeout tidak menggagalkan order: status FAILED dicatat
+    di meta.payment dan None dikembalikan.
+    """
+    try:
+        return initiate_payment(order.pk)
+    except PaymentGatewayError:
+        logger.exception(f"Inisiasi pembayaran order {order.references_code} gagal")
+        mark_payment_failed(order.pk)
+        return None
+
+def queue_payment_initiation(order: Order):
+    """Mode async: snap token dibuat oleh Celery, klien mem-poll meta.payment di detail order."""
+    try:
+        initiate_order_payment.delay(order.pk)
+    except Exception:
+        logger.exception(f"Gagal mengantrekan inisiasi pembayaran {order.references_code}, jalankan sinkron")
+        initiate_payment_for_order(order)
 
-    transaction = snap.create_transaction(param)
-    return transaction
+def schedule_order_expiry(order: Order):
+    """
+    Antrekan task expire_order tepat di expired_at (ETA). Kegagalan broker
+    tidak boleh menggagalkan order; sweep per menit akan menanganinya.
+    """
+    if not order.expired_at:
+        return
+    try:
+        expire_order.apply_async(args=[order.pk], eta=order.expired_at + timedelta(seconds=1))
+    except Exception:
+        logger.exception(f"Gagal menjadwalkan expiry untuk order {order.references_code}")
 
 class PopularMenusView(generics.ListAPIView):
     """
     Mengembalikan daftar menu yang paling banyak dipesan (populer)
     dari semua stand yang aktif dan menu yang tersedia.
-    (Versi query yang sudah dioptimalkan)
+    Dibaca dari indeks popularitas ber-peluruhan waktu di Redis
+    (reports.popularity), bukan dari agregasi seluruh tabel OrderItem.
+    Parameter: ?tenant=<id>, ?window=1-hari|7-hari|30-hari (half-life), ?limit=<n>.
     """
     serializer_class = MenuItemSerializer
     permission_classes = [AllowAny]
+    max_limit = 50
 
     def get_queryset(self):
-        # 1. Hitung 10 menu_item_id terlaris dari tabel OrderItem
-        # Ini adalah query pertama (cepat)
-        top_menu_item_ids = OrderItem.objects.values('menu_item_id') \
-            .annotate(total_sold=Sum('qty')) \
-            .filter(total_sold__gt=0) \
-            .order_by('-total_sold') \
-            .values_list('menu_item_id', flat=True)[:10]
-
-        # 2. Ambil objek MenuItem yang lengkap berdasarkan 10 ID teratas
+        params = self.request.query_params
+        window = params.get('window', DEFAULT_POPULARITY_WINDOW)
+        if window not in POPULARITY_WINDOWS:
+            raise serializers.ValidationError({'window': f"Pilihan: {', '.join(POPULARITY_WINDOWS)}."})
+        try:
+            tenant_id = int(params['tenant']) if params.get('tenant') else None
+            limit = min(max(int(params.get('limit', 10)), 1), self.max_limit)
+        except ValueError:
+            raise serializers.ValidationError({'detail': 'Parameter tenant/limit harus berupa angka.'})
+
+        # 1. Ambil id teratas dari sorted set (lebih banyak dari limit untuk
+        #    menutup menu yang sedang tidak tersedia)
+        try:
+            top_menu_item_ids = top_menu_ids(tenant_id, window, limit * 2)
+        except Exception:
+            logger.warning("Indeks popularitas menu tidak dapat dibaca.")
+            return []
+
+        # 2. Ambil objek MenuItem yang lengkap berdasarkan ID teratas
         #    Pastikan juga tenant-nya aktif & item-nya available
-        # Ini adalah query kedua (cepat)
         top_menu_items = MenuItem.objects.filter(
-            pk__in=list(top_menu_item_ids), # Ambil hanya yang ID-nya ada di daftar
+            pk__in=top_menu_item_ids, # Ambil hanya yang ID-nya ada di daftar
             available=True,
             tenant__active=True
         ).prefetch_related('tenant') # Optimalisasi
 
         # 3. Buat dictionary untuk memetakan id -> item
         items_map = {item.id: item for item in top_menu_items}
-        
-        # 4. Kembalikan daftar yang sudah terurut berdasarkan 'top_menu_item_ids'
+
+        # 4. Kembalikan daftar yang sudah terurut berdasarkan skor
         #    (karena 'pk__in' tidak menjamin urutan)
         sorted_items = [items_map[item_id] for item_id in top_menu_item_ids if item_id in items_map]
-        
-        return sorted_items
+
+        return sorted_items[:limit]
 
 
 
@@ -112,12 +144,15 @@ class CreateOrderView(APIView):
   throttle_classes = [ScopedRateThrottle] # Gunakan Scoped global
   throttle_scope = 'burst'
 
+  @idempotent('create-order')
   def post(self, request):
     serializer = OrderCreateSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
 
     data = serializer.validated_data
-    tenant = get_object_or_404(Tenant, pk=data['tenant'], active=True)
+    # Katalog harga yang sudah dimuat saat validasi; tidak ada query Tenant/MenuItem/VariantOption ulang
+    catalog = serializer.catalog
+    tenant_id = catalog['tenant_id']
     table = None
     if data.get('table'):
       table,_ = Table.objects.get_or_create(code=data['table'])
@@ -128,77 +163,72 @@ class CreateOrderView(APIView):
     phone = data.get('phone')
     if email:
       customer, _ = Customer.objects.get_or_create(email=email, defaults={'name': name, 'phone': phone})
+
+    # Harga final per baris dihitung di memori dari katalog (harga menu + varian)
+    items_data = data['items']
+    line_prices = []
+    total = 0
+    for item_data in items_data:
+        catalog_item = catalog['items'][item_data['menu_item']]
+        variant_price = sum(
+            (catalog['options'][variant_id]['price'] for variant_id in item_data.get('variants', [])), 0
+        )
+        item_final_price = catalog_item['price'] + variant_price
+        line_prices.append(item_final_price)
+        total += item_final_price * item_data['qty']
+      
+    # PIN kasir dibuat di luar transaksi: HMAC berkunci per references_code,
+    # biaya konstan dan tidak menahan lock stok (lihat orders.pins)
+    references_code = generate_references_code()
+    cashier_pin_db = None
+    plain_pin_for_email = None
+    if data['payment_method'] == 'CASH':
+        try:
+            plain_pin_for_email, cashier_pin_db = issue_order_pin(references_code)
+        except PinUnavailable:
+            return Response(
+                {'detail': 'Sistem sedang sibuk, silakan coba lagi.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
       
+    is_transfer = data['payment_method'].strip().upper() == 'TRANSFER'
     try:
       with transaction.atomic():
-        items_data = data['items']
-        menu_item_ids = [item['menu_item'] for item in items_data]
-        menu_items_to_update = MenuItem.objects.select_for_update().filter(pk__in=menu_item_ids, tenant=tenant)
-        
-        menu_items_map = {item.pk: item for item in menu_items_to_update}
-
+        # Reservasi stok atomik per menu (tanpa SELECT FOR UPDATE + bulk_update);
+        # baris yang sama di keranjang dijumlahkan dulu agar tidak oversell.
+        quantities = {}
         for item_data in items_data:
-            menu_item = menu_items_map.get(item_data['menu_item'])
-            if not menu_item or not menu_item.available or menu_item.stock < item_data['qty']:
-                raise serializers.ValidationError(f"Stok untuk '{menu_item.name if menu_item else 'item'}' tidak mencukupi atau tidak tersedia.")
-
-        cashier_pin_db = None
-        plain_pin_for_email = None 
-
-        if data['payment_method'] == 'CASH':
-            while True:
-                pin = generate_order_pin() # PIN Asli (contoh: 123456)
-                
-                # Buat Hash SHA-256 dari PIN untuk disimpan di DB
-                hashed_pin = make_password(pin)
-                
-                if not Order.objects.filter(cashier_pin=hashed_pin, status__in=['AWAITING_PAYMENT', 'PAID']).exists():
-                    cashier_pin_db = hashed_pin     # Simpan Hash ke DB
-                    plain_pin_for_email = pin       # Simpan Asli untuk Email & Respons Frontend
-                    break
+            quantities[item_data['menu_item']] = quantities.get(item_data['menu_item'], 0) + item_data['qty']
+        try:
+            reserve_stock(tenant_id, quantities)
+        except InsufficientStock as e:
+            item_name = catalog['items'][e.menu_item_id]['name']
+            raise serializers.ValidationError(f"Stok untuk '{item_name}' tidak mencukupi atau tidak tersedia.")
 
         order = Order.objects.create(
-          tenant=tenant, table=table, customer=customer,
+          references_code=references_code,
+          tenant_id=tenant_id, table=table, customer=customer,
           payment_method=data['payment_method'],
           status = 'AWAITING_PAYMENT',
           cashier_pin=cashier_pin_db, # Simpan HASH di database
-          expired_at = timezone.now() + timezone.timedelta(minutes=10)
+          total=total,
+          expired_at = timezone.now() + timezone.timedelta(minutes=10),
+          meta={'payment': {'status': 'PENDING'}} if is_transfer else {},
         )
 
-        order_items_to_create = []
-        total = 0
-        for item_data in items_data:
-            menu_item = menu_items_map[item_data['menu_item']]
-            
-            variant_ids = item_data.get('variants', [])
-            total_variant_price = 0
-            if variant_ids:
-                valid_variants = VariantOption.objects.filter(
-                    id__in=variant_ids,
-                    group__menu_items=menu_item
-                )
-                if len(valid_variants) != len(variant_ids):
-                    raise serializers.ValidationError("Terdapat varian yang tidak valid untuk menu yang dipilih.")
-                
-                for variant in valid_variants:
-                    total_variant_price += variant.price
-
-            item_final_price = menu_item.price + total_variant_price
-            
-            order_item_obj = OrderItem(
+        order_items_to_create = [
+            OrderItem(
                 order=order,
-                menu_item=menu_item,
+                menu_item_id=item_data['menu_item'],
                 qty=item_data['qty'],
                 price=item_final_price,
                 note=item_data.get('note', '')
             )
-            
-            order_items_to_create.append(order_item_obj)
-            total += item_final_price * item_data['qty']
-            menu_item.stock -= item_data['qty']
-        
-        MenuItem.objects.bulk_update(menu_items_to_update, ['stock'])
+            for item_data, item_final_price in zip(items_data, line_prices)
+        ]
         created_items = OrderItem.objects.bulk_create(order_items_to_create)
+        # bulk_create melewati OrderItem.save(): hook item dikirim sekali untuk semua baris
+        order_items_changed.send(sender=OrderItem, changes=[(None, item.state()) for item in created_items])
 
         item_variant_relations = []
         for i, item_data in enumerate(items_data):
@@ -215,16 +245,23 @@ class CreateOrderView(APIView):
                 
         if item_variant_relations:
             OrderItem.selected_variants.through.objects.bulk_create(item_variant_relations)
-        
-        order.total = total
-        order.save(update_fields=['total'])
 
     except serializers.ValidationError as e:
+        # Order tidak jadi dibuat: PIN yang sudah direservasi bisa dipakai order lain
+        release_order_pin(plain_pin_for_email, references_code)
         return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+    except Exception:
+        release_order_pin(plain_pin_for_email, references_code)
+        raise
     
+    transaction.on_commit(lambda: schedule_order_expiry(order))
+
     payment_info = None
-    if order.payment_method.strip().upper() == 'TRANSFER':
-        payment_info = initiate_payment_for_order(order)
+    if is_transfer:
+        if settings.MIDTRANS_ASYNC_INITIATION:
+            transaction.on_commit(lambda: queue_payment_initiation(order))
+        else:
+            payment_info = initiate_payment_for_order(order)
     elif order.payment_method.strip().upper() == 'CASH':
         transaction.on_commit(lambda: send_cash_order_invoice.delay(order.pk, plain_pin_for_email))
             
@@ -240,6 +277,8 @@ class CreateOrderView(APIView):
         hashlib.sha256
     ).hexdigest()
         
+    # Muat ulang order beserta relasinya sekaligus agar serialisasi respons tidak N+1 per baris
+    order = Order.objects.with_detail_relations().get(pk=order.pk)
     order_response_data = OrderSerializer(order, context={'request': request}).data
         
     if plain_pin_for_email:
@@ -250,7 +289,9 @@ class CreateOrderView(APIView):
         'order': order_response_data,
         'payment': payment_info,
         'token': guest_token,
-        'snap_token': payment_info.get('token') if payment_info else None
+        'snap_token': payment_info.get('token') if payment_info else None,
+        # PENDING (mode async, poll detail order) / READY / FAILED; None untuk CASH
+        'payment_status': order.meta.get('payment', {}).get('status'),
     }
     return Response(resp, status=status.HTTP_201_CREATED)
 
@@ -296,7 +337,10 @@ class MidtransWehboohView(APIView):
 
         try:
             with transaction.atomic():
-                order = Order.objects.select_for_update().get(references_code=order_id)
+                # Relasi serializer ikut dimuat untuk payload notifikasi order lunas
+                order = Order.objects.with_detail_relations().select_for_update(of=('self',)).get(
+                    references_code=order_id
+                )
                 
                 # 4. Validasi Gross Amount (Poin 10 - CRITICAL)
                 # Gunakan Decimal agar tidak ada presisi float yang meleset
@@ -323,7 +367,7 @@ class MidtransWehboohView(APIView):
                     order.status = "PAID"
                     order.paid_at = timezone.now()
                     order.save(update_fields=['status', 'paid_at'])
-                    transaction.on_commit(lambda: send_order_paid_notification.delay(order.pk))
+                    schedule_paid_order_notification(order, OrderSerializer(order).data)
                 elif transaction_status in ['expire', 'cancel', 'deny']:
                     order.cancel_and_restock()
 
@@ -334,21 +378,12 @@ class MidtransWehboohView(APIView):
 
 class OrderDetailView(generics.RetrieveAPIView):
     # Menggunakan select_related agar data customer tersedia saat pengecekan permission
-    queryset = Order.objects.all().select_related('customer', 'tenant')
+    # Status EXPIRED diturunkan dari expired_at (Order.effective_status), polling guest tidak menulis apa pun
+    queryset = Order.objects.with_detail_relations()
     serializer_class = OrderSerializer
     permission_classes = [IsOrderTenantStaff | IsGuestOrderOwner]
     lookup_field = 'uuid'
     lookup_url_kwarg = 'order_uuid'
-
-    def get_object(self):
-        obj = super().get_object()
-        
-        # Logika Update Status Expired tetap bisa ditaruh di sini
-        if obj.expired_at and timezone.now() > obj.expired_at and obj.status != 'EXPIRED':
-            obj.status = 'EXPIRED'
-            obj.save(update_fields=['status'])
-            
-        return obj
   
 class CancelOrderView(APIView):
   permission_classes = [IsOrderTenantStaff | IsGuestOrderOwner]
@@ -360,15 +395,12 @@ class CancelOrderView(APIView):
     if order.status.upper() == 'PAID':
       return Response({"detail": "Order sudah dibayar, tidak bisa dibatalkan"}, status=status.HTTP_400_BAD_REQUEST)
 
-    if order.status == 'AWAITING_PAYMENT':
-      if order.expired_at and timezone.now() > order.expired_at:
-        order.status = 'EXPIRED'
-        order.save(update_fields=['status'])
-      
+    # Tidak ada lagi penulisan status EXPIRED terpisah: order yang lewat expired_at
+    # langsung dibatalkan, dan stok dikembalikan tepat sekali oleh cancel_and_restock()
+    if order.effective_status == 'AWAITING_PAYMENT':
       order.cancel_and_restock()
       return Response({"detail": "Order berhasil dibatalkan"}, status=status.HTTP_200_OK)
-    elif order.status == 'EXPIRED':
-      order.status = 'EXPIRED'
+    elif order.effective_status == 'EXPIRED':
       order.cancel_and_restock()
       return Response({"detail": "Order kedaluwarsa berhasil dibatalkan"}, status=status.HTTP_200_OK)
 
@@ -397,14 +429,18 @@ class UpdateOrderStatusView(APIView):
                 {"detail": "Pesanan Transfer hanya bisa diubah menjadi LUNAS secara otomatis oleh Midtrans."}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-        current_status = order.status
-        allowed_next_statues = self.VALID_TRANSITIONS.get(current_status)
-        
-        if not allowed_next_statues or new_status not in allowed_next_statues:
-            return Response({"detail": f"Perubahan dari status '{current_status}' ke '{new_status}' tidak diperbolehkan"})
-        
-        order.status = new_status
-        order.save(update_fields=['status'])
+        with transaction.atomic():
+            # Transisi divalidasi dari baris terkunci (bukan salinan yang mungkin
+            # basi), dan state terkunci itu yang diteruskan ke hook save
+            current_status = order.lock_state()['status']
+            order.status = current_status
+            allowed_next_statues = self.VALID_TRANSITIONS.get(current_status)
+
+            if not allowed_next_statues or new_status not in allowed_next_statues:
+                return Response({"detail": f"Perubahan dari status '{current_status}' ke '{new_status}' tidak diperbolehkan"})
+
+            order.status = new_status
+            order.save(update_fields=['status'])
         
         return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
   
@@ -454,21 +490,36 @@ class OrderCreateView(generics.CreateAPIView):
         return super().create(request, *args, **kwargs)
 
 # --- PERBAIKAN TOTAL UNTUK MASALAH DUPLIKAT DAN ASSERTIONERROR ---
-class OrderListView(generics.ListAPIView):
+class OrderListView(ReplicaReadMixin, KeysetPaginationMixin, generics.ListAPIView):
     """
     View untuk menampilkan daftar semua pesanan.
+    ?view=kanban mengembalikan proyeksi ringan untuk papan kanban (lihat orders.kanban).
+    ?pagination=cursor memakai paginasi keyset (created_at, id) tanpa COUNT/OFFSET.
+    ?since=<X-Sync-Token> hanya mengembalikan perubahan sejak sinkronisasi terakhir (lihat orders.sync).
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
-    def get_queryset(self):
-        user = self.request.user
-        Order.objects.filter(
-            status='AWAITING_PAYMENT',
-            expired_at__lt=timezone.now()
-        ).update(status='EXPIRED')
-        
+    def is_tenant_staff(self):
+        # Jika user BUKAN Admin (is_staff) DAN BUKAN Kasir
+        if not hasattr(self, '_is_tenant_staff'):
+            user = self.request.user
+            self._is_tenant_staff = not user.is_staff and not user.groups.filter(name='Cashier').exists()
+        return self._is_tenant_staff
+
+    def get_scope_queryset(self):
+        """Semua order yang boleh dilihat user (izin tenant), tanpa filter tampilan."""
         base_qs = Order.objects.all()
+        if self.is_tenant_staff():
+            user_tenant_ids = self.request.user.tenants.values_list('id', flat=True)
+            base_qs = base_qs.filter(tenant_id__in=user_tenant_ids)
+        # Admin dan Kasir mendapatkan Order.objects.all()
+        return base_qs
+
+    def filter_visible(self, base_qs):
+        """Filter tampilan papan: order yang 'keluar' dari sini menjadi tombstone di mode ?since=."""
+        # Tidak ada lagi UPDATE expiry di sini: transisi EXPIRED dijalankan
+        # oleh task expire_order (ETA) dan process_expired_orders.
         satu_hari_lalu = timezone.now() - timedelta(days=1)
         base_qs = base_qs.exclude(
             status='EXPIRED',
@@ -476,32 +527,88 @@ class OrderListView(generics.ListAPIView):
         )
 
         # --- PERBAIKAN LOGIKA IZIN ---
-        # Jika user BUKAN Admin (is_staff) DAN BUKAN Kasir
-        if not user.is_staff and not user.groups.filter(name='Cashier').exists():
-            user_tenant_ids = user.tenants.values_list('id', flat=True)
+        if self.is_tenant_staff():
             # PERBAIKAN: Pastikan status PAID diizinkan untuk dilihat Tenant
             # Tambahkan filter agar Tenant hanya melihat pesanan yang belum selesai
-            base_qs = base_qs.filter(tenant_id__in=user_tenant_ids)
-        
             # JANGAN EXCLUDE 'PAID', karena Kanban Tenant butuh status PAID untuk "Pesanan Baru"
             base_qs = base_qs.exclude(status__in=['EXPIRED', 'CANCELED', 'COMPLETED'])
-        
-        # Admin dan Kasir akan melewati 'if' dan mendapatkan Order.objects.all()
-        
+
         # --- TAMBAHAN: TERAPKAN FILTER DARI URL ---
         status = self.request.query_params.get('status')
         payment_method = self.request.query_params.get('payment_method')
 
         if status:
-            base_qs = base_qs.filter(status=status)
+            # Filter memakai status efektif agar order yang lewat expired_at ikut terbaca EXPIRED
+            base_qs = base_qs.with_effective_status().filter(annotated_status=status)
         if payment_method:
             base_qs = base_qs.filter(payment_method=payment_method)
         # --- AKHIR TAMBAHAN ---
+        return base_qs.order_by('-created_at')
 
-        # 4. Lakukan prefetch dan order_by SETELAH filter
-        return base_qs.prefetch_related(
-            'items', 'items__menu_item', 'tenant', 'table'
-        ).order_by('-created_at')
+    def get_queryset(self):
+        base_qs = self.filter_visible(self.get_scope_queryset())
+        if self.is_kanban():
+            return kanban_queryset(base_qs)
+
+        # 4. Lakukan prefetch SETELAH filter
+        return base_qs.with_detail_relations()
+
+    def is_kanban(self):
+        return self.request.query_params.get('view') == 'kanban'
+
+    def serialize_rows(self, queryset):
+        if self.is_kanban():
+            return build_kanban_rows(queryset)
+        return self.get_serializer(queryset, many=True).data
+
+    def list(self, request, *args, **kwargs):
+        # High-water mark diambil sebelum query agar perubahan selama request tidak terlewat
+        now = timezone.now()
+        if is_reading_from_replica():
+            # Perubahan yang belum tereplikasi harus ikut di sinkronisasi berikutnya
+            now -= replica_max_lag()
+        sync_token = issue_sync_token(now)
+        if 'since' in request.query_params:
+            response = self.delta_list(request, sync_token)
+        else:
+            # Mode kanban: proyeksi values() datar, tanpa OrderSerializer bersarang
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                response = self.get_paginated_response(self.serialize_rows(page))
+            else:
+                response = Response(self.serialize_rows(queryset))
+        response['X-Sync-Token'] = sync_token
+        return response
+
+    def delta_list(self, request, sync_token):
+        """
+        ?since=<token>: hanya order yang dibuat/berubah sejak sinkronisasi terakhir,
+        plus 'removed' (id order yang berubah tapi kini tidak lagi tampil di papan).
+        """
+        try:
+            changed_ids = list(
+                changed_since(self.get_scope_queryset(), request.query_params.get('since'))
+                .order_by().values_list('id', flat=True)[:SYNC_MAX_CHANGES + 1]
+            )
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        if len(changed_ids) > SYNC_MAX_CHANGES:
+            # Terlalu banyak perubahan: klien sebaiknya memuat ulang daftar penuh
+            return Response({'reset': True, 'since': sync_token, 'results': [], 'removed': []})
+
+        rows = []
+        if changed_ids:
+            visible = self.filter_visible(Order.objects.filter(pk__in=changed_ids))
+            queryset = kanban_queryset(visible) if self.is_kanban() else visible.with_detail_relations()
+            rows = self.serialize_rows(queryset)
+        visible_ids = {row['id'] for row in rows}
+        return Response({
+            'reset': False,
+            'since': sync_token,
+            'results': rows,
+            'removed': [pk for pk in changed_ids if pk not in visible_ids],
+        })
 
 class TableQRCodeView(APIView):
     permission_classes = [permissions.AllowAny] 
@@ -541,75 +648,10 @@ class TakeawayQRCodeView(APIView):
         return HttpResponse(buffer, content_type="image/png")
 
 # --- PERBAIKAN TOTAL UNTUK MASALAH DUPLIKAT ---
-class ReportDashboardAPIView(APIView):
+class ReportDashboardAPIView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        one_week_ago = timezone.now() - timedelta(days=7)
-        user = request.user 
-        
-        # Buat filter dasar untuk digunakan kembali
-        tenant_filter = models.Q()
-        if not user.is_staff:
-            user_tenant_ids = user.tenants.values_list('id', flat=True)
-            tenant_filter = models.Q(tenant_id__in=user_tenant_ids)
-        
-        # Hanya admin yang bisa melihat statistik utama (total revenue, dll)
-        main_stats = {'total_revenue': 0, 'total_orders': 0, 'avg_order_value': 0, 'active_customers': 0 }
-        if user.is_staff:
-            total_revenue = Order.objects.filter(status='PAID').aggregate(total=Sum('total'))['total'] or 0
-            total_orders = Order.objects.count()
-            avg_order_value = Order.objects.filter(status='PAID').aggregate(avg=Avg('total'))['avg'] or 0
-            active_customers = Order.objects.filter(created_at__gte=one_week_ago).values('customer').distinct().count()
-            main_stats.update({
-                'total_revenue': total_revenue, 'total_orders': total_orders, 
-                'avg_order_value': avg_order_value, 'active_customers': active_customers
-            })
-
-        today = timezone.now().date()
-        today_orders_qs = Order.objects.filter(tenant_filter, created_at__date=today)
-        
-        stats_today = {
-            'total': today_orders_qs.count(),
-            'pending': today_orders_qs.filter(status='AWAITING_PAYMENT').count(),
-            'preparing': today_orders_qs.filter(Q(status='PAID') | Q(status='PROCESSING')).count(),
-            'completed': today_orders_qs.filter(status='COMPLETED').count()
-        }
-
-        sales_by_hour = Order.objects.filter(tenant_filter, created_at__gte=timezone.now() - timedelta(days=1)) \
-            .annotate(hour=TruncHour('created_at')) \
-            .values('hour') \
-            .annotate(orders=Count('id')) \
-            .order_by('hour')
-
-        top_selling_products = OrderItem.objects.filter(order__tenant_id__in=user.tenants.values_list(
-            'id', flat=True) if not user.is_staff else Tenant.objects.values_list('id', flat=True)) \
-            .values('menu_item__name') \
-            .annotate(total_sold=Sum('qty'), total_revenue=Sum('price')) \
-            .order_by('-total_sold')[:5]
-
-        stand_performance_qs = Tenant.objects.all()
-        if not user.is_staff:
-            stand_performance_qs = stand_performance_qs.filter(id__in=user_tenant_ids)
-
-        stand_performance = stand_performance_qs.annotate(
-            total_orders_today=Count('orders', filter=models.Q(orders__created_at__date=timezone.now().date())),
-            total_revenue_today=Sum('orders__total', filter=models.Q(orders__status='PAID', orders__created_at__date=timezone.now().date()))
-        ).order_by('-total_revenue_today')
-
-        formatted_stand_performance = [
-            {'name': stand.name, 'orders': stand.total_orders_today, 'revenue': float(stand.total_revenue_today or 0)}
-            for stand in stand_performance
-        ]
-
-        data = {
-            'main_stats': main_stats,
-            'stats_today': stats_today, 
-            'sales_by_hour': [
-                {'hour': item['hour'].strftime('%H'), 'orders': item['orders']}
-                for item in sales_by_hour
-            ],
-            'top_selling_products': list(top_selling_products),
-            'stand_performance': formatted_stand_performance,
-        }
+        # Maksimal tiga query agregasi, di-cache per scope user (reports.dashboard)
+        data = get_dashboard(request.user)
         return Response(data, status=status.HTTP_200_OK)
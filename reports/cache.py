@@ -0,0 +1,95 @@
+import logging
+import time
+import uuid
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Cache laporan dua tingkat (stale-while-revalidate):
+# - soft TTL: setelah lewat, payload lama tetap dikirim dan SATU refresh
+#   dijadwalkan di background;
+# - hard TTL: batas umur maksimum entry di Redis (HARD_TTL_FACTOR x soft TTL).
+# Lock refresh dibuat panjang agar query lambat tidak membuat lock kedaluwarsa
+# di tengah jalan, dan hanya pemiliknya (token) yang boleh melepasnya.
+# Entry juga bisa membawa generasi data (reports.generations): generasi yang
+# sudah berganti membuat entry basi sebelum soft TTL-nya habis.
+HARD_TTL_FACTOR = 10
+REFRESH_LOCK_TIMEOUT = 60 * 5
+COLD_WAIT_SECONDS = 5
+COLD_POLL_INTERVAL = 0.1
+
+
+def _lock_key(key):
+    return f"lock_{key}"
+
+
+def store(key, data, soft_ttl, hard_ttl=None, generation=None):
+    cache.set(
+        key,
+        {'data': data, 'fresh_until': time.time() + soft_ttl, 'generation': generation},
+        timeout=hard_ttl or soft_ttl * HARD_TTL_FACTOR,
+    )
+
+
+def is_stale(entry, generation=None):
+    if time.time() >= entry['fresh_until']:
+        return True
+    return generation is not None and entry.get('generation') != generation
+
+
+def acquire_refresh_lock(key):
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(key), token, timeout=REFRESH_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def release_refresh_lock(key, token):
+    if token and cache.get(_lock_key(key)) == token:
+        cache.delete(_lock_key(key))
+
+
+def _wait_for_entry(key):
+    deadline = time.monotonic() + COLD_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(COLD_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_revalidate(key, build, refresh, soft_ttl, hard_ttl=None, generation=None):
+    """
+    Ambil payload dari cache SWR.
+    - Masih segar: langsung dikembalikan.
+    - Basi (lewat soft TTL, atau generasi entry != `generation`): payload basi
+      dikembalikan; pemegang lock pertama
+      memanggil refresh(lock_token) yang wajib menyimpan hasil lewat store()
+      dan melepas lock dengan release_refresh_lock().
+    - Kosong (cold): satu request menghitung sinkron; request lain menunggu
+      sebentar hasilnya lalu, jika belum ada, ikut menghitung (bukan 503).
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        if is_stale(entry, generation):
+            token = acquire_refresh_lock(key)
+            if token:
+                try:
+                    refresh(token)
+                except Exception:
+                    logger.warning(f"Gagal menjadwalkan refresh cache {key}, payload basi tetap dipakai.")
+                    release_refresh_lock(key, token)
+        return entry['data']
+
+    token = acquire_refresh_lock(key)
+    if token is None:
+        entry = _wait_for_entry(key)
+        if entry is not None:
+            return entry['data']
+    try:
+        data = build()
+        store(key, data, soft_ttl, hard_ttl, generation)
+        return data
+    finally:
+        release_refresh_lock(key, token)
@@ -0,0 +1,148 @@
+from datetime import datetime, time as dt_time, timedelta
+from django.core.cache import cache
+from django.db.models import Func, F, IntegerField, Q, Subquery, Sum
+from django.utils import timezone
+from orders.models import Order
+from tenants.models import Tenant
+from .generations import GLOBAL_SCOPE, get_generation
+from .models import MenuSalesRollup, SalesRollup
+from .summary import CACHE_VERSION
+
+# Dashboard operasional (GET /api/orders/reports/summary/).
+# Semua angka dihitung dengan paling banyak tiga query:
+#   1. per tenant: agregat bersyarat atas SalesRollup (statistik utama,
+#      statistik hari ini, performa stand) + pelanggan aktif (subquery, admin);
+#   2. penjualan per jam 24 jam terakhir dari SalesRollup;
+#   3. menu terlaris sepanjang waktu dari MenuSalesRollup (satu baris per menu,
+#      bukan seluruh riwayat OrderItem).
+# Hasil di-cache per scope user. Key memuat generasi 'semua' sehingga perubahan
+# order membuat cache lama tidak terpakai (paling lambat setelah jendela debounce
+# reports.generations); TTL hanya membatasi jendela waktu bergulir (7 hari / 24 jam)
+# yang ikut bergeser.
+DASHBOARD_CACHE_TTL = 60
+PREPARING_STATUSES = ['PAID', 'PROCESSING']
+
+
+def dashboard_cache_key(user):
+    scope = 'admin' if user.is_staff else f"user_{user.pk}"
+    return f"{CACHE_VERSION}_ops_dashboard_{scope}_g{get_generation(GLOBAL_SCOPE)}"
+
+
+def _tenant_scope(user, field):
+    """Filter scope tenant user sebagai subquery (tanpa query terpisah); admin melihat semua."""
+    if user.is_staff:
+        return Q()
+    return Q(**{f"{field}__in": user.tenants.values('id')})
+
+
+def _tenant_rows(user, today):
+    today_rollup = Q(sales_rollups__date=today)
+    aggregates = {
+        'today_orders': Sum('sales_rollups__order_count', filter=today_rollup),
+        'today_pending': Sum(
+            'sales_rollups__order_count', filter=today_rollup & Q(sales_rollups__status='AWAITING_PAYMENT')
+        ),
+        'today_preparing': Sum(
+            'sales_rollups__order_count', filter=today_rollup & Q(sales_rollups__status__in=PREPARING_STATUSES)
+        ),
+        'today_completed': Sum(
+            'sales_rollups__order_count', filter=today_rollup & Q(sales_rollups__status='COMPLETED')
+        ),
+        'today_revenue': Sum('sales_rollups__revenue', filter=today_rollup & Q(sales_rollups__status='PAID')),
+    }
+    if user.is_staff:
+        # Statistik utama (sepanjang waktu) hanya untuk admin
+        aggregates.update(
+            paid_revenue=Sum('sales_rollups__revenue', filter=Q(sales_rollups__status='PAID')),
+            paid_orders=Sum('sales_rollups__order_count', filter=Q(sales_rollups__status='PAID')),
+            total_orders=Sum('sales_rollups__order_count'),
+        )
+    rows = Tenant.objects.filter(_tenant_scope(user, 'id')).values('id', 'name').annotate(**aggregates)
+    if user.is_staff:
+        # Pelanggan unik tidak bisa dijumlahkan dari rollup: subquery skalar atas Order
+        active_customers = Order.objects.filter(
+            created_at__gte=timezone.now() - timedelta(days=7)
+        ).order_by().values(
+            count=Func(F('customer_id'), function='COUNT', template='COUNT(DISTINCT %(expressions)s)')
+        )
+        rows = rows.annotate(active_customers=Subquery(active_customers, output_field=IntegerField()))
+    return list(rows.order_by('id'))
+
+
+def build_dashboard(user):
+    now = timezone.localtime()
+    today = now.date()
+    tenants = _tenant_rows(user, today)
+
+    def total(field):
+        return sum(row[field] or 0 for row in tenants)
+
+    main_stats = {'total_revenue': 0, 'total_orders': 0, 'avg_order_value': 0, 'active_customers': 0}
+    if user.is_staff:
+        total_revenue, paid_orders = total('paid_revenue'), total('paid_orders')
+        main_stats.update({
+            'total_revenue': total_revenue,
+            'total_orders': total('total_orders'),
+            'avg_order_value': total_revenue / paid_orders if paid_orders else 0,
+            'active_customers': tenants[0]['active_customers'] if tenants else 0,
+        })
+
+    stats_today = {
+        'total': total('today_orders'),
+        'pending': total('today_pending'),
+        'preparing': total('today_preparing'),
+        'completed': total('today_completed'),
+    }
+
+    # 24 jam terakhir dalam bucket per jam
+    yesterday = today - timedelta(days=1)
+    sales_by_hour = (
+        SalesRollup.objects.filter(_tenant_scope(user, 'tenant_id'))
+        .filter(Q(date=today) | Q(date=yesterday, hour__gte=now.hour))
+        .values('date', 'hour')
+        .annotate(orders=Sum('order_count'))
+        .filter(orders__gt=0)
+        .order_by('date', 'hour')
+    )
+
+    top_selling_products = MenuSalesRollup.objects.filter(_tenant_scope(user, 'menu_item__tenant_id')) \
+        .filter(qty__gt=0) \
+        .values('menu_item__name') \
+        .annotate(total_sold=Sum('qty'), total_revenue=Sum('revenue')) \
+        .order_by('-total_sold')[:5]
+
+    stand_performance = sorted(
+        (
+            {'name': row['name'], 'orders': row['today_orders'] or 0, 'revenue': float(row['today_revenue'] or 0)}
+            for row in tenants
+        ),
+        key=lambda stand: stand['revenue'], reverse=True
+    )
+
+    return {
+        'main_stats': main_stats,
+        'stats_today': stats_today,
+        'sales_by_hour': [
+            {
+                'hour': f"{item['hour']:02d}",
+                # 'hour' saja bertabrakan antar hari; 'bucket' memuat tanggalnya
+                'bucket': timezone.make_aware(
+                    datetime.combine(item['date'], dt_time(item['hour']))
+                ).isoformat(),
+                'orders': item['orders'],
+            }
+            for item in sales_by_hour
+        ],
+        'top_selling_products': list(top_selling_products),
+        'stand_performance': stand_performance,
+    }
+
+
+def get_dashboard(user):
+    """Payload dashboard dari cache per scope user; dihitung ulang bila generasi berubah."""
+    key = dashboard_cache_key(user)
+    data = cache.get(key)
+    if data is None:
+        data = build_dashboard(user)
+        cache.set(key, data, timeout=DASHBOARD_CACHE_TTL)
+    return data
@@ -0,0 +1,165 @@
+import csv
+import importlib.util
+import tempfile
+import uuid
+from datetime import datetime, time as dt_time, timedelta
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import serializers
+from orders.models import Order
+from .summary import VALID_REPORT_STATUSES, parse_report_range, parse_report_stand
+
+# Ekspor transaksi laporan keuangan (rekonsiliasi akhir bulan).
+# Baris dibaca dengan iterator(chunk_size) (server-side cursor di PostgreSQL)
+# dan langsung ditulis ke respons/berkas, jadi memori tetap konstan berapa pun
+# panjang rentang tanggalnya.
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_JOB_TTL = 60 * 60 * 24
+EXPORT_FORMATS = ('csv', 'xlsx')
+EXPORT_HEADER = ['Kode Referensi', 'Waktu', 'Stand', 'Pelanggan', 'Metode Pembayaran', 'Status', 'Total']
+# Sel yang diawali karakter ini dieksekusi sebagai rumus oleh Excel/Sheets
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+
+def parse_export_params(params, user):
+    """Validasi ?from=&to=, ?stand_id= dan ?type= dari query string."""
+    start, end = parse_report_range(params)
+    export_type = params.get('type', 'csv')
+    if export_type not in EXPORT_FORMATS:
+        raise serializers.ValidationError({'type': f"Pilihan: {', '.join(EXPORT_FORMATS)}."})
+    if export_type == 'xlsx' and importlib.util.find_spec('openpyxl') is None:
+        raise serializers.ValidationError({'type': 'Ekspor XLSX belum tersedia di server ini.'})
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'stand_id': parse_report_stand(params, user),
+        'type': export_type,
+    }
+
+
+def export_queryset(params, user_id, is_staff):
+    start = parse_date(params['start'])
+    end = parse_date(params['end'])
+    tz = timezone.get_current_timezone()
+    # Batas waktu sebagai rentang created_at agar index (tenant, created_at) terpakai
+    queryset = Order.objects.filter(
+        status__in=VALID_REPORT_STATUSES,
+        created_at__gte=timezone.make_aware(datetime.combine(start, dt_time.min), tz),
+        created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), dt_time.min), tz),
+    )
+    if params['stand_id'] != 'semua':
+        queryset = queryset.filter(tenant_id=params['stand_id'])
+    if not is_staff:
+        queryset = queryset.filter(tenant__staff__id=user_id)
+    return queryset.order_by('created_at', 'id').values_list(
+        'references_code', 'created_at', F('tenant__name'), F('customer__name'),
+        'payment_method', 'status', 'total',
+    )
+
+
+def _cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def export_rows(queryset):
+    """Baris ekspor siap tulis, dibaca per chunk dari database."""
+    for references_code, created_at, tenant_name, customer_name, payment_method, status, total in \
+            queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            references_code,
+            timezone.localtime(created_at).strftime('%Y-%m-%d %H:%M:%S'),
+            _cell(tenant_name),
+            _cell(customer_name or 'Guest'),
+            payment_method,
+            status,
+            total,
+        ]
+
+
+class _Echo:
+    """Pseudo-buffer untuk csv.writer: write() mengembalikan teks alih-alih menyimpannya."""
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset):
+    # BOM agar Excel membaca UTF-8 dengan benar
+    yield '\ufeff'
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    lines = []
+    for row in export_rows(queryset):
+        lines.append(writer.writerow(row))
+        if len(lines) >= EXPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def export_filename(params):
+    stand = params['stand_id'] if params['stand_id'] != 'semua' else 'semua-stand'
+    return f"transaksi_{stand}_{params['start']}_{params['end']}.{params['type']}"
+
+
+def _write_csv(handle, queryset):
+    for chunk in stream_csv(queryset):
+        handle.write(chunk.encode('utf-8'))
+
+
+def _write_xlsx(handle, queryset):
+    from openpyxl import Workbook
+
+    # write_only: baris langsung di-flush ke XML sementara, bukan ditahan di memori
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Transaksi')
+    sheet.append(EXPORT_HEADER)
+    for row in export_rows(queryset):
+        sheet.append(row)
+    workbook.save(handle)
+
+
+def write_export_file(params, user_id, is_staff):
+    """Tulis berkas ekspor ke media storage; mengembalikan path berkas di storage."""
+    queryset = export_queryset(params, user_id, is_staff)
+    with tempfile.TemporaryFile() as handle:
+        if params['type'] == 'xlsx':
+            _write_xlsx(handle, queryset)
+        else:
+            _write_csv(handle, queryset)
+        handle.seek(0)
+        # Folder acak: berkas tidak bisa ditebak walau media dilayani publik
+        name = f"exports/{uuid.uuid4().hex}/{export_filename(params)}"
+        return default_storage.save(name, File(handle))
+
+
+def _job_key(job_id):
+    return f"report_export_job_{job_id}"
+
+
+def create_export_job(params, user):
+    job_id = uuid.uuid4().hex
+    cache.set(_job_key(job_id), {
+        'status': 'PENDING', 'user_id': user.pk, 'is_staff': user.is_staff, 'params': params, 'file': None,
+    }, timeout=EXPORT_JOB_TTL)
+    return job_id
+
+
+def get_export_job(job_id):
+    return cache.get(_job_key(job_id))
+
+
+def update_export_job(job_id, **changes):
+    job = get_export_job(job_id)
+    if job is None:
+        return None
+    job.update(changes)
+    cache.set(_job_key(job_id), job, timeout=EXPORT_JOB_TTL)
+    return job
@@ -0,0 +1,87 @@
+import functools
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Invalidasi cache laporan dengan nomor generasi per scope (per tenant, atau
+# 'semua' untuk laporan lintas stand). Perubahan order tidak langsung menaikkan
+# counter: setelah commit scope hanya ditandai "kotor" (satu SET). Counter
+# dinaikkan oleh pembaca berikutnya (get_generation), paling sering sekali per
+# REPORT_GENERATION_DEBOUNCE_SECONDS per scope, jadi rentetan tulis dalam
+# jendela itu digabung menjadi satu kenaikan generasi. Entry cache laporan
+# menyimpan generasi saat dibangun; generasi yang berubah membuatnya basi
+# (dilayani sambil dihitung ulang), bukan hilang.
+GLOBAL_SCOPE = 'semua'
+DEFAULT_DEBOUNCE_SECONDS = 2
+
+
+def _generation_key(scope):
+    return f"report_generation_{scope}"
+
+
+def _dirty_key(scope):
+    return f"report_generation_dirty_{scope}"
+
+
+def _debounce_key(scope):
+    return f"report_generation_debounce_{scope}"
+
+
+def generation_scope(stand_id):
+    if stand_id in (None, '', GLOBAL_SCOPE):
+        return GLOBAL_SCOPE
+    return str(stand_id)
+
+
+def _window_open(scope):
+    """True jika generasi scope boleh dinaikkan sekarang (jendela debounce baru dimulai)."""
+    seconds = getattr(settings, 'REPORT_GENERATION_DEBOUNCE_SECONDS', DEFAULT_DEBOUNCE_SECONDS)
+    if seconds <= 0:
+        return True
+    return cache.add(_debounce_key(scope), 1, timeout=seconds)
+
+
+def get_generation(scope):
+    key = _generation_key(scope)
+    values = cache.get_many([key, _dirty_key(scope)])
+    generation = values.get(key)
+    if generation is None:
+        # Nilai awal berbasis waktu agar counter yang ter-evict tidak kembali ke angka lama
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        generation = cache.get(key)
+    if _dirty_key(scope) in values and _window_open(scope):
+        # Tanda dihapus sebelum INCR: tulisan yang menandai ulang setelah ini
+        # pasti terlihat oleh generasi baru atau menunggu jendela berikutnya.
+        cache.delete(_dirty_key(scope))
+        generation = bump_generation(scope)
+    return generation
+
+
+def bump_generation(scope):
+    key = _generation_key(scope)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        return cache.get(key)
+
+
+def mark_generation_dirty(tenant_id):
+    """Tandai scope tenant dan 'semua' berubah (satu MSET, tanpa INCR)."""
+    try:
+        cache.set_many({_dirty_key(generation_scope(tenant_id)): 1, _dirty_key(GLOBAL_SCOPE): 1}, timeout=None)
+    except Exception:
+        logger.warning(f"Gagal menandai cache laporan tenant {tenant_id} berubah.")
+
+
+def schedule_generation_bump(tenant_id):
+    """
+    Tandai generasi tenant (dan 'semua') berubah SETELAH transaksi commit; di
+    luar transaksi langsung. Callback dari savepoint yang di-rollback dibuang
+    Django, jadi tanda hanya dipasang untuk perubahan yang benar-benar commit.
+    """
+    transaction.on_commit(functools.partial(mark_generation_dirty, tenant_id))
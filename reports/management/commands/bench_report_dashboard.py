@@ -0,0 +1,114 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from orders.models import Customer, Order, OrderItem
+from reports.dashboard import build_dashboard, dashboard_cache_key, get_dashboard
+from reports.rollups import rebuild_menu_rollups, rebuild_rollups
+from tenants.models import Tenant, MenuItem
+
+STATUSES = ['AWAITING_PAYMENT', 'PAID', 'PROCESSING', 'READY', 'COMPLETED', 'CANCELLED', 'EXPIRED']
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark dashboard operasional (GET /api/orders/reports/summary/): isi N order "
+        "sintetis, lalu ukur jumlah query dan latensi hitung ulang (cold) serta cache (warm). "
+        "Data bench dihapus setelah selesai kecuali --keep."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100_000, help="Jumlah order sintetis (mis. 1000000)")
+        parser.add_argument('--tenants', type=int, default=10)
+        parser.add_argument('--days', type=int, default=90, help="Rentang hari created_at order")
+        parser.add_argument('--runs', type=int, default=20, help="Jumlah pengukuran per skenario")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--keep', action='store_true', help="Jangan hapus data bench")
+
+    def _seed(self, options):
+        tenants = [
+            Tenant.objects.create(name=f"Bench Dashboard {i}", active=True) for i in range(options['tenants'])
+        ]
+        menus = {
+            tenant.pk: MenuItem.objects.create(tenant=tenant, name=f"Menu Bench {tenant.pk}", price=10000, stock=0)
+            for tenant in tenants
+        }
+        customers = Customer.objects.bulk_create([Customer(name=f"Bench {i}") for i in range(1000)])
+        now = timezone.now()
+        run_tag = uuid.uuid4().hex[:8]
+        remaining, seeded = options['orders'], 0
+        while remaining > 0:
+            size = min(options['batch_size'], remaining)
+            # bulk_create melewati sinyal rollup; rollup dibangun ulang setelah seeding
+            orders = Order.objects.bulk_create([
+                Order(
+                    # generate_references_code() hanya unik per detik; bench butuh ribuan per detik
+                    references_code=f"BENCH-{run_tag}-{seeded + i}",
+                    tenant=random.choice(tenants), customer=random.choice(customers),
+                    payment_method=random.choice(['CASH', 'TRANSFER']), status=random.choice(STATUSES),
+                    total=random.randint(5, 100) * 1000,
+                )
+                for i in range(size)
+            ], batch_size=size)
+            ids = [order.pk for order in orders]
+            # created_at auto_now_add: sebar per batch ke hari/jam acak
+            Order.objects.filter(pk__in=ids).update(
+                created_at=now - timedelta(days=random.randint(0, options['days']), hours=random.randint(0, 23))
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menu_item=menus[order.tenant_id], qty=random.randint(1, 3), price=10000)
+                for order in orders
+            ], batch_size=size)
+            remaining -= size
+            seeded += size
+            self.stdout.write(f"  {seeded} order...", ending='\r')
+        self.stdout.write('')
+        for tenant in tenants:
+            rebuild_rollups(tenant_id=tenant.pk)
+            rebuild_menu_rollups(tenant_id=tenant.pk)
+        return tenants, customers
+
+    def _measure(self, label, func, runs):
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        for _ in range(runs):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        p95 = statistics.quantiles(timings, n=100)[94] if len(timings) > 1 else timings[0]
+        self.stdout.write(
+            f"{label:<24} query={len(queries):>2} | mean={statistics.mean(timings):8.2f}ms "
+            f"p95={p95:8.2f}ms"
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        tenants, customers = self._seed(options)
+        self.stdout.write(f"Seeding {options['orders']} order: {time.perf_counter() - start:.1f}s")
+
+        admin = User.objects.create_user(username=f"bench_dashboard_{int(time.time())}", is_staff=True)
+        seller = User.objects.create_user(username=f"bench_dashboard_seller_{int(time.time())}")
+        tenants[0].staff.add(seller)
+        try:
+            runs = max(options['runs'], 1)
+            for label, user in (('admin', admin), ('staff tenant', seller)):
+                self._measure(f"{label} (cold)", lambda: build_dashboard(user), runs)
+                cache.delete(dashboard_cache_key(user))
+                get_dashboard(user)
+                self._measure(f"{label} (warm cache)", lambda: get_dashboard(user), runs)
+        finally:
+            admin.delete()
+            seller.delete()
+            if not options['keep']:
+                for tenant in tenants:
+                    Order.objects.filter(tenant=tenant).delete()
+                    tenant.delete()
+                Customer.objects.filter(pk__in=[customer.pk for customer in customers]).delete()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from reports.snapshots import close_report_days, closed_through
+
+
+class Command(BaseCommand):
+    help = (
+        "Tutup hari laporan yang sudah lewat menjadi snapshot harian per tenant "
+        "(sama dengan job malam). Hari dilanjutkan dari hari terakhir yang sudah ditutup; "
+        "jalankan rebuild_sales_rollups lebih dulu saat backfill."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', help="Tutup sampai tanggal ini (YYYY-MM-DD); default kemarin")
+
+    def handle(self, *args, **options):
+        until = None
+        if options['until']:
+            until = parse_date(options['until'])
+            if until is None:
+                raise CommandError(f"Format tanggal --until tidak valid: {options['until']}")
+        written = close_report_days(until=until)
+        self.stdout.write(self.style.SUCCESS(
+            f"{written} snapshot ditulis; hari tertutup sampai {closed_through() or '-'}."
+        ))
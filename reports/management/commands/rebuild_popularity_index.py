@@ -0,0 +1,19 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from reports.popularity import rebuild_from_history
+
+
+class Command(BaseCommand):
+    help = (
+        "Bangun ulang indeks popularitas menu (Redis) dari riwayat order yang sudah "
+        "dibayar. Tanpa --days seluruh riwayat dipakai."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Hanya order N hari terakhir")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+        written = rebuild_from_history(since=since)
+        self.stdout.write(self.style.SUCCESS(f"{written} sorted set popularitas ditulis ulang."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from reports.rollups import rebuild_menu_rollups, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Bangun ulang tabel SalesRollup dari data Order (backfill setelah deploy "
+        "atau koreksi). Tanpa argumen seluruh riwayat dibangun ulang. Rollup menu "
+        "(MenuSalesRollup) bersifat sepanjang waktu dan selalu dibangun ulang penuh "
+        "untuk tenant yang dipilih."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="Tanggal awal (YYYY-MM-DD), inklusif")
+        parser.add_argument('--to', dest='end', help="Tanggal akhir (YYYY-MM-DD), inklusif")
+        parser.add_argument('--tenant', type=int, help="Hanya tenant dengan ID ini")
+
+    def _parse(self, value, label):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f"Format tanggal {label} tidak valid: {value}")
+        return parsed
+
+    def handle(self, *args, **options):
+        start = self._parse(options['start'], '--from')
+        end = self._parse(options['end'], '--to')
+        written = rebuild_rollups(start_date=start, end_date=end, tenant_id=options['tenant'])
+        self.stdout.write(self.style.SUCCESS(f"{written} bucket rollup ditulis ulang."))
+        menus = rebuild_menu_rollups(tenant_id=options['tenant'])
+        self.stdout.write(self.style.SUCCESS(f"{menus} rollup menu ditulis ulang."))
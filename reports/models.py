@@ -1,3 +1,90 @@
 from django.db import models
+from tenants.models import MenuItem, Tenant
 
-# Create your models here.
+
+class SalesRollup(models.Model):
+  """
+  Rekap order per tenant, tanggal, jam, metode pembayaran dan status.
+  Dijaga secara inkremental di transaksi yang sama dengan perubahan order
+  (lihat reports.rollups & reports.signals) dan bisa dibangun ulang dengan
+  `manage.py rebuild_sales_rollups`. Laporan membaca tabel ini sehingga
+  biayanya sebanding dengan jumlah hari x tenant, bukan jumlah order.
+  """
+  tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='sales_rollups')
+  date = models.DateField()
+  hour = models.PositiveSmallIntegerField()
+  payment_method = models.CharField(max_length=20)
+  status = models.CharField(max_length=20)
+  order_count = models.IntegerField(default=0)
+  revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(
+        fields=['tenant', 'date', 'hour', 'payment_method', 'status'], name='unique_sales_rollup_bucket'
+      )
+    ]
+    indexes = [
+      models.Index(fields=['date', 'tenant']),
+    ]
+
+  def __str__(self):
+    return f"{self.tenant_id} {self.date} {self.hour:02d}:00 {self.payment_method}/{self.status}"
+
+
+class MenuSalesRollup(models.Model):
+  """
+  Rekap item order sepanjang waktu per menu: dasar "menu terlaris" dashboard.
+  Dijaga inkremental di transaksi yang sama dengan perubahan item order
+  (hook orders.signals.order_items_changed, lihat reports.rollups) dan ikut
+  dibangun ulang oleh `manage.py rebuild_sales_rollups`. Seperti agregat lama
+  di atas OrderItem, semua item dihitung tanpa melihat status order.
+  """
+  menu_item = models.OneToOneField(MenuItem, on_delete=models.CASCADE, related_name='sales_rollup')
+  qty = models.BigIntegerField(default=0)
+  # Jumlah kolom OrderItem.price (harga per baris), sama dengan angka dashboard sebelumnya
+  revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+  def __str__(self):
+    return f"{self.menu_item_id} x{self.qty}"
+
+
+class DailyReportSnapshot(models.Model):
+  """
+  Ringkasan laporan satu tenant untuk satu hari yang sudah ditutup (lihat
+  reports.snapshots). Ditulis oleh job penutupan harian dan tidak pernah
+  di-update; jika order hari itu berubah setelah ditutup (pembayaran
+  terlambat), baris diganti utuh dari SalesRollup. Laporan periode lampau
+  dibaca dari sini, hanya hari yang masih berjalan yang dihitung dari SalesRollup.
+  """
+  tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='report_snapshots')
+  date = models.DateField()
+  # Status valid laporan (PAID, PROCESSING, READY, COMPLETED)
+  order_count = models.IntegerField(default=0)
+  revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+  revenue_cash = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+  revenue_transfer = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+  # Order yang sudah lunas (COMPLETED, PAID, READY): dasar performa stand
+  settled_revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+  settled_revenue_cash = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+  active_count = models.IntegerField(default=0)
+  pending_count = models.IntegerField(default=0)
+  status_counts = models.JSONField(default=dict, blank=True)
+  top_items = models.JSONField(default=list, blank=True)
+  closed_at = models.DateTimeField(auto_now_add=True)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=['tenant', 'date'], name='unique_daily_report_snapshot')
+    ]
+    indexes = [
+      models.Index(fields=['date', 'tenant']),
+    ]
+
+  def __str__(self):
+    return f"{self.tenant_id} {self.date}"
+
+  def save(self, *args, **kwargs):
+    if self.pk is not None:
+      raise ValueError("Snapshot laporan harian bersifat immutable.")
+    super().save(*args, **kwargs)
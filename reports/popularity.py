@@ -0,0 +1,174 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncHour
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+
+logger = logging.getLogger(__name__)
+
+# Indeks popularitas menu (GET /api/orders/popular-menus/) berupa sorted set
+# Redis per jendela dan scope (tenant atau 'semua'), dengan peluruhan waktu
+# eksponensial model "forward decay": setiap penjualan menambah skor
+#     qty * 2 ** ((t - landmark) / half_life)
+# sehingga penjualan baru berbobot lebih besar tanpa perlu menulis ulang skor
+# lama. Urutan relatif tetap benar untuk landmark apa pun; landmark hanya
+# digeser (rebase harian) agar eksponen tidak meluap.
+WINDOWS = {
+    '1-hari': timedelta(days=1).total_seconds(),
+    '7-hari': timedelta(days=7).total_seconds(),
+    '30-hari': timedelta(days=30).total_seconds(),
+}
+DEFAULT_WINDOW = '7-hari'
+GLOBAL_SCOPE = 'semua'
+PAID_STATUSES = ('PAID', 'PROCESSING', 'READY', 'COMPLETED')
+LANDMARK_KEY = 'popularity:landmark'
+# Skor di bawah ini (setelah rebase) setara penjualan lama yang sudah tidak relevan
+PRUNE_BELOW = 1e-3
+WRITE_RETRIES = 3
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _key(window, scope):
+    return f"popularity:{window}:{scope}"
+
+
+def _weight(window, timestamp, landmark):
+    return 2 ** ((timestamp - landmark) / WINDOWS[window])
+
+
+def _landmark(redis):
+    landmark = redis.get(LANDMARK_KEY)
+    if landmark is None:
+        redis.set(LANDMARK_KEY, time.time(), nx=True)
+        landmark = redis.get(LANDMARK_KEY)
+    return float(landmark)
+
+
+def record_sale(tenant_id, quantities, timestamp=None):
+    """
+    Tambahkan penjualan {menu_item_id: qty} ke semua jendela, scope tenant dan
+    'semua'. Ditulis dalam MULTI dengan WATCH pada landmark: jika rebase terjadi
+    di tengah jalan, bobot dihitung ulang dengan landmark baru.
+    """
+    if not quantities:
+        return
+    timestamp = timestamp or time.time()
+    redis = _redis()
+    for _ in range(WRITE_RETRIES):
+        with redis.pipeline() as pipe:
+            try:
+                pipe.watch(LANDMARK_KEY)
+                landmark = _landmark(pipe)
+                pipe.multi()
+                for window in WINDOWS:
+                    weight = _weight(window, timestamp, landmark)
+                    for scope in (str(tenant_id), GLOBAL_SCOPE):
+                        for menu_item_id, qty in quantities.items():
+                            pipe.zincrby(_key(window, scope), qty * weight, menu_item_id)
+                pipe.execute()
+                return
+            except WatchError:
+                continue
+    logger.warning(f"Gagal mencatat popularitas menu tenant {tenant_id}: landmark terus berubah.")
+
+
+def record_paid_order(order_id, tenant_id):
+    from orders.models import OrderItem
+
+    quantities = dict(
+        OrderItem.objects.filter(order_id=order_id).order_by()
+        .values('menu_item_id').annotate(total_qty=Sum('qty'))
+        .values_list('menu_item_id', 'total_qty')
+    )
+    try:
+        record_sale(tenant_id, quantities)
+    except Exception:
+        logger.warning(f"Gagal memperbarui indeks popularitas untuk order {order_id}.")
+
+
+def schedule_paid_order(state):
+    # Setelah commit: item order sudah tersimpan dan order benar-benar lunas
+    transaction.on_commit(lambda: record_paid_order(state['id'], state['tenant_id']))
+
+
+def became_paid(old_state, new_state):
+    was_paid = old_state is not None and old_state['status'] in PAID_STATUSES
+    return new_state['status'] in PAID_STATUSES and not was_paid
+
+
+def top_menu_ids(tenant_id=None, window=DEFAULT_WINDOW, limit=10):
+    """id menu terpopuler (skor tertinggi dulu); O(log n + limit) per permintaan."""
+    scope = str(tenant_id) if tenant_id else GLOBAL_SCOPE
+    return [int(member) for member in _redis().zrevrange(_key(window, scope), 0, limit - 1)]
+
+
+def rebase(now=None):
+    """
+    Geser landmark ke `now`: semua skor dikalikan 2 ** -(geser / half_life) dan
+    entri yang sudah meluruh habis dibuang. Dijalankan atomik (MULTI) bersama
+    pembaruan landmark; penulis yang sedang berjalan akan retry lewat WATCH.
+    """
+    now = now or time.time()
+    redis = _redis()
+    keys = [key.decode() for key in redis.scan_iter(match='popularity:*:*')]
+    landmark = _landmark(redis)
+    with redis.pipeline(transaction=True) as pipe:
+        for key in keys:
+            window = key.split(':')[1]
+            if window not in WINDOWS:
+                continue
+            pipe.zunionstore(key, {key: _weight(window, landmark, now)})
+            pipe.zremrangebyscore(key, '-inf', PRUNE_BELOW)
+        pipe.set(LANDMARK_KEY, now)
+        pipe.execute()
+    return len(keys)
+
+
+def rebuild_from_history(since=None):
+    """
+    Bangun ulang seluruh indeks dari OrderItem order yang sudah dibayar
+    (diagregasi per jam created_at order) dengan landmark baru. Semua key ditulis
+    ulang dalam satu MULTI bersama landmark. Penjualan yang
+    commit selama pemindaian berlangsung bisa hilang dari hasil; jalankan saat
+    sepi. Mengembalikan jumlah sorted set yang ditulis.
+    """
+    from orders.models import OrderItem
+
+    items = OrderItem.objects.filter(order__status__in=PAID_STATUSES)
+    if since:
+        items = items.filter(order__created_at__gte=since)
+    rows = (
+        items.order_by()
+        .annotate(hour=TruncHour('order__created_at'))
+        .values('menu_item_id', 'order__tenant_id', 'hour')
+        .annotate(total_qty=Sum('qty'))
+        .iterator(chunk_size=5000)
+    )
+
+    landmark = time.time()
+    scores = defaultdict(lambda: defaultdict(float))
+    for row in rows:
+        timestamp = row['hour'].timestamp()
+        for window in WINDOWS:
+            score = row['total_qty'] * _weight(window, timestamp, landmark)
+            for scope in (str(row['order__tenant_id']), GLOBAL_SCOPE):
+                scores[_key(window, scope)][row['menu_item_id']] += score
+
+    redis = _redis()
+    stale_keys = {key.decode() for key in redis.scan_iter(match='popularity:*:*')} - set(scores)
+    with redis.pipeline(transaction=True) as pipe:
+        for key, members in scores.items():
+            pipe.delete(key)
+            pipe.zadd(key, members)
+        if stale_keys:
+            pipe.delete(*stale_keys)
+        pipe.set(LANDMARK_KEY, landmark)
+        pipe.execute()
+    return len(scores)
@@ -0,0 +1,176 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils import timezone
+from .models import MenuSalesRollup, SalesRollup
+
+def bucket_key(state):
+    created_at = timezone.localtime(state['created_at'])
+    return (state['tenant_id'], created_at.date(), created_at.hour, state['payment_method'], state['status'])
+
+
+def _add(deltas, state, sign):
+    if state is None or state['created_at'] is None:
+        return
+    count_revenue = deltas[bucket_key(state)]
+    count_revenue[0] += sign
+    count_revenue[1] += sign * Decimal(state['total'] or 0)
+
+
+def apply_deltas(deltas):
+    """
+    Terapkan {bucket: [delta_count, delta_revenue]} dengan increment atomik.
+    Wajib dipanggil di dalam transaksi yang sama dengan perubahan order.
+    """
+    from .timeseries import is_closed_hour, schedule_closed_bucket_bump
+
+    now = timezone.now()
+    today = timezone.localdate(now)
+    past_days = set()
+    closed_tenants = set()
+    for (tenant_id, date, hour, payment_method, status), (count, revenue) in sorted(deltas.items()):
+        if not count and not revenue:
+            continue
+        if date < today:
+            past_days.add((tenant_id, date))
+        if is_closed_hour(date, hour, now):
+            # Bucket jam ini (dan hari/minggunya) mungkin sudah di-cache sebagai tertutup
+            closed_tenants.add(tenant_id)
+        bucket = SalesRollup.objects.filter(
+            tenant_id=tenant_id, date=date, hour=hour, payment_method=payment_method, status=status
+        )
+        if bucket.update(order_count=F('order_count') + count, revenue=F('revenue') + revenue):
+            continue
+        try:
+            with transaction.atomic():
+                SalesRollup.objects.create(
+                    tenant_id=tenant_id, date=date, hour=hour, payment_method=payment_method,
+                    status=status, order_count=count, revenue=revenue,
+                )
+        except IntegrityError:
+            # Bucket baru saja dibuat transaksi lain
+            bucket.update(order_count=F('order_count') + count, revenue=F('revenue') + revenue)
+
+    if closed_tenants:
+        schedule_closed_bucket_bump(closed_tenants)
+    if past_days:
+        # Hari lampau mungkin sudah dibekukan menjadi snapshot harian
+        from .snapshots import schedule_snapshot_refresh
+        schedule_snapshot_refresh(past_days)
+
+
+def record_order_changes(changes):
+    """
+    Pindahkan kontribusi order dari bucket state lama ke bucket state baru
+    (hook orders.signals.order_changed): [(state_lama, state_baru), ...],
+    None = order tidak ada.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for old_state, new_state in changes:
+        _add(deltas, old_state, -1)
+        _add(deltas, new_state, 1)
+    apply_deltas(deltas)
+
+
+def record_item_changes(changes):
+    """
+    Terapkan perubahan item order ke rollup menu (hook
+    orders.signals.order_items_changed): [(state_lama, state_baru), ...].
+    Wajib dipanggil di dalam transaksi yang sama dengan perubahan item.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for old_state, new_state in changes:
+        for state, sign in ((old_state, -1), (new_state, 1)):
+            if state is not None:
+                qty_revenue = deltas[state['menu_item_id']]
+                qty_revenue[0] += sign * state['qty']
+                qty_revenue[1] += sign * Decimal(state['price'] or 0)
+
+    deltas = {menu_item_id: delta for menu_item_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    # Dua query berapa pun jumlah menunya (keranjang besar tidak menambah query):
+    # baris yang belum ada dibuat kosong, lalu semua increment dalam satu UPDATE.
+    MenuSalesRollup.objects.bulk_create(
+        [MenuSalesRollup(menu_item_id=menu_item_id) for menu_item_id in sorted(deltas)], ignore_conflicts=True
+    )
+
+    def increment(field, index, output_field):
+        return F(field) + Case(
+            *(When(menu_item_id=menu_item_id, then=Value(delta[index])) for menu_item_id, delta in deltas.items()),
+            default=Value(0), output_field=output_field,
+        )
+
+    MenuSalesRollup.objects.filter(menu_item_id__in=deltas).update(
+        qty=increment('qty', 0, BigIntegerField()),
+        revenue=increment('revenue', 1, DecimalField(max_digits=16, decimal_places=2)),
+    )
+
+
+def rebuild_menu_rollups(tenant_id=None):
+    """
+    Bangun ulang rollup menu sepanjang waktu dari tabel OrderItem. Mengembalikan
+    jumlah baris yang ditulis.
+    """
+    from orders.models import OrderItem
+
+    items = OrderItem.objects.all()
+    rollups = MenuSalesRollup.objects.all()
+    if tenant_id:
+        items = items.filter(menu_item__tenant_id=tenant_id)
+        rollups = rollups.filter(menu_item__tenant_id=tenant_id)
+    rows = items.order_by().values('menu_item_id').annotate(total_qty=Sum('qty'), total_price=Sum('price'))
+    with transaction.atomic():
+        rollups.delete()
+        created = MenuSalesRollup.objects.bulk_create([
+            MenuSalesRollup(menu_item_id=row['menu_item_id'], qty=row['total_qty'], revenue=row['total_price'] or 0)
+            for row in rows
+        ], batch_size=1000)
+    return len(created)
+
+
+def rebuild_rollups(start_date=None, end_date=None, tenant_id=None):
+    """
+    Bangun ulang rollup dari tabel Order (backfill/koreksi). Rentang tanggal
+    inklusif, mengikuti zona waktu aktif. Mengembalikan jumlah bucket yang ditulis.
+    """
+    from orders.models import Order
+
+    orders = Order.objects.all()
+    rollups = SalesRollup.objects.all()
+    if start_date:
+        orders = orders.filter(created_at__date__gte=start_date)
+        rollups = rollups.filter(date__gte=start_date)
+    if end_date:
+        orders = orders.filter(created_at__date__lte=end_date)
+        rollups = rollups.filter(date__lte=end_date)
+    if tenant_id:
+        orders = orders.filter(tenant_id=tenant_id)
+        rollups = rollups.filter(tenant_id=tenant_id)
+
+    tzinfo = timezone.get_current_timezone()
+    buckets = (
+        orders.order_by()
+        .annotate(day=TruncDate('created_at', tzinfo=tzinfo), hour=ExtractHour('created_at', tzinfo=tzinfo))
+        .values('tenant_id', 'day', 'hour', 'payment_method', 'status')
+        .annotate(order_count=Count('id'), revenue=Sum('total'))
+    )
+    from .timeseries import schedule_closed_bucket_bump
+
+    with transaction.atomic():
+        # Bucket yang ditulis ulang mungkin sudah di-cache oleh deret waktu
+        tenant_ids = set(rollups.order_by().values_list('tenant_id', flat=True).distinct())
+        rollups.delete()
+        created = SalesRollup.objects.bulk_create([
+            SalesRollup(
+                tenant_id=row['tenant_id'], date=row['day'], hour=row['hour'],
+                payment_method=row['payment_method'], status=row['status'],
+                order_count=row['order_count'], revenue=row['revenue'] or 0,
+            )
+            for row in buckets
+        ], batch_size=1000)
+        tenant_ids.update(rollup.tenant_id for rollup in created)
+        schedule_closed_bucket_bump(tenant_ids)
+    return len(created)
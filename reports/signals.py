@@ -0,0 +1,28 @@
+from django.dispatch import receiver
+from orders.signals import order_changed, order_items_changed
+from .generations import schedule_generation_bump
+from .popularity import became_paid, schedule_paid_order
+from .rollups import record_item_changes, record_order_changes
+
+
+@receiver(order_changed)
+def update_sales_rollup(sender, changes, **kwargs):
+    # Dipanggil di dalam transaksi perubahan order, dengan state lama dari
+    # pengirimnya: rollup ikut commit/rollback tanpa membaca ulang baris order.
+    record_order_changes(changes)
+    tenant_ids = set()
+    for old_state, new_state in changes:
+        # Order pindah tenant: kedua scope laporan berubah
+        tenant_ids.update(state['tenant_id'] for state in (old_state, new_state) if state is not None)
+        if new_state is not None and became_paid(old_state, new_state):
+            schedule_paid_order(new_state)
+    for tenant_id in tenant_ids:
+        schedule_generation_bump(tenant_id)
+
+
+@receiver(order_items_changed)
+def update_menu_rollup(sender, changes, **kwargs):
+    # Item baru ditulis bersama ordernya, jadi cache dashboard ikut basi lewat
+    # generasi dari hook order_changed; edit item saja (admin) terlihat paling
+    # lambat setelah DASHBOARD_CACHE_TTL.
+    record_item_changes(changes)
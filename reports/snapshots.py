@@ -0,0 +1,127 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+from django.db import transaction
+from django.db.models import F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from orders.models import OrderItem
+from .models import DailyReportSnapshot, SalesRollup
+from .summary import VALID_REPORT_STATUSES, metric_annotations, metric_values
+
+logger = logging.getLogger(__name__)
+
+# Penutupan hari laporan: setiap malam hari-hari yang sudah lewat dibekukan
+# menjadi DailyReportSnapshot per tenant. Hari ditutup berurutan tanpa celah
+# sejak hari terakhir yang ditutup, jadi tanggal snapshot terbaru adalah batas
+# "sudah ditutup": semua hari sampai tanggal itu dibaca dari snapshot.
+# Order yang berubah setelah harinya ditutup (mis. dibuat 23:58 dan baru
+# dibayar setelah penutupan, atau PROCESSING -> COMPLETED keesokan harinya)
+# mengubah SalesRollup hari itu; snapshot tenant/hari tersebut lalu ditulis
+# ulang setelah commit (lihat reports.rollups.apply_deltas).
+TOP_ITEMS_PER_SNAPSHOT = 5
+
+
+def closed_through():
+    """Tanggal terakhir yang sudah ditutup (None jika belum ada snapshot)."""
+    return DailyReportSnapshot.objects.aggregate(last=Max('date'))['last']
+
+
+def _top_items(first, until, tenant_id=None):
+    tz = timezone.get_current_timezone()
+    items = OrderItem.objects.filter(
+        order__status__in=VALID_REPORT_STATUSES,
+        order__created_at__gte=timezone.make_aware(datetime.combine(first, dt_time.min), tz),
+        order__created_at__lt=timezone.make_aware(datetime.combine(until + timedelta(days=1), dt_time.min), tz),
+    )
+    if tenant_id is not None:
+        items = items.filter(order__tenant_id=tenant_id)
+    rows = (
+        items.order_by()
+        .annotate(day=TruncDate('order__created_at', tzinfo=tz))
+        .values('order__tenant_id', 'day', 'menu_item_id', 'menu_item__name')
+        .annotate(total_qty=Sum('qty'), total_revenue=Sum(F('price') * F('qty')))
+    )
+    items = defaultdict(list)
+    for row in rows:
+        items[(row['order__tenant_id'], row['day'])].append({
+            'menu_item_id': row['menu_item_id'],
+            'name': row['menu_item__name'],
+            'qty': row['total_qty'],
+            'revenue': str(row['total_revenue']),
+        })
+    return {
+        key: sorted(entries, key=lambda item: item['qty'], reverse=True)[:TOP_ITEMS_PER_SNAPSHOT]
+        for key, entries in items.items()
+    }
+
+
+def _build_snapshots(first, until, tenant_id=None):
+    rollups = SalesRollup.objects.filter(date__range=(first, until)).order_by()
+    if tenant_id is not None:
+        rollups = rollups.filter(tenant_id=tenant_id)
+    status_counts = defaultdict(dict)
+    for row in rollups.values('tenant_id', 'date', 'status').annotate(count=Sum('order_count')):
+        if row['count']:
+            status_counts[(row['tenant_id'], row['date'])][row['status']] = row['count']
+    top_items = _top_items(first, until, tenant_id)
+
+    snapshots = []
+    for row in rollups.values('tenant_id', 'date').annotate(**metric_annotations()):
+        key = (row['tenant_id'], row['date'])
+        snapshots.append(DailyReportSnapshot(
+            tenant_id=key[0], date=key[1],
+            status_counts=status_counts.get(key, {}), top_items=top_items.get(key, []),
+            **metric_values(row),
+        ))
+    return snapshots
+
+
+def close_report_days(until=None):
+    """
+    Tutup semua hari setelah hari terakhir yang ditutup sampai `until`
+    (default kemarin; hari ini tidak pernah ditutup). Snapshot yang sudah ada
+    tidak ditimpa. Mengembalikan jumlah snapshot yang ditulis.
+    """
+    yesterday = timezone.localdate() - timedelta(days=1)
+    until = min(until or yesterday, yesterday)
+    last = closed_through()
+    first = last + timedelta(days=1) if last else SalesRollup.objects.aggregate(first=Min('date'))['first']
+    if first is None or first > until:
+        return 0
+
+    snapshots = _build_snapshots(first, until)
+    with transaction.atomic():
+        created = DailyReportSnapshot.objects.bulk_create(snapshots, batch_size=1000, ignore_conflicts=True)
+    return len(created)
+
+
+def refresh_report_days(days):
+    """
+    Tulis ulang snapshot untuk [(tenant_id, tanggal), ...] yang sudah ditutup
+    tetapi rollup-nya berubah. Hari yang belum ditutup diabaikan (masih
+    dibaca dari SalesRollup). Mengembalikan jumlah snapshot yang ditulis.
+    """
+    last = closed_through()
+    if last is None:
+        return 0
+    written = 0
+    for tenant_id, date in sorted(day for day in set(days) if day[1] <= last):
+        snapshots = _build_snapshots(date, date, tenant_id)
+        with transaction.atomic():
+            DailyReportSnapshot.objects.filter(tenant_id=tenant_id, date=date).delete()
+            written += len(DailyReportSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True))
+    return written
+
+
+def schedule_snapshot_refresh(days):
+    """Jadwalkan refresh_report_days() setelah transaksi perubahan order commit."""
+    days = set(days)
+
+    def refresh():
+        try:
+            refresh_report_days(days)
+        except Exception:
+            logger.exception(f"Gagal menulis ulang snapshot laporan {sorted(days)}")
+
+    transaction.on_commit(refresh)
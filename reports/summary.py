@@ -0,0 +1,210 @@
+from django.db.models import Sum, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied
+from orders.models import Order
+from .generations import generation_scope, get_generation
+from .models import DailyReportSnapshot, SalesRollup
+
+CACHE_VERSION = "v3"  # v3: entry SWR {data, fresh_until, generation}
+VALID_REPORT_STATUSES = ['PAID', 'PROCESSING', 'READY', 'COMPLETED']
+SETTLED_STATUSES = ['COMPLETED', 'PAID', 'READY']
+ACTIVE_STATUSES = ['COMPLETED', 'PAID', 'READY', 'PROCESSING']
+
+# Metrik laporan per kelompok rollup; kolom DailyReportSnapshot bernama sama
+REPORT_METRICS = {
+    'order_count': Sum('order_count', filter=Q(status__in=VALID_REPORT_STATUSES)),
+    'revenue': Sum('revenue', filter=Q(status__in=VALID_REPORT_STATUSES)),
+    'revenue_cash': Sum('revenue', filter=Q(status__in=VALID_REPORT_STATUSES, payment_method='CASH')),
+    'revenue_transfer': Sum('revenue', filter=Q(status__in=VALID_REPORT_STATUSES, payment_method='TRANSFER')),
+    'settled_revenue': Sum('revenue', filter=Q(status__in=SETTLED_STATUSES)),
+    'settled_revenue_cash': Sum('revenue', filter=Q(status__in=SETTLED_STATUSES, payment_method='CASH')),
+    'active_count': Sum('order_count', filter=Q(status__in=ACTIVE_STATUSES)),
+    'pending_count': Sum('order_count', filter=Q(status='AWAITING_PAYMENT')),
+}
+
+
+def metric_annotations(expressions=REPORT_METRICS):
+    """Alias anotasi ber-prefix: nama metrik sama dengan kolom (order_count, revenue)."""
+    return {f"metric_{name}": expression for name, expression in expressions.items()}
+
+
+def metric_values(row):
+    return {name: row[f"metric_{name}"] or 0 for name in REPORT_METRICS}
+
+
+def report_summary_cache_key(periode, stand_id):
+    return f"{CACHE_VERSION}_dashboard_report_{periode}_{stand_id}"
+
+
+def report_summary_generation(stand_id):
+    # Disimpan di entry SWR: perubahan order membuat entry basi, bukan hilang (reports.generations)
+    return get_generation(generation_scope(stand_id))
+
+
+def report_summary_soft_ttl(periode):
+    return 60 if periode == 'hari-ini' else 300
+
+
+def report_date_range(periode):
+    """(tanggal_awal, tanggal_akhir) inklusif untuk periode laporan; None = tanpa batas."""
+    today = timezone.localdate()
+    if periode == 'hari-ini':
+        return today, today
+    if periode == 'kemarin':
+        yesterday = today - timedelta(days=1)
+        return yesterday, yesterday
+    if periode == '7-hari':
+        return today - timedelta(days=7), None
+    return None, None
+
+
+def parse_report_range(params):
+    """?from=&to= (YYYY-MM-DD, inklusif; default hari ini) -> (tanggal_awal, tanggal_akhir)."""
+    today = timezone.localdate()
+    dates = {}
+    for name in ('from', 'to'):
+        value = params.get(name)
+        dates[name] = parse_date(value) if value else today
+        if dates[name] is None:
+            raise serializers.ValidationError({name: 'Format tanggal harus YYYY-MM-DD.'})
+    if dates['from'] > dates['to']:
+        raise serializers.ValidationError({'to': 'Tanggal akhir tidak boleh sebelum tanggal awal.'})
+    return dates['from'], dates['to']
+
+
+def parse_report_stand(params, user):
+    """?stand_id=<id|semua>; staff tenant hanya boleh memilih stand miliknya."""
+    stand_id = params.get('stand_id', 'semua')
+    if stand_id == 'semua':
+        return stand_id
+    try:
+        stand_id = int(stand_id)
+    except ValueError:
+        raise serializers.ValidationError({'stand_id': 'stand_id harus berupa angka atau "semua".'})
+    if not user.is_staff and not user.tenants.filter(pk=stand_id).exists():
+        raise PermissionDenied('Anda tidak memiliki akses ke stand ini.')
+    return stand_id
+
+
+def filter_report_rollups(queryset, periode, stand_id):
+    """Padanan filter_report_orders() untuk tabel SalesRollup."""
+    start, end = report_date_range(periode)
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    if stand_id and stand_id != 'semua':
+        queryset = queryset.filter(tenant_id=stand_id)
+    return queryset
+
+
+def filter_report_orders(queryset, periode, stand_id):
+    """Filter periode (hari-ini/kemarin/7-hari) dan stand yang dipakai semua endpoint laporan."""
+    # Filter waktu dasar
+    start, end = report_date_range(periode)
+    if start:
+        queryset = queryset.filter(created_at__date__gte=start)
+    if end:
+        queryset = queryset.filter(created_at__date__lte=end)
+
+    # Filter Stand (Jika user memilih stand tertentu)
+    if stand_id and stand_id != 'semua':
+        queryset = queryset.filter(tenant_id=stand_id)
+    return queryset
+
+
+def report_metrics_by_tenant(periode, stand_id):
+    """
+    {tenant_id: {name, <REPORT_METRICS>}} untuk periode laporan. Hari sampai
+    batas penutupan dibaca dari DailyReportSnapshot, hari setelahnya dari SalesRollup.
+    """
+    from .snapshots import closed_through
+
+    start, end = report_date_range(periode)
+    last_closed = closed_through()
+    sources = []
+    if last_closed and (start is None or start <= last_closed):
+        snapshots = filter_report_rollups(DailyReportSnapshot.objects.all(), periode, stand_id)
+        sources.append(
+            snapshots.filter(date__lte=last_closed).values('tenant_id', 'tenant__name')
+            .annotate(**metric_annotations({name: Sum(name) for name in REPORT_METRICS}))
+        )
+    if end is None or last_closed is None or end > last_closed:
+        rollups = filter_report_rollups(SalesRollup.objects.all(), periode, stand_id)
+        if last_closed:
+            rollups = rollups.filter(date__gt=last_closed)
+        sources.append(rollups.values('tenant_id', 'tenant__name').annotate(**metric_annotations()))
+
+    per_tenant = {}
+    for source in sources:
+        for row in source.order_by():
+            merged = per_tenant.setdefault(
+                row['tenant_id'], {'name': row['tenant__name'], **{name: 0 for name in REPORT_METRICS}}
+            )
+            for name, value in metric_values(row).items():
+                merged[name] += value
+    return per_tenant
+
+
+def build_report_summary(periode, stand_id):
+    """Hitung payload report_summary dari database (dipakai view dan task refresh)."""
+    # Per tenant: hari yang sudah ditutup dari snapshot harian, sisanya
+    # (hari berjalan) dari rollup (tenant x tanggal x jam), bukan dari baris Order
+    per_tenant = report_metrics_by_tenant(periode, stand_id)
+
+    def total(name):
+        return sum((row[name] for row in per_tenant.values()), 0)
+
+    # --- 2. LOGIKA UNTUK HALAMAN DASHBOARD (DashboardPage.jsx) ---
+    stats_today = {
+        'total_revenue_cash': total('settled_revenue_cash'),
+        'completed': total('active_count'),
+        'pending': total('pending_count'),
+    }
+
+    # Hitung Stand Performance (Top Stands)
+    stand_performance = sorted(
+        (
+            {'name': row['name'], 'value': row['settled_revenue']}
+            for row in per_tenant.values() if row['settled_revenue']
+        ),
+        key=lambda stand: stand['value'], reverse=True
+    )[:5]
+
+    # --- 3. LOGIKA UNTUK HALAMAN LAPORAN KEUANGAN ---
+    stats_report = {
+        'totalPendapatanTunai': total('revenue_cash'),
+        'totalPendapatanTransfer': total('revenue_transfer'),
+        'totalTransaksi': total('order_count'),
+    }
+
+    # Daftar transaksi tetap dari tabel Order (dibatasi 50 baris terbaru)
+    report_queryset = filter_report_orders(Order.objects.all(), periode, stand_id).filter(
+        status__in=VALID_REPORT_STATUSES
+    )
+
+    # [POINT 10]: select_related() SEBELUM cache untuk menghindari N+1 
+    transactions_data = report_queryset.select_related('customer', 'tenant').order_by('-created_at')[:50]
+    transactions_list = []
+    for trx in transactions_data:
+        transactions_list.append({
+            'id': trx.id,
+            'references_code': trx.references_code,
+            'customer_name': trx.customer.name if trx.customer else 'Guest',
+            'total': trx.total,
+            'status': trx.status,
+            'payment_method': trx.payment_method,
+            'created_at': trx.created_at,
+            'tenant_name': trx.tenant.name
+        })
+
+    response_data = {
+        'stats': stats_report,
+        'transactions': transactions_list,
+        'stats_today': stats_today,
+        'stand_performance': stand_performance
+    }
+    return response_data
@@ -0,0 +1,54 @@
+import logging
+from celery import shared_task
+from .cache import release_refresh_lock, store
+from .exports import get_export_job, update_export_job, write_export_file
+from .popularity import rebase
+from .snapshots import close_report_days
+from .summary import (
+    build_report_summary, report_summary_cache_key, report_summary_generation, report_summary_soft_ttl,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def refresh_report_summary(periode, stand_id, lock_token=None, cache_key=None):
+    """Hitung ulang cache report_summary yang sudah lewat soft TTL (stale-while-revalidate)."""
+    # Pakai key yang sama dengan request pemicu agar lock-nya ikut terlepas
+    key = cache_key or report_summary_cache_key(periode, stand_id)
+    try:
+        # Generasi dibaca sebelum menghitung: perubahan selama build membuat entry basi lagi
+        generation = report_summary_generation(stand_id)
+        store(key, build_report_summary(periode, stand_id), report_summary_soft_ttl(periode), generation=generation)
+    finally:
+        release_refresh_lock(key, lock_token)
+    return f"Cache laporan {periode}/{stand_id} diperbarui"
+
+
+@shared_task(ignore_result=True)
+def rebase_popularity_index():
+    """Geser landmark indeks popularitas (peluruhan waktu) agar skor tidak meluap."""
+    return f"{rebase()} sorted set popularitas di-rebase"
+
+
+@shared_task(ignore_result=True)
+def export_report_transactions(job_id):
+    """Tulis ekspor transaksi (CSV/XLSX) ke media storage untuk rentang tanggal besar."""
+    job = get_export_job(job_id)
+    if job is None:
+        return f"Job ekspor {job_id} tidak ditemukan"
+    update_export_job(job_id, status='RUNNING')
+    try:
+        path = write_export_file(job['params'], job['user_id'], job['is_staff'])
+    except Exception:
+        logger.exception(f"Ekspor transaksi {job_id} gagal")
+        update_export_job(job_id, status='FAILED')
+        raise
+    update_export_job(job_id, status='READY', file=path)
+    return f"Ekspor transaksi {job_id} selesai: {path}"
+
+
+@shared_task(ignore_result=True)
+def close_report_days_task():
+    """Bekukan hari laporan yang sudah lewat menjadi snapshot harian per tenant."""
+    return f"{close_report_days()} snapshot laporan harian ditulis"
@@ -1,3 +1,854 @@
-from django.test import TestCase
+import importlib.util
+import io
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, time as dt_time, timedelta
+from unittest import mock
+from decimal import Decimal
+from io import StringIO
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from canteen.db_routers import read_from_replica
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
+from tenants.models import Tenant, MenuItem
+from orders.models import Customer, Order, OrderItem
+from orders.expiry import expire_due_orders
+from reports.dashboard import dashboard_cache_key
+from reports.cache import store
+from reports.generations import GLOBAL_SCOPE, get_generation
+from reports.models import DailyReportSnapshot, MenuSalesRollup, SalesRollup
+from reports import popularity
+from reports.rollups import rebuild_rollups
+from reports.snapshots import close_report_days
+from reports.summary import build_report_summary, report_summary_cache_key, report_summary_generation
+from reports.timeseries import get_series
+from reports.tasks import export_report_transactions, refresh_report_summary
 
-# Create your tests here.
+
+class ReportTransactionsTests(APITestCase):
+    """Tes: Daftar transaksi laporan dengan paginasi keyset."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_laporan", password="x", is_staff=True)
+        self.tenant = Tenant.objects.create(name="Stand Laporan", active=True)
+        other = Tenant.objects.create(name="Stand Lain", active=True)
+        for i in range(7):
+            Order.objects.create(tenant=self.tenant, payment_method="CASH", status="COMPLETED", total=1000 + i)
+        Order.objects.create(tenant=self.tenant, payment_method="CASH", status="AWAITING_PAYMENT", total=500)
+        Order.objects.create(tenant=other, payment_method="TRANSFER", status="PAID", total=2000)
+        self.client.force_authenticate(self.admin)
+
+    def test_paginates_valid_transactions_for_stand(self):
+        params = {'periode': 'hari-ini', 'stand_id': self.tenant.id, 'page_size': 3}
+        first = self.client.get(reverse('report-transactions'), params)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first.data['results']), 3)
+        self.assertEqual(first.data['results'][0]['customer_name'], 'Guest')
+
+        ids = [row['id'] for row in first.data['results']]
+        url = first.data['next']
+        while url:
+            page = self.client.get(url)
+            ids.extend(row['id'] for row in page.data['results'])
+            url = page.data['next']
+
+        expected = Order.objects.filter(tenant=self.tenant, status='COMPLETED').order_by('-created_at', '-id')
+        self.assertEqual(ids, list(expected.values_list('id', flat=True)))
+
+    def test_tenant_staff_only_sees_own_stand(self):
+        seller = User.objects.create_user(username="seller_laporan", password="x")
+        self.tenant.staff.add(seller)
+        self.client.force_authenticate(seller)
+
+        response = self.client.get(reverse('report-transactions'), {'periode': 'hari-ini', 'page_size': 50})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({row['tenant_name'] for row in response.data['results']}, {"Stand Laporan"})
+        self.assertEqual(len(response.data['results']), 7)
+
+        other = Tenant.objects.get(name="Stand Lain")
+        response = self.client.get(reverse('report-transactions'), {'stand_id': other.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse('report-transactions'), {'stand_id': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SalesRollupTests(APITestCase):
+    """Tes: Rollup penjualan dijaga inkremental dan sama dengan hasil rebuild."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Rollup", active=True)
+
+    def _snapshot(self):
+        return sorted(
+            SalesRollup.objects.filter(order_count__gt=0).values_list(
+                'tenant_id', 'date', 'hour', 'payment_method', 'status', 'order_count', 'revenue'
+            )
+        )
+
+    def _bucket(self, status_name, payment_method="CASH"):
+        return SalesRollup.objects.filter(
+            tenant=self.tenant, status=status_name, payment_method=payment_method
+        ).values_list('order_count', 'revenue').first()
+
+    def test_status_transitions_move_order_between_buckets(self):
+        order = Order.objects.create(tenant=self.tenant, payment_method="CASH", status="AWAITING_PAYMENT", total=15000)
+        self.assertEqual(self._bucket('AWAITING_PAYMENT'), (1, Decimal('15000')))
+
+        order.status = 'PAID'
+        order.save(update_fields=['status'])
+        self.assertEqual(self._bucket('AWAITING_PAYMENT'), (0, Decimal('0')))
+        self.assertEqual(self._bucket('PAID'), (1, Decimal('15000')))
+
+        # Simpan meta saja tidak menyentuh rollup
+        order.meta = {'catatan': 'x'}
+        order.save(update_fields=['meta'])
+        self.assertEqual(self._bucket('PAID'), (1, Decimal('15000')))
+
+    def test_stale_instance_uses_locked_database_state(self):
+        order = Order.objects.create(
+            tenant=self.tenant, payment_method="CASH", status="AWAITING_PAYMENT", total=5000,
+            expired_at=timezone.now() - timedelta(minutes=1)
+        )
+        stale = Order.objects.get(pk=order.pk)
+        expire_due_orders()
+        self.assertEqual(self._bucket('EXPIRED'), (1, Decimal('5000')))
+
+        stale.cancel_and_restock()
+        self.assertEqual(self._bucket('EXPIRED'), (0, Decimal('0')))
+        self.assertEqual(self._bucket('CANCELLED'), (1, Decimal('5000')))
+        self.assertEqual(self._bucket('AWAITING_PAYMENT'), (0, Decimal('0')))
+
+    def test_save_uses_loaded_state_without_rereading_order(self):
+        Order.objects.create(tenant=self.tenant, payment_method="CASH", status="AWAITING_PAYMENT", total=15000)
+        order = Order.objects.get(tenant=self.tenant)
+
+        # Save tanpa field state: satu UPDATE, tanpa transaksi/savepoint
+        order.meta = {'catatan': 'x'}
+        with self.assertNumQueries(1):
+            order.save(update_fields=['meta'])
+
+        order.status = 'PAID'
+        with CaptureQueriesContext(connection) as ctx:
+            order.save(update_fields=['status'])
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "orders_order"' in q['sql']])
+        self.assertEqual(self._bucket('PAID'), (1, Decimal('15000')))
+        self.assertEqual(self._bucket('AWAITING_PAYMENT'), (0, Decimal('0')))
+
+    def test_incremental_rollup_matches_rebuild(self):
+        for i in range(4):
+            Order.objects.create(tenant=self.tenant, payment_method="TRANSFER", status="PAID", total=1000 * (i + 1))
+        done = Order.objects.create(tenant=self.tenant, payment_method="CASH", status="READY", total=7000)
+        done.status = 'COMPLETED'
+        done.save()
+        incremental = self._snapshot()
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_summary_reads_rollups(self):
+        admin = User.objects.create_user(username="admin_rollup", password="x", is_staff=True)
+        Order.objects.create(tenant=self.tenant, payment_method="CASH", status="COMPLETED", total=12000)
+        Order.objects.create(tenant=self.tenant, payment_method="TRANSFER", status="PAID", total=8000)
+        Order.objects.create(tenant=self.tenant, payment_method="CASH", status="AWAITING_PAYMENT", total=3000)
+        self.client.force_authenticate(admin)
+        cache.delete(report_summary_cache_key("hari-ini", self.tenant.id))
+
+        response = self.client.get(reverse('report-summary'), {'periode': 'hari-ini', 'stand_id': self.tenant.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stats']['totalPendapatanTunai'], Decimal('12000'))
+        self.assertEqual(response.data['stats']['totalPendapatanTransfer'], Decimal('8000'))
+        self.assertEqual(response.data['stats']['totalTransaksi'], 2)
+        self.assertEqual(response.data['stats_today']['pending'], 1)
+
+
+class StaleWhileRevalidateTests(APITestCase):
+    """Tes: Cache laporan SWR (soft/hard TTL) tanpa 503 saat dihitung ulang."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_swr", password="x", is_staff=True)
+        self.tenant = Tenant.objects.create(name="Stand SWR", active=True)
+        self.key = report_summary_cache_key('hari-ini', self.tenant.id)
+        cache.delete(self.key)
+        cache.delete(f"lock_{self.key}")
+        self.client.force_authenticate(self.admin)
+
+    def _get(self):
+        return self.client.get(reverse('report-summary'), {'periode': 'hari-ini', 'stand_id': self.tenant.id})
+
+    def test_stale_entry_is_served_while_one_refresh_is_queued(self):
+        cache.set(self.key, {'data': {'stale': True}, 'fresh_until': time.time() - 1}, timeout=60)
+
+        with mock.patch('reports.views.refresh_report_summary.delay') as delay:
+            first, second = self._get(), self._get()
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, {'stale': True})
+        self.assertEqual(second.data, {'stale': True})
+        # Hanya satu refresh untuk banyak request basi
+        self.assertEqual(delay.call_count, 1)
+
+        periode, stand_id, token, key = delay.call_args.args
+        self.assertEqual(key, self.key)
+        refresh_report_summary(periode, stand_id, token, key)
+        fresh = self._get()
+        self.assertIn('stats', fresh.data)
+        self.assertIsNone(cache.get(f"lock_{self.key}"))
+
+    def test_cold_cache_with_held_lock_computes_instead_of_503(self):
+        cache.add(f"lock_{self.key}", 'request-lain', timeout=60)
+        with mock.patch('reports.cache.COLD_WAIT_SECONDS', 0.2):
+            response = self._get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('stats', response.data)
+        # Lock milik request lain tidak ikut dilepas
+        self.assertEqual(cache.get(f"lock_{self.key}"), 'request-lain')
+
+    def test_broker_failure_keeps_serving_stale_payload(self):
+        cache.set(self.key, {'data': {'stale': True}, 'fresh_until': time.time() - 1}, timeout=60)
+        with mock.patch('reports.views.refresh_report_summary.delay', side_effect=ConnectionError):
+            response = self._get()
+        self.assertEqual(response.data, {'stale': True})
+        self.assertIsNone(cache.get(f"lock_{self.key}"))
+
+
+class ReportGenerationInvalidationTests(APITestCase):
+    """Tes: Invalidasi cache laporan lewat counter generasi per tenant, digabung per jendela waktu."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Generasi", active=True)
+        self.other = Tenant.objects.create(name="Stand Generasi Lain", active=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = Order.objects.create(
+                tenant=self.tenant, payment_method="CASH", status="AWAITING_PAYMENT", total=1000
+            )
+        # Mulai dari keadaan bersih: tanda dari setUp sudah diterapkan, tanpa jendela aktif
+        self._end_debounce_window()
+        self._generations()
+        self._end_debounce_window()
+
+    def _end_debounce_window(self):
+        cache.delete_pattern('report_generation_debounce_*')
+
+    def _generations(self):
+        return (
+            get_generation(str(self.tenant.id)),
+            get_generation(str(self.other.id)),
+            get_generation(GLOBAL_SCOPE),
+        )
+
+    def test_status_change_makes_cached_reports_of_tenant_stale(self):
+        stored = {}
+        for stand_id in (self.tenant.id, 'semua', self.other.id):
+            stored[stand_id] = report_summary_cache_key('kemarin', stand_id)
+            cache.delete(f"lock_{stored[stand_id]}")
+            store(stored[stand_id], {'cached': stand_id}, 300, generation=report_summary_generation(stand_id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.status = 'PAID'
+            self.order.save(update_fields=['status'])
+
+        self.client.force_authenticate(User.objects.create_user(username="admin_generasi", is_staff=True))
+        with mock.patch('reports.views.refresh_report_summary.delay') as delay:
+            responses = {
+                stand_id: self.client.get(reverse('report-summary'), {'periode': 'kemarin', 'stand_id': stand_id})
+                for stand_id in stored
+            }
+        # Entry basi tetap dilayani (tanpa rebuild sinkron) sambil dihitung ulang di background
+        for stand_id, response in responses.items():
+            self.assertEqual(response.data, {'cached': stand_id})
+        refreshed = sorted(str(call.args[1]) for call in delay.call_args_list)
+        self.assertEqual(refreshed, sorted([str(self.tenant.id), 'semua']))
+
+    def test_burst_of_writes_is_coalesced_into_one_bump_per_window(self):
+        tenant_gen, other_gen, global_gen = self._generations()
+        with self.captureOnCommitCallbacks(execute=True):
+            for status_name in ('PAID', 'PROCESSING'):
+                self.order.status = status_name
+                self.order.save(update_fields=['status'])
+        self.assertEqual(self._generations(), (tenant_gen + 1, other_gen, global_gen + 1))
+
+        # Tulisan berikutnya dalam jendela yang sama: generasi belum naik lagi
+        for status_name in ('READY', 'COMPLETED'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.order.status = status_name
+                self.order.save(update_fields=['status'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(tenant=self.tenant, payment_method="CASH", status="PAID", total=500)
+        self.assertEqual(self._generations(), (tenant_gen + 1, other_gen, global_gen + 1))
+
+        # Jendela berakhir: seluruh rentetan menjadi satu kenaikan
+        self._end_debounce_window()
+        self.assertEqual(self._generations(), (tenant_gen + 2, other_gen, global_gen + 2))
+        self.assertEqual(self._generations(), (tenant_gen + 2, other_gen, global_gen + 2))
+
+    def test_meta_only_save_does_not_invalidate(self):
+        before = self._generations()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.order.meta = {'pin_attempts': 1}
+            self.order.save(update_fields=['meta'])
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self._generations(), before)
+
+    def test_bulk_expiry_invalidates_tenant(self):
+        Order.objects.filter(pk=self.order.pk).update(expired_at=timezone.now() - timedelta(minutes=1))
+        tenant_gen, other_gen, global_gen = self._generations()
+        with self.captureOnCommitCallbacks(execute=True):
+            expire_due_orders()
+        self.assertEqual(self._generations(), (tenant_gen + 1, other_gen, global_gen + 1))
+
+
+class ReportDashboardTests(APITestCase):
+    """Tes: Dashboard operasional dihitung dengan <= 3 query dan di-cache per scope user."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_dashboard", password="x", is_staff=True)
+        self.seller = User.objects.create_user(username="penjual_dashboard", password="x")
+        self.tenant = Tenant.objects.create(name="Stand Dashboard", active=True)
+        self.other = Tenant.objects.create(name="Stand Tetangga", active=True)
+        self.tenant.staff.add(self.seller)
+        menu = MenuItem.objects.create(tenant=self.tenant, name="Nasi Goreng", price=10000, stock=10)
+        customer = Customer.objects.create(name="Budi", phone="0811")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            paid = Order.objects.create(
+                tenant=self.tenant, customer=customer, payment_method="CASH", status="PAID", total=20000
+            )
+            OrderItem.objects.create(order=paid, menu_item=menu, qty=2, price=10000)
+            Order.objects.create(
+                tenant=self.tenant, customer=customer, payment_method="CASH", status="COMPLETED", total=5000
+            )
+            Order.objects.create(tenant=self.other, payment_method="TRANSFER", status="AWAITING_PAYMENT", total=7000)
+        for user in (self.admin, self.seller):
+            cache.delete(dashboard_cache_key(user))
+
+    def _get(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get(reverse('reports-summary'))
+
+    def test_admin_dashboard_uses_at_most_three_queries_then_cache(self):
+        with self.assertNumQueries(3):
+            response = self._get(self.admin)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['main_stats'], {
+            'total_revenue': Decimal('20000'), 'total_orders': 3,
+            'avg_order_value': Decimal('20000'), 'active_customers': 1,
+        })
+        self.assertEqual(response.data['stats_today'], {'total': 3, 'pending': 1, 'preparing': 1, 'completed': 1})
+        self.assertEqual(sum(hour['orders'] for hour in response.data['sales_by_hour']), 3)
+        self.assertEqual(response.data['top_selling_products'][0]['menu_item__name'], "Nasi Goreng")
+        self.assertEqual(response.data['stand_performance'], [
+            {'name': "Stand Dashboard", 'orders': 2, 'revenue': 20000.0},
+            {'name': "Stand Tetangga", 'orders': 1, 'revenue': 0.0},
+        ])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get(self.admin).data, response.data)
+
+    def test_tenant_staff_only_sees_own_stands(self):
+        with self.assertNumQueries(3):
+            response = self._get(self.seller)
+        self.assertEqual(response.data['main_stats']['total_revenue'], 0)
+        self.assertEqual(response.data['stats_today']['total'], 2)
+        self.assertEqual([stand['name'] for stand in response.data['stand_performance']], ["Stand Dashboard"])
+
+    def test_top_sellers_count_all_time_sales_from_menu_rollup(self):
+        menu = MenuItem.objects.create(tenant=self.tenant, name="Es Teh", price=3000, stock=100)
+        old = Order.objects.create(tenant=self.tenant, payment_method="CASH", status="COMPLETED", total=150000)
+        OrderItem.objects.create(order=old, menu_item=menu, qty=50, price=150000)
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        cache.delete(dashboard_cache_key(self.admin))
+
+        top = self._get(self.admin).data['top_selling_products']
+        self.assertEqual([item['menu_item__name'] for item in top], ["Es Teh", "Nasi Goreng"])
+        self.assertEqual(top[0]['total_sold'], 50)
+        self.assertEqual(top[0]['total_revenue'], Decimal('150000'))
+
+    def test_menu_rollup_follows_item_changes_and_matches_rebuild(self):
+        menu = MenuItem.objects.get(name="Nasi Goreng")
+        order = Order.objects.create(tenant=self.tenant, payment_method="CASH", status="PAID", total=30000)
+        item = OrderItem.objects.create(order=order, menu_item=menu, qty=3, price=10000)
+        item.qty = 1
+        item.save(update_fields=['qty'])
+        self.assertEqual(MenuSalesRollup.objects.get(menu_item=menu).qty, 3)
+        incremental = list(MenuSalesRollup.objects.values_list('menu_item_id', 'qty', 'revenue'))
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(list(MenuSalesRollup.objects.values_list('menu_item_id', 'qty', 'revenue')), incremental)
+
+        # Hapus order: item ikut terhapus (cascade) dan keluar dari rollup
+        order.delete()
+        self.assertEqual(MenuSalesRollup.objects.get(menu_item=menu).qty, 2)
+
+    @override_settings(REPORT_GENERATION_DEBOUNCE_SECONDS=0)
+    def test_order_change_invalidates_cached_dashboard(self):
+        self._get(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(tenant=self.other, payment_method="TRANSFER", status="PAID", total=9000)
+        response = self._get(self.admin)
+        self.assertEqual(response.data['main_stats']['total_revenue'], Decimal('29000'))
+        self.assertEqual(response.data['stats_today']['total'], 4)
+
+
+class PopularityIndexTests(APITestCase):
+    """Tes: Indeks popularitas menu ber-peluruhan waktu di Redis."""
+
+    def setUp(self):
+        redis = popularity._redis()
+        keys = list(redis.scan_iter(match='popularity:*'))
+        if keys:
+            redis.delete(*keys)
+        self.tenant = Tenant.objects.create(name="Stand Populer", active=True)
+        self.other = Tenant.objects.create(name="Stand Populer Lain", active=True)
+        self.soto = MenuItem.objects.create(tenant=self.tenant, name="Soto", price=10000, stock=100)
+        self.bakso = MenuItem.objects.create(tenant=self.tenant, name="Bakso", price=12000, stock=100)
+        self.es_teh = MenuItem.objects.create(tenant=self.other, name="Es Teh", price=3000, stock=100)
+
+    def _pay(self, menu_item, qty):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(tenant=menu_item.tenant, payment_method="CASH", total=0)
+            OrderItem.objects.create(order=order, menu_item=menu_item, qty=qty, price=menu_item.price)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'PAID'
+            order.save(update_fields=['status'])
+        return order
+
+    def _names(self, **params):
+        response = self.client.get(reverse('popular-menus'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        return [item['name'] for item in results]
+
+    def test_paid_orders_update_index_per_scope(self):
+        self._pay(self.soto, 1)
+        self._pay(self.bakso, 3)
+        self._pay(self.es_teh, 2)
+        # Order yang belum dibayar tidak dihitung
+        Order.objects.create(tenant=self.tenant, payment_method="CASH", total=0)
+
+        self.assertEqual(self._names(), ["Bakso", "Es Teh", "Soto"])
+        self.assertEqual(self._names(tenant=self.tenant.id), ["Bakso", "Soto"])
+        self.assertEqual(self._names(limit=1), ["Bakso"])
+
+        # Status lanjutan (PROCESSING, COMPLETED) tidak menghitung ulang
+        order = self._pay(self.soto, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'COMPLETED'
+            order.save(update_fields=['status'])
+        self.assertEqual(self._names(tenant=self.tenant.id), ["Bakso", "Soto"])
+
+    def test_recent_sales_outweigh_old_ones_in_short_window(self):
+        now = time.time()
+        popularity.record_sale(self.tenant.id, {self.soto.id: 10}, timestamp=now - 5 * 24 * 3600)
+        popularity.record_sale(self.tenant.id, {self.bakso.id: 2}, timestamp=now)
+
+        self.assertEqual(self._names(window='1-hari'), ["Bakso", "Soto"])
+        self.assertEqual(self._names(window='30-hari'), ["Soto", "Bakso"])
+
+    def test_rebase_and_rebuild_keep_ranking(self):
+        self._pay(self.soto, 2)
+        self._pay(self.bakso, 5)
+        before = self._names(window='7-hari')
+
+        popularity.rebase(now=time.time() + 3600)
+        self.assertEqual(self._names(window='7-hari'), before)
+
+        call_command('rebuild_popularity_index', stdout=StringIO())
+        self.assertEqual(self._names(window='7-hari'), before)
+        self.assertEqual(self._names(tenant=self.other.id), [])
+
+    def test_invalid_window_is_rejected(self):
+        response = self.client.get(reverse('popular-menus'), {'window': 'selamanya'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReportExportTests(APITestCase):
+    """Tes: Ekspor transaksi laporan (CSV streaming dan job Celery)."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_ekspor", password="x", is_staff=True)
+        self.seller = User.objects.create_user(username="penjual_ekspor", password="x")
+        self.tenant = Tenant.objects.create(name="Stand Ekspor", active=True)
+        self.other = Tenant.objects.create(name="Stand Ekspor Lain", active=True)
+        self.tenant.staff.add(self.seller)
+        for i in range(60):
+            Order.objects.create(tenant=self.tenant, payment_method="CASH", status="COMPLETED", total=1000 + i)
+        hacker = Customer.objects.create(name="=HYPERLINK(\"http://x\")", phone="0812")
+        Order.objects.create(tenant=self.tenant, customer=hacker, payment_method="TRANSFER", status="PAID", total=5000)
+        Order.objects.create(tenant=self.tenant, payment_method="CASH", status="AWAITING_PAYMENT", total=700)
+        Order.objects.create(tenant=self.other, payment_method="CASH", status="PAID", total=900)
+        old = Order.objects.create(tenant=self.tenant, payment_method="CASH", status="PAID", total=800)
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=40))
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def _rows(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return [line for line in content.lstrip('\ufeff').splitlines()]
+
+    def test_streams_all_transactions_in_range_for_stand(self):
+        self.client.force_authenticate(self.admin)
+        today = timezone.localdate().isoformat()
+        response = self.client.get(reverse('report-export'), {'from': today, 'to': today, 'stand_id': self.tenant.id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = self._rows(response)
+        self.assertTrue(rows[0].startswith('Kode Referensi,Waktu,Stand'))
+        # 60 COMPLETED + 1 PAID; AWAITING_PAYMENT, stand lain dan order 40 hari lalu tidak ikut
+        self.assertEqual(len(rows) - 1, 61)
+        # Nama yang diawali '=' tidak dieksekusi sebagai rumus oleh spreadsheet
+        self.assertTrue(any("'=HYPERLINK" in row for row in rows))
+
+    def test_tenant_staff_cannot_export_other_stand(self):
+        self.client.force_authenticate(self.seller)
+        response = self.client.get(reverse('report-export'), {'stand_id': self.other.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # "semua" untuk staff tenant hanya berisi stand miliknya
+        response = self.client.get(reverse('report-export'))
+        self.assertEqual(len(self._rows(response)) - 1, 61)
+
+    def test_async_export_writes_file_for_owner_only(self):
+        self.client.force_authenticate(self.seller)
+        with self.settings(MEDIA_ROOT=self.media_root), \
+                mock.patch('reports.views.export_report_transactions.delay') as delay:
+            response = self.client.get(reverse('report-export'), {'async': '1'})
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            job_id = response.data['job_id']
+            delay.assert_called_once_with(job_id)
+
+            pending = self.client.get(response.data['status_url'])
+            self.assertEqual(pending.data['status'], 'PENDING')
+
+            export_report_transactions(job_id)
+            ready = self.client.get(response.data['status_url'])
+            self.assertEqual(ready.data['status'], 'READY')
+            download = self.client.get(ready.data['download_url'])
+            self.assertEqual(download.status_code, status.HTTP_200_OK)
+            content = b''.join(download.streaming_content).decode('utf-8-sig')
+            self.assertEqual(len(content.splitlines()) - 1, 61)
+
+            # Job milik user lain tidak terlihat
+            self.client.force_authenticate(self.admin)
+            self.assertEqual(self.client.get(response.data['status_url']).status_code, status.HTTP_404_NOT_FOUND)
+
+    @unittest.skipUnless(importlib.util.find_spec('openpyxl'), "openpyxl tidak terpasang")
+    def test_xlsx_export_runs_as_job(self):
+        from openpyxl import load_workbook
+
+        self.client.force_authenticate(self.admin)
+        with self.settings(MEDIA_ROOT=self.media_root), \
+                mock.patch('reports.views.export_report_transactions.delay'):
+            response = self.client.get(reverse('report-export'), {'type': 'xlsx', 'stand_id': self.tenant.id})
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            export_report_transactions(response.data['job_id'])
+            download = self.client.get(reverse('report-export-download', args=[response.data['job_id']]))
+            workbook = load_workbook(io.BytesIO(b''.join(download.streaming_content)), read_only=True)
+            self.assertEqual(workbook['Transaksi'].max_row, 62)
+
+
+class SalesTimeSeriesTests(APITestCase):
+    """Tes: Deret waktu penjualan tanpa celah dari rollup, bucket tertutup di-cache."""
+
+    def setUp(self):
+        cache.delete_pattern("*_sales_ts_*")
+        self.admin = User.objects.create_user(username="admin_tren", password="x", is_staff=True)
+        self.seller = User.objects.create_user(username="penjual_tren", password="x")
+        self.tenant = Tenant.objects.create(name="Stand Tren", active=True)
+        self.other = Tenant.objects.create(name="Stand Tren Lain", active=True)
+        self.tenant.staff.add(self.seller)
+        # Jam dinding dipatok ke siang hari: bucket kemarin pasti sudah lewat
+        # SETTLE_GRACE, apa pun jam test dijalankan (mis. 00:05)
+        noon = timezone.make_aware(datetime.combine(timezone.localdate(), dt_time(12)))
+        clock = mock.patch('django.utils.timezone.now', return_value=noon)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.today = timezone.localdate()
+
+        def order(tenant, total, days_ago=0, status_name="PAID"):
+            created = Order.objects.create(tenant=tenant, payment_method="CASH", status=status_name, total=total)
+            Order.objects.filter(pk=created.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+            return created
+
+        order(self.tenant, 1000)
+        order(self.tenant, 2000)
+        self.old_order = order(self.tenant, 4000, days_ago=2)
+        order(self.other, 8000, days_ago=2)
+        order(self.tenant, 9999, status_name="AWAITING_PAYMENT")
+        # UPDATE created_at melewati sinyal: samakan rollup dengan data order
+        rebuild_rollups()
+
+    def _get(self, user=None, **params):
+        self.client.force_authenticate(user or self.admin)
+        return self.client.get(reverse('report-timeseries'), params)
+
+    def test_daily_series_has_no_gaps(self):
+        start = self.today - timedelta(days=3)
+        response = self._get(**{'from': start.isoformat(), 'to': self.today.isoformat(), 'bucket': 'day'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([row['orders'] for row in results], [0, 2, 0, 2])
+        self.assertEqual(results[1]['revenue'], Decimal('12000'))
+        self.assertEqual(results[3]['revenue'], Decimal('3000'))
+        self.assertEqual([row['closed'] for row in results], [True, True, True, False])
+        self.assertTrue(results[0]['bucket'].startswith(start.isoformat()))
+
+    def test_hourly_and_weekly_buckets(self):
+        hourly = self._get(**{'from': self.today.isoformat(), 'bucket': 'hour'}).data['results']
+        self.assertEqual(len(hourly), 24)
+        # Jam dari hari berbeda tidak bertabrakan: bucket berupa timestamp lengkap
+        self.assertEqual(len({row['bucket'] for row in hourly}), 24)
+        self.assertEqual(sum(row['orders'] for row in hourly), 2)
+
+        weekly = self._get(**{'from': self.today.isoformat(), 'bucket': 'week'}).data['results']
+        monday = self.today - timedelta(days=self.today.weekday())
+        self.assertEqual(len(weekly), 1)
+        self.assertTrue(weekly[0]['bucket'].startswith(monday.isoformat()))
+        self.assertEqual(weekly[0]['orders'], 2 + (2 if (self.today - timedelta(days=2)) >= monday else 0))
+
+    def test_closed_buckets_are_served_from_cache(self):
+        past = {'from': (self.today - timedelta(days=5)).isoformat(), 'to': (self.today - timedelta(days=1)).isoformat()}
+        first = self._get(**past).data['results']
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get(**past).data['results'], first)
+
+        # Rentang dengan hari ini: hanya bucket yang masih berjalan ditanyakan ke database
+        current = {**past, 'to': self.today.isoformat()}
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self._get(**current).data['results']), 6)
+
+    def test_change_to_closed_bucket_invalidates_cache(self):
+        two_days_ago = (self.today - timedelta(days=2)).isoformat()
+        params = {'from': two_days_ago, 'to': two_days_ago, 'stand_id': self.tenant.id}
+        self.assertEqual(self._get(**params).data['results'][0]['revenue'], Decimal('4000'))
+
+        # Koreksi status order lama setelah bucket-nya tertutup dan di-cache
+        order = Order.objects.get(pk=self.old_order.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'CANCELLED'
+            order.save(update_fields=['status'])
+        self.assertEqual(self._get(**params).data['results'][0]['revenue'], Decimal('0'))
+
+        # Tulisan ke bucket yang masih berjalan tidak membuang cache bucket tertutup
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(tenant=self.tenant, payment_method="CASH", status="PAID", total=100)
+        with self.assertNumQueries(0):
+            self._get(**params)
+
+    def test_bucket_stays_open_during_payment_window(self):
+        tz = timezone.get_current_timezone()
+        start = timezone.make_aware(datetime.combine(self.today, dt_time(9)), tz)
+        paid_late = Order.objects.create(tenant=self.tenant, payment_method="CASH", status="AWAITING_PAYMENT", total=500)
+        Order.objects.filter(pk=paid_late.pk).update(created_at=start + timedelta(minutes=55))
+        rebuild_rollups()
+
+        def nine_oclock(now):
+            rows = get_series(self.today, self.today, 'hour', [self.tenant.id], now=now)
+            return rows[9]
+
+        # 10:05: order 09:55 masih bisa dibayar, bucket 09:00 belum di-cache
+        self.assertFalse(nine_oclock(start + timedelta(minutes=65))['closed'])
+        paid_late.refresh_from_db()
+        paid_late.status = 'PAID'
+        paid_late.save(update_fields=['status'])
+        settled = nine_oclock(start + timedelta(minutes=80))
+        self.assertTrue(settled['closed'])
+        self.assertEqual(settled['revenue'], Decimal('500'))
+
+    def test_tenant_staff_scope_and_validation(self):
+        two_days_ago = (self.today - timedelta(days=2)).isoformat()
+        results = self._get(self.seller, **{'from': two_days_ago, 'to': two_days_ago}).data['results']
+        self.assertEqual(results[0]['revenue'], Decimal('4000'))
+
+        self.assertEqual(self._get(self.seller, stand_id=self.other.id).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self._get(bucket='month').status_code, status.HTTP_400_BAD_REQUEST)
+        too_long = {'from': (self.today - timedelta(days=200)).isoformat(), 'bucket': 'hour'}
+        self.assertEqual(self._get(**too_long).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DailyReportSnapshotTests(APITestCase):
+    """Tes: Snapshot laporan harian yang immutable untuk hari yang sudah ditutup."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Snapshot", active=True)
+        self.other = Tenant.objects.create(name="Stand Snapshot Lain", active=True)
+        menu = MenuItem.objects.create(tenant=self.tenant, name="Mie Ayam", price=12000, stock=10)
+
+        def order(tenant, total, days_ago, payment_method="CASH", status_name="COMPLETED", qty=0):
+            created = Order.objects.create(tenant=tenant, payment_method=payment_method, status=status_name, total=total)
+            if qty:
+                OrderItem.objects.create(order=created, menu_item=menu, qty=qty, price=menu.price)
+            Order.objects.filter(pk=created.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+        order(self.tenant, 12000, days_ago=2, qty=1)
+        order(self.tenant, 24000, days_ago=1, qty=2)
+        order(self.tenant, 5000, days_ago=1, payment_method="TRANSFER", status_name="PAID")
+        order(self.other, 7000, days_ago=1, status_name="AWAITING_PAYMENT")
+        order(self.tenant, 3000, days_ago=0)
+        rebuild_rollups()
+
+    def test_closes_past_days_once(self):
+        live_week = build_report_summary('7-hari', 'semua')
+        self.assertEqual(close_report_days(), 3)
+        self.assertEqual(close_report_days(), 0)
+        self.assertFalse(DailyReportSnapshot.objects.filter(date=timezone.localdate()).exists())
+
+        yesterday = DailyReportSnapshot.objects.get(tenant=self.tenant, date=timezone.localdate() - timedelta(days=1))
+        self.assertEqual(yesterday.revenue_cash, Decimal('24000'))
+        self.assertEqual(yesterday.revenue_transfer, Decimal('5000'))
+        self.assertEqual(yesterday.status_counts, {'COMPLETED': 1, 'PAID': 1})
+        self.assertEqual(yesterday.top_items[0]['name'], "Mie Ayam")
+        self.assertEqual(yesterday.top_items[0]['qty'], 2)
+        with self.assertRaises(ValueError):
+            yesterday.save()
+
+        # Snapshot (hari tertutup) + rollup (hari ini) = hasil hitung penuh sebelumnya
+        self.assertEqual(build_report_summary('7-hari', 'semua')['stats'], live_week['stats'])
+        self.assertEqual(build_report_summary('7-hari', 'semua')['stats_today'], live_week['stats_today'])
+
+    def test_closed_day_is_served_from_frozen_snapshot(self):
+        close_report_days()
+        # Rollup kemarin berubah setelah ditutup; laporan kemarin tetap memakai snapshot
+        SalesRollup.objects.filter(date=timezone.localdate() - timedelta(days=1)).update(revenue=0)
+
+        with CaptureQueriesContext(connection) as queries:
+            summary = build_report_summary('kemarin', 'semua')
+        self.assertFalse(any('reports_salesrollup' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(summary['stats']['totalPendapatanTunai'], Decimal('24000'))
+        self.assertEqual(summary['stats']['totalTransaksi'], 2)
+        self.assertEqual(summary['stats_today']['pending'], 1)
+        self.assertEqual(summary['stand_performance'], [{'name': "Stand Snapshot", 'value': Decimal('29000')}])
+
+        # Hari berjalan tetap dihitung langsung dari rollup
+        today = build_report_summary('hari-ini', self.tenant.id)
+        self.assertEqual(today['stats']['totalPendapatanTunai'], Decimal('3000'))
+
+    def test_late_payment_rewrites_closed_day(self):
+        close_report_days()
+        yesterday = timezone.localdate() - timedelta(days=1)
+        # Order kemarin 23:58 baru dibayar setelah hari ditutup
+        late = Order.objects.get(tenant=self.other)
+        late.status = 'PAID'
+        with self.captureOnCommitCallbacks(execute=True):
+            late.save(update_fields=['status'])
+
+        snapshot = DailyReportSnapshot.objects.get(tenant=self.other, date=yesterday)
+        self.assertEqual(snapshot.revenue_cash, Decimal('7000'))
+        self.assertEqual(snapshot.settled_revenue, Decimal('7000'))
+        self.assertEqual(snapshot.pending_count, 0)
+        self.assertEqual(snapshot.status_counts, {'PAID': 1})
+        # Hari lain dan tenant lain tidak ditulis ulang
+        self.assertEqual(DailyReportSnapshot.objects.filter(tenant=self.tenant, date=yesterday).get().revenue_cash,
+                         Decimal('24000'))
+
+        summary = build_report_summary('kemarin', 'semua')
+        self.assertEqual(summary['stats']['totalPendapatanTunai'], Decimal('31000'))
+        self.assertEqual(summary['stats_today']['pending'], 0)
+
+
+class ReadReplicaRoutingTests(APITestCase):
+    """Tes: Baca analitik diarahkan ke alias replica dengan read-your-writes."""
+
+    def setUp(self):
+        cache.delete_pattern('db_primary_pin_*')
+        self.admin = User.objects.create_user(username="admin_replica", password="x", is_staff=True)
+        self.other_admin = User.objects.create_user(username="admin_replica_2", password="x", is_staff=True)
+        self.tenant = Tenant.objects.create(name="Stand Replica", active=True)
+        self.order = Order.objects.create(tenant=self.tenant, payment_method="CASH", status="PAID", total=5000)
+        self.client.force_authenticate(self.admin)
+
+    def _summary_database(self):
+        with mock.patch('canteen.db_routers.replica_configured', return_value=True), \
+                mock.patch('reports.views.get_or_revalidate', side_effect=lambda *args, **kwargs: {
+                    'db': router.db_for_read(Order)
+                }):
+            return self.client.get(reverse('report-summary')).data['db']
+
+    def test_report_and_dashboard_views_read_from_replica(self):
+        self.assertEqual(self._summary_database(), 'replica')
+        # Di luar view, baca kembali ke primary
+        self.assertEqual(router.db_for_read(Order), 'default')
+
+        with mock.patch('canteen.db_routers.replica_configured', return_value=True), \
+                mock.patch('orders.views.get_dashboard', side_effect=lambda user: {'db': router.db_for_read(Order)}):
+            response = self.client.get(reverse('reports-summary'))
+        self.assertEqual(response.data, {'db': 'replica'})
+        self.assertEqual(router.db_for_read(Order), 'default')
+
+    def test_streamed_export_keeps_reading_from_replica(self):
+        def fake_stream(queryset):
+            # Dijalankan saat konten di-stream, setelah view selesai
+            yield router.db_for_read(Order)
+
+        with mock.patch('canteen.db_routers.replica_configured', return_value=True), \
+                mock.patch('reports.views.stream_csv', side_effect=fake_stream):
+            response = self.client.get(reverse('report-export'), {'from': '2025-01-01', 'to': '2025-01-31'})
+            content = b''.join(response.streaming_content)
+        self.assertEqual(content, b'replica')
+
+    def test_writer_is_pinned_to_primary(self):
+        response = self.client.patch(
+            reverse('update-order-status', args=[self.order.uuid]), {'status': 'PROCESSING'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._summary_database(), 'default')
+
+        # User lain tidak ikut di-pin
+        self.client.force_authenticate(self.other_admin)
+        self.assertEqual(self._summary_database(), 'replica')
+
+    def test_writes_never_go_to_replica(self):
+        with mock.patch('canteen.db_routers.replica_configured', return_value=True), read_from_replica():
+            self.assertEqual(router.db_for_read(Order), 'replica')
+            self.assertEqual(router.db_for_write(Order), 'default')
+        # Tanpa alias replica, opt-in tidak berpengaruh
+        with read_from_replica():
+            if 'replica' not in settings.DATABASES:
+                self.assertEqual(router.db_for_read(Order), 'default')
+
+@unittest.skipUnless('replica' in settings.DATABASES, "Alias database 'replica' tidak dikonfigurasi")
+class ReadReplicaAliasTests(APITransactionTestCase):
+    """
+    Tes: Query benar-benar berjalan di alias replica. Jalankan dengan
+    DB_REPLICA_NAME diisi (mis. file SQLite yang sama dengan DB_NAME).
+    TransactionTestCase: koneksi replica tidak bisa melihat data di dalam
+    transaksi tes yang belum di-commit.
+    """
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        cache.delete_pattern('db_primary_pin_*')
+        self.admin = User.objects.create_user(username="admin_replica", password="x", is_staff=True)
+        self.tenant = Tenant.objects.create(name="Stand Replica", active=True)
+        self.order = Order.objects.create(tenant=self.tenant, payment_method="CASH", status="COMPLETED", total=5000)
+        self.client.force_authenticate(self.admin)
+
+    def test_queries_run_on_replica_alias(self):
+        with CaptureQueriesContext(connections['replica']) as replica_queries, \
+                CaptureQueriesContext(connections['default']) as primary_queries:
+            response = self.client.get(reverse('report-transactions'), {'stand_id': self.tenant.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.order.id])
+        self.assertTrue(any('orders_order' in query['sql'] for query in replica_queries.captured_queries))
+        self.assertFalse(any('orders_order' in query['sql'] for query in primary_queries.captured_queries))
+
+    def test_order_list_sync_token_allows_for_replica_lag(self):
+        before = timezone.now()
+        response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Token dimundurkan sebesar lag maksimum agar perubahan yang belum tereplikasi tidak terlewat
+        lagged = before - timedelta(seconds=settings.REPLICA_MAX_LAG_SECONDS)
+        self.assertLessEqual(int(response['X-Sync-Token']), int(lagged.timestamp() * 1_000_000) + 1_000_000)
@@ -0,0 +1,215 @@
+import logging
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from .generations import GLOBAL_SCOPE, bump_generation, get_generation
+from .models import SalesRollup
+from .summary import CACHE_VERSION, VALID_REPORT_STATUSES
+
+# Deret waktu penjualan (GET /api/reports/timeseries/) dari SalesRollup.
+# Deret bucket tanpa celah dibuat di SQL (generate_series di PostgreSQL,
+# CTE rekursif di SQLite) lalu di-LEFT JOIN dengan agregat rollup, jadi tidak
+# ada baris order yang ditarik ke aplikasi. Bucket yang sudah tertutup di-cache
+# per bucket; bucket yang masih berjalan selalu dihitung ulang. Rollup memakai
+# created_at, jadi order yang dibuat di akhir bucket dan dibayar dalam jendela
+# pembayaran (10 menit) masih mengubah bucket itu: bucket baru dianggap tertutup
+# setelah waktu akhirnya + SETTLE_GRACE. Perubahan yang tetap mengenai bucket
+# tertutup (pembayaran Midtrans yang telat, koreksi status, rebuild rollup)
+# menaikkan generasi bucket tertutup scope itu setelah commit
+# (reports.rollups); generasi ada di key cache, jadi entry lama tidak terpakai.
+BUCKET_STEPS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(days=7),
+}
+MAX_BUCKETS = 2000
+SETTLE_GRACE = timedelta(minutes=15)
+CLOSED_BUCKET_TTL = 60 * 60 * 24
+
+logger = logging.getLogger(__name__)
+
+# Awal bucket dari kolom rollup (date, hour), dalam waktu lokal tanpa zona
+_POSTGRES_BUCKET = {
+    'hour': "r.date + make_interval(hours => r.hour)",
+    'day': "r.date::timestamp",
+    'week': "date_trunc('week', r.date::timestamp)",
+}
+_POSTGRES_STEP = {'hour': '1 hour', 'day': '1 day', 'week': '7 days'}
+_SQLITE_BUCKET = {
+    'hour': "datetime(r.date, '+' || r.hour || ' hours')",
+    'day': "datetime(r.date)",
+    # 'weekday 0' maju ke hari Minggu terdekat; mundur 6 hari = Senin minggu itu
+    'week': "datetime(r.date, 'weekday 0', '-6 days')",
+}
+_SQLITE_STEP = {'hour': '+1 hour', 'day': '+1 day', 'week': '+7 days'}
+
+
+def parse_bucket(params):
+    bucket = params.get('bucket', 'day')
+    if bucket not in BUCKET_STEPS:
+        raise serializers.ValidationError({'bucket': f"Pilihan: {', '.join(BUCKET_STEPS)}."})
+    return bucket
+
+
+def bucket_range(start_date, end_date, bucket):
+    """(awal_bucket_pertama, awal_bucket_terakhir) sebagai datetime lokal tanpa zona."""
+    if bucket == 'week':
+        # Minggu dimulai hari Senin (sama dengan date_trunc('week'))
+        start_date -= timedelta(days=start_date.weekday())
+        end_date -= timedelta(days=end_date.weekday())
+    first = datetime.combine(start_date, dt_time.min)
+    last = datetime.combine(end_date, dt_time.min)
+    if bucket == 'hour':
+        last += timedelta(hours=23)
+    count = int((last - first) / BUCKET_STEPS[bucket]) + 1
+    if count > MAX_BUCKETS:
+        raise serializers.ValidationError(
+            {'bucket': f"Rentang terlalu panjang untuk bucket {bucket} (maks {MAX_BUCKETS} titik)."}
+        )
+    return first, last
+
+
+def _series_sql(connection, bucket, tenant_ids):
+    statuses = ', '.join(['%s'] * len(VALID_REPORT_STATUSES))
+    tenant_filter = ''
+    if tenant_ids is not None:
+        tenant_filter = f"AND r.tenant_id IN ({', '.join(['%s'] * len(tenant_ids))})"
+    table = SalesRollup._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        series = (
+            f"SELECT generate_series(%s::timestamp, %s::timestamp, interval '{_POSTGRES_STEP[bucket]}') AS bucket"
+        )
+        bucket_expr = _POSTGRES_BUCKET[bucket]
+        prefix = 'WITH buckets AS ('
+    else:
+        series = (
+            f"SELECT %s AS bucket UNION ALL "
+            f"SELECT datetime(bucket, '{_SQLITE_STEP[bucket]}') FROM buckets WHERE bucket < %s"
+        )
+        bucket_expr = _SQLITE_BUCKET[bucket]
+        prefix = 'WITH RECURSIVE buckets(bucket) AS ('
+
+    return f"""
+        {prefix}{series}),
+        sales AS (
+            SELECT {bucket_expr} AS bucket, SUM(r.order_count) AS orders, SUM(r.revenue) AS revenue
+            FROM {table} r
+            WHERE r.date BETWEEN %s AND %s AND r.status IN ({statuses}) {tenant_filter}
+            GROUP BY 1
+        )
+        SELECT b.bucket, COALESCE(s.orders, 0), COALESCE(s.revenue, 0)
+        FROM buckets b LEFT JOIN sales s ON s.bucket = b.bucket
+        ORDER BY b.bucket
+    """
+
+
+def _to_datetime(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=None)
+
+
+def query_series(first, last, bucket, tenant_ids=None):
+    """Satu query SQL: [(awal_bucket, jumlah_order, pendapatan), ...] tanpa celah."""
+    # SQL mentah tidak lewat router ORM; alias dipilih manual (replica jika aktif)
+    connection = connections[router.db_for_read(SalesRollup)]
+    # Rollup minggu pertama bisa dimulai sebelum `first` jika first bukan Senin;
+    # batas tanggal diambil dari rentang bucket penuh.
+    end_date = (last + BUCKET_STEPS[bucket] - timedelta(microseconds=1)).date()
+    params = [first, last] if connection.vendor == 'postgresql' else [
+        first.strftime('%Y-%m-%d %H:%M:%S'), last.strftime('%Y-%m-%d %H:%M:%S'),
+    ]
+    params += [first.date().isoformat(), end_date.isoformat(), *VALID_REPORT_STATUSES]
+    if tenant_ids is not None:
+        params += list(tenant_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(_series_sql(connection, bucket, tenant_ids), params)
+        return [
+            (_to_datetime(start), int(orders), Decimal(str(revenue)))
+            for start, orders, revenue in cursor.fetchall()
+        ]
+
+
+def _generation_scope(scope):
+    return f"sales_ts_{scope}"
+
+
+def _closed_generation(tenant_ids):
+    scopes = [GLOBAL_SCOPE] if tenant_ids is None else [str(pk) for pk in sorted(tenant_ids)]
+    return '.'.join(str(get_generation(_generation_scope(scope))) for scope in scopes)
+
+
+def _bucket_cache_key(scope, generation, bucket, start):
+    return f"{CACHE_VERSION}_sales_ts_{scope}_g{generation}_{bucket}_{start:%Y%m%d%H}"
+
+
+def is_closed_hour(date, hour, now=None):
+    """True jika bucket jam (date, hour) sudah tertutup (dan mungkin sudah di-cache)."""
+    now = timezone.localtime(now).replace(tzinfo=None)
+    return datetime.combine(date, dt_time(hour)) + BUCKET_STEPS['hour'] + SETTLE_GRACE <= now
+
+
+def bump_closed_buckets(tenant_ids):
+    """Buang cache bucket tertutup tenant (dan 'semua') dengan menaikkan generasinya."""
+    try:
+        for scope in {*(str(pk) for pk in tenant_ids), GLOBAL_SCOPE}:
+            bump_generation(_generation_scope(scope))
+    except Exception:
+        logger.warning(f"Gagal menginvalidasi cache deret waktu tenant {sorted(tenant_ids)}.")
+
+
+def schedule_closed_bucket_bump(tenant_ids):
+    """Setelah commit: pembaca tidak boleh menyimpan data pra-commit di bawah generasi baru."""
+    tenant_ids = set(tenant_ids)
+    transaction.on_commit(lambda: bump_closed_buckets(tenant_ids))
+
+
+def get_series(start_date, end_date, bucket, tenant_ids=None, now=None):
+    """
+    Deret penjualan per bucket. Bucket tertutup dibaca dari cache (satu MGET);
+    jika semuanya ada, database hanya ditanya untuk bucket yang masih berjalan.
+    """
+    first, last = bucket_range(start_date, end_date, bucket)
+    step = BUCKET_STEPS[bucket]
+    now = timezone.localtime(now).replace(tzinfo=None)
+    scope = GLOBAL_SCOPE if tenant_ids is None else '-'.join(str(pk) for pk in sorted(tenant_ids))
+
+    starts = []
+    current = first
+    while current <= last:
+        starts.append(current)
+        current += step
+    closed = [start for start in starts if start + step + SETTLE_GRACE <= now]
+    open_starts = starts[len(closed):]
+
+    # Generasi dibaca sebelum query: perubahan yang commit di tengah jalan
+    # menaikkan generasi, jadi hasil yang mungkin basi tersimpan di key lama
+    generation = _closed_generation(tenant_ids) if closed else None
+    keys = {start: _bucket_cache_key(scope, generation, bucket, start) for start in closed}
+    cached = cache.get_many(keys.values()) if keys else {}
+
+    if len(cached) == len(keys):
+        rows = [(start, *cached[keys[start]]) for start in closed]
+        if open_starts:
+            rows += query_series(open_starts[0], open_starts[-1], bucket, tenant_ids)
+    else:
+        rows = query_series(first, last, bucket, tenant_ids)
+        cache.set_many(
+            {keys[start]: (orders, revenue) for start, orders, revenue in rows if start in keys},
+            timeout=CLOSED_BUCKET_TTL,
+        )
+
+    tz = timezone.get_current_timezone()
+    return [
+        {
+            'bucket': timezone.make_aware(start, tz).isoformat(),
+            'orders': orders,
+            'revenue': revenue,
+            'closed': start + step + SETTLE_GRACE <= now,
+        }
+        for start, orders, revenue in rows
+    ]
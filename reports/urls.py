@@ -3,4 +3,9 @@ from . import views
 
 urlpatterns = [
     path('summary/', views.report_summary, name='report-summary'),
+    path('transactions/', views.report_transactions, name='report-transactions'),
+    path('timeseries/', views.report_timeseries, name='report-timeseries'),
+    path('export/', views.report_export, name='report-export'),
+    path('export/<str:job_id>/', views.report_export_status, name='report-export-status'),
+    path('export/<str:job_id>/download/', views.report_export_download, name='report-export-download'),
 ]
\ No newline at end of file
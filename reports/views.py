@@ -1,124 +1,167 @@
+import logging
+import os
+from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Q
-from django.utils import timezone
-from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
 from orders.models import Order
-from django.core.cache import cache
+from canteen.db_routers import replica_reads
+from canteen.pagination import KeysetPagination
+from .cache import get_or_revalidate
+from .exports import (
+    create_export_job, export_filename, export_queryset, get_export_job,
+    parse_export_params, stream_csv, update_export_job,
+)
+from .summary import (
+    VALID_REPORT_STATUSES, build_report_summary, filter_report_orders,
+    parse_report_range, parse_report_stand, report_summary_cache_key, report_summary_generation,
+    report_summary_soft_ttl,
+)
+from .timeseries import get_series, parse_bucket
+from .tasks import export_report_transactions, refresh_report_summary
 
-CACHE_VERSION = "v1"
+logger = logging.getLogger(__name__)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def report_summary(request):
     # --- 1. SETUP DATA UMUM ---
     periode = request.query_params.get('periode', 'hari-ini')
     stand_id = request.query_params.get('stand_id', 'semua')
     
-    cache_key = f"{CACHE_VERSION}_dashboard_report_{periode}_{stand_id}"
-    cache_timeout = 60 if periode == 'hari-ini' else 300
-    
-    cached_data = cache.get(cache_key)
-    
-    # Jika data ada di cache, langsung return tanpa hit database
-    if cached_data:
-        return Response(cached_data)
-        
-    lock_key = f"lock_{cache_key}"
-    
-    # Memastikan hanya 1 request yang mengeksekusi query database jika cache kosong (Stampede Protection)
-    if cache.add(lock_key, "1", timeout=10):
+    # Stale-while-revalidate: setelah soft TTL payload lama tetap dikirim
+    # sementara satu task Celery menghitung ulang di background (tanpa 503).
+    cache_key = report_summary_cache_key(periode, stand_id)
+    response_data = get_or_revalidate(
+        cache_key,
+        build=lambda: build_report_summary(periode, stand_id),
+        refresh=lambda lock_token: refresh_report_summary.delay(periode, stand_id, lock_token, cache_key),
+        soft_ttl=report_summary_soft_ttl(periode),
+        generation=report_summary_generation(stand_id),
+    )
+    return Response(response_data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def report_transactions(request):
+    """
+    Daftar transaksi laporan keuangan lengkap (bukan hanya 50 terakhir seperti di
+    summary), dipaginasi keyset: ?cursor=<next dari respons sebelumnya>.
+    """
+    periode = request.query_params.get('periode', 'hari-ini')
+    stand_id = parse_report_stand(request.query_params, request.user)
+
+    queryset = filter_report_orders(Order.objects.filter(status__in=VALID_REPORT_STATUSES), periode, stand_id)
+    if not request.user.is_staff:
+        # Staff tenant hanya melihat transaksi stand miliknya
+        queryset = queryset.filter(tenant__staff=request.user)
+    queryset = queryset.values(
+        'id', 'references_code', 'total', 'status', 'payment_method', 'created_at',
+        customer_name=F('customer__name'), tenant_name=F('tenant__name'),
+    )
+
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    for trx in page:
+        trx['customer_name'] = trx['customer_name'] or 'Guest'
+    return paginator.get_paginated_response(page)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def report_timeseries(request):
+    """
+    Deret waktu penjualan untuk grafik tren:
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD&bucket=hour|day|week&stand_id=<id|semua>.
+    Setiap bucket dalam rentang selalu ada (nilai 0 jika tidak ada penjualan).
+    """
+    start, end = parse_report_range(request.query_params)
+    bucket = parse_bucket(request.query_params)
+    stand_id = parse_report_stand(request.query_params, request.user)
+
+    if stand_id != 'semua':
+        tenant_ids = [stand_id]
+    elif request.user.is_staff:
+        tenant_ids = None
+    else:
+        tenant_ids = list(request.user.tenants.values_list('id', flat=True))
+
+    return Response({
+        'bucket': bucket,
+        'from': start,
+        'to': end,
+        'results': get_series(start, end, bucket, tenant_ids) if tenant_ids != [] else [],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def report_export(request):
+    """
+    Ekspor semua transaksi laporan untuk rentang tanggal dan stand:
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD&stand_id=<id|semua>&type=csv|xlsx.
+    CSV di-stream langsung (memori konstan). XLSX, atau CSV dengan ?async=1
+    untuk rentang yang sangat besar, dikerjakan Celery dan ditulis ke media;
+    respons 202 berisi URL status job.
+    """
+    params = parse_export_params(request.query_params, request.user)
+
+    if params['type'] == 'xlsx' or request.query_params.get('async') in ('1', 'true'):
+        job_id = create_export_job(params, request.user)
         try:
-            today = timezone.now().date()
-
-            # Base Queryset: Ambil SEMUA order (jangan filter status dulu)
-            base_queryset = Order.objects.all()
-            
-            # Filter waktu dasar
-            if periode == 'hari-ini':
-                base_queryset = base_queryset.filter(created_at__date=today)
-            elif periode == 'kemarin':
-                yesterday = today - timedelta(days=1)
-                base_queryset = base_queryset.filter(created_at__date=yesterday)
-            elif periode == '7-hari':
-                week_ago = today - timedelta(days=7)
-                base_queryset = base_queryset.filter(created_at__date__gte=week_ago)
-
-            # Filter Stand (Jika user memilih stand tertentu)
-            if stand_id and stand_id != 'semua':
-                base_queryset = base_queryset.filter(tenant_id=stand_id)
-
-            # --- 2. LOGIKA UNTUK HALAMAN DASHBOARD (DashboardPage.jsx) ---
-            # Hitung agregat untuk dashboard
-            dashboard_stats = base_queryset.aggregate(
-                rev_cash=Sum('total', filter=Q(payment_method='CASH', status__in=['COMPLETED', 'PAID', 'READY'])),
-                count_completed=Count('id', filter=Q(status__in=['COMPLETED', 'PAID', 'READY', 'PROCESSING'])),
-                count_pending=Count('id', filter=Q(status='AWAITING_PAYMENT'))
+            export_report_transactions.delay(job_id)
+        except Exception:
+            logger.exception(f"Gagal menjadwalkan ekspor transaksi {job_id}")
+            update_export_job(job_id, status='FAILED')
+            return Response(
+                {'detail': 'Layanan ekspor sedang tidak tersedia, coba lagi nanti.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
+        return Response({
+            'job_id': job_id,
+            'status': 'PENDING',
+            'status_url': reverse('report-export-status', args=[job_id]),
+        }, status=status.HTTP_202_ACCEPTED)
 
-            stats_today = {
-                'total_revenue_cash': dashboard_stats['rev_cash'] or 0,
-                'completed': dashboard_stats['count_completed'] or 0,
-                'pending': dashboard_stats['count_pending'] or 0,
-            }
-
-            # Hitung Stand Performance (Top Stands)
-            stand_perf_qs = base_queryset.filter(status__in=['COMPLETED', 'PAID', 'READY']).values('tenant__name').annotate(
-                value=Sum('total')
-            ).order_by('-value')[:5]
-
-            stand_performance = [
-                {'name': item['tenant__name'], 'value': item['value'] or 0} 
-                for item in stand_perf_qs
-            ]
-
-            # --- 3. LOGIKA UNTUK HALAMAN LAPORAN KEUANGAN ---
-            valid_statuses = ['PAID', 'PROCESSING', 'READY', 'COMPLETED']
-            report_queryset = base_queryset.filter(status__in=valid_statuses)
-
-            agg_report = report_queryset.aggregate(
-                total_tunai=Sum('total', filter=Q(payment_method='CASH')),
-                total_transfer=Sum('total', filter=Q(payment_method='TRANSFER')),
-                total_trx=Count('id')
-            )
+    queryset = export_queryset(params, request.user.pk, request.user.is_staff)
+    response = StreamingHttpResponse(stream_csv(queryset), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(params)}"'
+    return response
 
-            stats_report = {
-                'totalPendapatanTunai': agg_report['total_tunai'] or 0,
-                'totalPendapatanTransfer': agg_report['total_transfer'] or 0,
-                'totalTransaksi': agg_report['total_trx'] or 0,
-            }
-
-            # [POINT 10]: select_related() SEBELUM cache untuk menghindari N+1 
-            transactions_data = report_queryset.select_related('customer', 'tenant').order_by('-created_at')[:50]
-            transactions_list = []
-            for trx in transactions_data:
-                transactions_list.append({
-                    'id': trx.id,
-                    'references_code': trx.references_code,
-                    'customer_name': trx.customer.name if trx.customer else 'Guest',
-                    'total': trx.total,
-                    'status': trx.status,
-                    'payment_method': trx.payment_method,
-                    'created_at': trx.created_at,
-                    'tenant_name': trx.tenant.name
-                })
-
-            response_data = {
-                'stats': stats_report,
-                'transactions': transactions_list,
-                'stats_today': stats_today,
-                'stand_performance': stand_performance
-            }
-            
-            # Simpan ke cache
-            cache.set(cache_key, response_data, timeout=cache_timeout)
-            
-        finally:
-            cache.delete(lock_key) # Lepas lock setelah selesai
-            
-        return Response(response_data)
-        
-    else:
-        # Jika sedang di-lock oleh thread lain, beri instruksi client untuk coba lagi
-        return Response({"detail": "Memproses laporan, silakan refresh."}, status=503)
\ No newline at end of file
+
+def _get_user_export_job(request, job_id):
+    job = get_export_job(job_id)
+    if job is None or job['user_id'] != request.user.pk:
+        raise NotFound('Job ekspor tidak ditemukan atau sudah kedaluwarsa.')
+    return job
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_export_status(request, job_id):
+    job = _get_user_export_job(request, job_id)
+    data = {'job_id': job_id, 'status': job['status'], 'download_url': None}
+    if job['status'] == 'READY':
+        data['download_url'] = reverse('report-export-download', args=[job_id])
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_export_download(request, job_id):
+    job = _get_user_export_job(request, job_id)
+    if job['status'] != 'READY':
+        raise NotFound('Berkas ekspor belum siap.')
+    return FileResponse(
+        default_storage.open(job['file'], 'rb'), as_attachment=True, filename=os.path.basename(job['file'])
+    )
@@ -0,0 +1,88 @@
+import time
+from django.core.cache import cache
+from .models import Tenant, MenuItem, VariantOption
+
+# Katalog harga per tenant (menu, grup varian, opsi) disimpan di cache dengan
+# nomor versi. Setiap perubahan menu/varian cukup menaikkan versi (lihat
+# tenants.signals) sehingga katalog lama otomatis tidak terpakai lagi.
+CATALOG_TIMEOUT = 60 * 60
+
+
+def _version_key(tenant_id):
+    return f"price_catalog_version_{tenant_id}"
+
+
+def _catalog_key(tenant_id, version):
+    return f"price_catalog_{tenant_id}_{version}"
+
+
+def get_catalog_version(tenant_id):
+    version = cache.get(_version_key(tenant_id))
+    if version is None:
+        # Nilai awal berbasis waktu agar versi yang ter-evict tidak pernah
+        # kembali ke angka lama dan membaca katalog basi.
+        cache.add(_version_key(tenant_id), int(time.time() * 1000), timeout=None)
+        version = cache.get(_version_key(tenant_id))
+    return version
+
+
+def bump_catalog_version(tenant_id):
+    try:
+        cache.incr(_version_key(tenant_id))
+    except ValueError:
+        cache.add(_version_key(tenant_id), int(time.time() * 1000), timeout=None)
+
+
+def build_price_catalog(tenant_id):
+    """
+    Membangun katalog harga tenant dari database dengan jumlah query tetap,
+    berapa pun banyaknya menu dan varian. Mengembalikan None jika tenant tidak ada.
+    """
+    tenant = Tenant.objects.filter(pk=tenant_id).values('id', 'name', 'active').first()
+    if tenant is None:
+        return None
+
+    items = {
+        row['id']: {
+            'name': row['name'],
+            'price': row['price'],
+            'available': row['available'],
+            'option_ids': set(),
+        }
+        for row in MenuItem.objects.filter(tenant_id=tenant_id).values('id', 'name', 'price', 'available')
+    }
+
+    group_links = list(
+        MenuItem.variant_groups.through.objects
+        .filter(menuitem__tenant_id=tenant_id)
+        .values_list('menuitem_id', 'variantgroup_id')
+    )
+    group_ids = {group_id for _, group_id in group_links}
+
+    options = {}
+    options_by_group = {}
+    for row in VariantOption.objects.filter(group_id__in=group_ids).values('id', 'group_id', 'name', 'price'):
+        options[row['id']] = {'name': row['name'], 'price': row['price']}
+        options_by_group.setdefault(row['group_id'], set()).add(row['id'])
+
+    for menu_item_id, group_id in group_links:
+        items[menu_item_id]['option_ids'] |= options_by_group.get(group_id, set())
+
+    return {
+        'tenant_id': tenant['id'],
+        'name': tenant['name'],
+        'active': tenant['active'],
+        'items': items,
+        'options': options,
+    }
+
+
+def get_price_catalog(tenant_id):
+    """Ambil katalog harga dari cache; bangun ulang jika versi berubah."""
+    key = _catalog_key(tenant_id, get_catalog_version(tenant_id))
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = build_price_catalog(tenant_id)
+        if catalog is not None:
+            cache.set(key, catalog, timeout=CATALOG_TIMEOUT)
+    return catalog
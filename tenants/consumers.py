@@ -1,13 +1,19 @@
 import json
+import logging
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
+from .membership import is_tenant_member
+from .notifications import replay_events, tenant_group_name
+
+logger = logging.getLogger(__name__)
 
 class TenantNotificationConsumer(AsyncWebsocketConsumer):
   async def connect(self):
     # Dapatkan ID tenant dari URL
     self.tenant_id = self.scope['url_route']['kwargs']['tenant_id']
-    self.tenant_group_name = f"tenant_{self.tenant_id}"
+    self.tenant_group_name = tenant_group_name(self.tenant_id)
     self.user = self.scope['user']
     
     # Periksa apakah user terautentikasi dan merupakan staff dari tenant ini
@@ -17,7 +23,8 @@ class TenantNotificationConsumer(AsyncWebsocketConsumer):
         self.tenant_group_name,
         self.channel_name
       )
-      await self.accept()
+      # Token JWT lewat subprotocol: browser mensyaratkan subprotocol itu dipilih
+      await self.accept(subprotocol=self.scope.get('auth_subprotocol'))
     else:
       # Tolak koneksi jika tidak diizinkan
       await self.close()
@@ -29,9 +36,36 @@ class TenantNotificationConsumer(AsyncWebsocketConsumer):
       self.channel_name
     )
     
-  # Menerima pesan dari WebSocket (tidak kita gunakan, tapi bisa untuk komunikasi client->server)
-  async def receive(self, text_data):
-      pass
+  # Menerima pesan dari WebSocket. Klien yang tersambung ulang mengirim
+  # {"action": "resume", "last_seq": <nomor urut terakhir yang diterima>}
+  # untuk menerima event yang terlewat selama koneksi putus.
+  async def receive(self, text_data=None, bytes_data=None):
+    try:
+      data = json.loads(text_data or '')
+    except ValueError:
+      return
+    if isinstance(data, dict) and data.get('action') == 'resume':
+      await self.resume(data.get('last_seq'))
+
+  async def resume(self, last_seq):
+    # Grup sudah diikuti sejak connect: event baru yang belum masuk hasil
+    # replay pasti tiba live (klien membuang duplikat berdasarkan 'seq').
+    if isinstance(last_seq, bool) or not isinstance(last_seq, int) or last_seq < 0:
+      await self.send(text_data=json.dumps({'type': 'error', 'detail': "last_seq tidak valid."}))
+      return
+    try:
+      events, current_seq = await sync_to_async(replay_events)(self.tenant_id, last_seq)
+    except Exception:
+      logger.warning(f"Gagal membaca buffer replay tenant {self.tenant_id}.")
+      events, current_seq = None, None
+
+    if events is None:
+      # Event yang terlewat sudah tidak ada di buffer: muat ulang daftar order
+      await self.send(text_data=json.dumps({'type': 'resync_required', 'seq': current_seq}))
+      return
+    for event in events:
+      await self.send(text_data=json.dumps(event))
+    await self.send(text_data=json.dumps({'type': 'replay_complete', 'seq': current_seq}))
 
   # Menerima pesan dari grup channel (dari server-side) dan meneruskannya ke client
   async def order_notification(self, event):
@@ -39,4 +73,5 @@ class TenantNotificationConsumer(AsyncWebsocketConsumer):
     
   @database_sync_to_async
   def is_user_staff_of_tenant(self, user, tenant_id):
-    return user.tenants.filter(id=tenant_id).exists()
\ No newline at end of file
+    # Peta keanggotaan di-cache (tenants.membership); database hanya saat cache kosong
+    return is_tenant_member(user.pk, tenant_id)
\ No newline at end of file
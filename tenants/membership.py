@@ -0,0 +1,35 @@
+from django.core.cache import cache
+from django.db import transaction
+from .models import Tenant
+
+# Peta keanggotaan staff -> tenant per user, di-cache agar connect WebSocket
+# (dan reconnect massal setelah deploy) tidak menanyai PostgreSQL setiap kali.
+# Dihapus oleh tenants.signals setiap kali relasi Tenant.staff berubah.
+MEMBERSHIP_CACHE_TTL = 60 * 60
+
+
+def _membership_key(user_id):
+    return f"tenant_membership_{user_id}"
+
+
+def tenant_ids_for_user(user_id):
+    """frozenset id tenant tempat user menjadi staff (dari cache jika ada)."""
+    key = _membership_key(user_id)
+    tenant_ids = cache.get(key)
+    if tenant_ids is None:
+        tenant_ids = frozenset(Tenant.objects.filter(staff__id=user_id).values_list('id', flat=True))
+        cache.set(key, tenant_ids, timeout=MEMBERSHIP_CACHE_TTL)
+    return tenant_ids
+
+
+def is_tenant_member(user_id, tenant_id):
+    return int(tenant_id) in tenant_ids_for_user(user_id)
+
+
+def invalidate_membership(user_ids):
+    """Hapus peta user sekarang dan sekali lagi setelah commit (lihat tenants.signals)."""
+    keys = [_membership_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,95 @@
+import json
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.serializers.json import DjangoJSONEncoder
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Aliran notifikasi tenant yang bisa dilanjutkan setelah koneksi putus.
+# Setiap event mendapat nomor urut per tenant (INCR) dan disimpan di buffer
+# replay berupa sorted set Redis (skor = nomor urut) yang hanya menyimpan
+# STREAM_MAXLEN event terbaru. Klien yang tersambung ulang mengirim nomor urut
+# terakhir yang diterimanya dan hanya event yang terlewat yang dikirim ulang.
+STREAM_MAXLEN = 500
+STREAM_TTL = 60 * 60 * 24
+
+# Nomor urut dan penambahan ke buffer dalam satu langkah atomik, jadi urutan
+# di buffer selalu sama dengan urutan nomor. Member = "<seq>:<json>" agar unik.
+_APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('ZADD', KEYS[2], seq, seq .. ':' .. ARGV[1])
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[2]) - 1)
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return seq
+"""
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _seq_key(tenant_id):
+    # Tanpa TTL: nomor urut tidak boleh mundur selama Redis hidup
+    return f"notif:seq:{tenant_id}"
+
+
+def _buffer_key(tenant_id):
+    return f"notif:buffer:{tenant_id}"
+
+
+def tenant_group_name(tenant_id):
+    return f"tenant_{tenant_id}"
+
+
+def append_event(tenant_id, message):
+    """Simpan event ke buffer replay tenant; mengembalikan nomor urutnya."""
+    payload = json.dumps(message, cls=DjangoJSONEncoder)
+    seq = _redis().eval(
+        _APPEND_SCRIPT, 2, _seq_key(tenant_id), _buffer_key(tenant_id), payload, STREAM_MAXLEN, STREAM_TTL
+    )
+    return int(seq)
+
+
+def publish_tenant_event(tenant_id, message):
+    """
+    Beri nomor urut, simpan ke buffer replay, lalu kirim live ke grup tenant.
+    Jika Redis gagal, event tetap dikirim live tanpa 'seq' (tidak bisa di-replay).
+    """
+    try:
+        seq = append_event(tenant_id, message)
+    except Exception:
+        logger.warning(f"Gagal menyimpan event notifikasi tenant {tenant_id} ke buffer replay.")
+        seq = None
+    message = {**message, 'seq': seq}
+    async_to_sync(get_channel_layer().group_send)(
+        tenant_group_name(tenant_id),
+        {'type': 'order.notification', 'message': message}
+    )
+    return seq
+
+
+def replay_events(tenant_id, last_seq):
+    """
+    Event dengan nomor urut > last_seq, urut naik. Mengembalikan
+    (events, current_seq); events None jika sebagian event yang diminta sudah
+    keluar dari buffer (atau nomor urut direset) sehingga klien harus memuat
+    ulang daftar order penuh lalu melanjutkan dari current_seq.
+    """
+    with _redis().pipeline() as pipe:
+        pipe.get(_seq_key(tenant_id))
+        pipe.zrangebyscore(_buffer_key(tenant_id), f"({last_seq}", '+inf')
+        current, members = pipe.execute()
+    current = int(current or 0)
+
+    events = []
+    for member in members:
+        seq, payload = member.decode().split(':', 1)
+        events.append({**json.loads(payload), 'seq': int(seq)})
+
+    if last_seq > current:
+        return None, current
+    if last_seq < current and (not events or events[0]['seq'] != last_seq + 1):
+        return None, current
+    return events, current
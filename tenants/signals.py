@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Tenant, MenuItem, VariantGroup, VariantOption
+from .catalog import bump_catalog_version
+from .membership import invalidate_membership
+
+
+def _bump_after_commit(tenant_id):
+    # Naikkan versi sekarang dan sekali lagi setelah commit: request lain yang
+    # sempat membangun ulang katalog dari data lama (belum ter-commit) di antara
+    # keduanya tidak akan terpakai lagi.
+    bump_catalog_version(tenant_id)
+    transaction.on_commit(lambda: bump_catalog_version(tenant_id))
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_catalog_for_tenant(sender, instance, **kwargs):
+    _bump_after_commit(instance.pk)
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=VariantGroup)
+@receiver(post_delete, sender=VariantGroup)
+def invalidate_catalog_for_menu(sender, instance, **kwargs):
+    _bump_after_commit(instance.tenant_id)
+
+
+@receiver(post_save, sender=VariantOption)
+@receiver(post_delete, sender=VariantOption)
+def invalidate_catalog_for_option(sender, instance, **kwargs):
+    tenant_id = VariantGroup.objects.filter(pk=instance.group_id).values_list('tenant_id', flat=True).first()
+    if tenant_id:
+        _bump_after_commit(tenant_id)
+
+
+@receiver(m2m_changed, sender=MenuItem.variant_groups.through)
+def invalidate_catalog_for_variant_links(sender, instance, **kwargs):
+    if kwargs.get('action') not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # instance bisa MenuItem atau VariantGroup (relasi balik), keduanya punya tenant_id
+    _bump_after_commit(instance.tenant_id)
+
+
+@receiver(m2m_changed, sender=Tenant.staff.through)
+def invalidate_membership_for_staff_links(sender, instance, action, reverse, pk_set, **kwargs):
+    # clear tidak membawa pk_set: user yang terdampak diambil sebelum dihapus
+    if action == 'pre_clear':
+        instance._cleared_staff_ids = (
+            [instance.pk] if reverse else list(instance.staff.values_list('id', flat=True))
+        )
+        return
+    if action == 'post_clear':
+        invalidate_membership(getattr(instance, '_cleared_staff_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        # reverse=True: instance adalah User (user.tenants.add(...))
+        invalidate_membership([instance.pk] if reverse else pk_set)
+
+
+@receiver(pre_delete, sender=Tenant)
+def invalidate_membership_for_tenant(sender, instance, **kwargs):
+    # Relasi staff ikut terhapus tanpa sinyal m2m_changed
+    invalidate_membership(list(instance.staff.values_list('id', flat=True)))
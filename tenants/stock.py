@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from .models import MenuItem
+
+
+class InsufficientStock(Exception):
+    """Dilempar jika satu menu tidak punya stok cukup (atau tidak tersedia)."""
+
+    def __init__(self, menu_item_id):
+        self.menu_item_id = menu_item_id
+        super().__init__(f"Stok menu {menu_item_id} tidak mencukupi")
+
+
+def _per_item(quantities):
+    return Case(
+        *[When(pk=menu_item_id, then=Value(qty)) for menu_item_id, qty in quantities.items()],
+        default=Value(0),
+    )
+
+
+def reserve_stock(tenant_id, quantities):
+    """
+    Kurangi stok secara atomik tanpa SELECT ... FOR UPDATE:
+    UPDATE ... SET stock = stock - qty WHERE id = ? AND stock >= qty,
+    untuk semua menu tenant dalam satu statement (jumlah query tetap berapa
+    pun isi keranjang). Jika jumlah baris yang ter-update kurang dari jumlah
+    menu, ada item yang habis/tidak tersedia.
+
+    `quantities` adalah dict {menu_item_id: qty} yang sudah diagregasi per menu.
+    """
+    if not quantities:
+        return
+    per_item = _per_item(quantities)
+    try:
+        # Savepoint: reservasi parsial dibatalkan sebelum mencari item yang habis
+        with transaction.atomic():
+            updated = MenuItem.objects.filter(
+                pk__in=quantities.keys(), tenant_id=tenant_id, available=True, stock__gte=per_item
+            ).update(stock=F('stock') - per_item)
+            if updated != len(quantities):
+                raise InsufficientStock(None)
+    except InsufficientStock:
+        raise InsufficientStock(_find_short_item(tenant_id, quantities))
+
+
+def _find_short_item(tenant_id, quantities):
+    rows = {
+        row['id']: row
+        for row in MenuItem.objects.filter(pk__in=quantities.keys()).values('id', 'tenant_id', 'available', 'stock')
+    }
+    for menu_item_id in sorted(quantities):
+        row = rows.get(menu_item_id)
+        if row is None or row['tenant_id'] != tenant_id or not row['available'] or row['stock'] < quantities[menu_item_id]:
+            return menu_item_id
+    # Stok sempat bertambah lagi oleh transaksi lain; laporkan item pertama
+    return min(quantities)
+
+
+def release_stock(quantities):
+    """Kembalikan stok beberapa menu sekaligus dengan satu UPDATE teragregasi."""
+    if not quantities:
+        return
+    MenuItem.objects.filter(pk__in=quantities.keys()).update(stock=F('stock') + _per_item(quantities))
@@ -1,3 +1,183 @@
-from django.test import TestCase
+import json
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from rest_framework_simplejwt.tokens import AccessToken
+from canteen.ws_auth import JWTAuthMiddlewareStack
+from django.test import TransactionTestCase, override_settings
+from django_redis import get_redis_connection
+from tenants import routing
+from tenants.models import Tenant
+from tenants.membership import tenant_ids_for_user
+from tenants.notifications import STREAM_MAXLEN, publish_tenant_event, replay_events
 
-# Create your tests here.
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+class WebsocketClient(ApplicationCommunicator):
+    """Klien WebSocket ASGI minimal untuk tes consumer (tanpa server)."""
+
+    def __init__(self, path, user=None, urlpatterns=None, query_string=b'', headers=(), subprotocols=(),
+                 application=None):
+        scope = {
+            'type': 'websocket', 'path': path, 'query_string': query_string, 'headers': list(headers),
+            'subprotocols': list(subprotocols),
+        }
+        if user is not None:
+            scope['user'] = user
+        super().__init__(application or URLRouter(urlpatterns or routing.websocket_urlpatterns), scope)
+
+    async def connect(self):
+        await self.send_input({'type': 'websocket.connect'})
+        self.accept_message = await self.receive_output(1)
+        return self.accept_message['type'] == 'websocket.accept'
+
+    async def send_json(self, data):
+        await self.send_input({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def receive_json(self):
+        message = await self.receive_output(1)
+        return json.loads(message['text'])
+
+    async def disconnect(self):
+        await self.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.wait(1)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ResumableNotificationStreamTests(TransactionTestCase):
+    """Tes: Notifikasi tenant bernomor urut dan replay event yang terlewat saat reconnect."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand Notifikasi", active=True)
+        self.seller = User.objects.create_user(username="seller_notifikasi", password="x")
+        self.tenant.staff.add(self.seller)
+        redis = get_redis_connection('default')
+        redis.delete(f"notif:seq:{self.tenant.pk}", f"notif:buffer:{self.tenant.pk}")
+
+    async def _connect(self):
+        client = WebsocketClient(f"/ws/tenant/{self.tenant.pk}/notifications/", self.seller)
+        self.assertTrue(await client.connect())
+        return client
+
+    async def publish(self, message):
+        return await sync_to_async(publish_tenant_event)(self.tenant.pk, message)
+
+    def test_events_get_increasing_sequence_numbers(self):
+        first = publish_tenant_event(self.tenant.pk, {'type': 'new_paid_order', 'order': {'id': 1}})
+        second = publish_tenant_event(self.tenant.pk, {'type': 'new_paid_order', 'order': {'id': 2}})
+        self.assertEqual((first, second), (1, 2))
+
+        events, current = replay_events(self.tenant.pk, 1)
+        self.assertEqual(current, 2)
+        self.assertEqual(events, [{'type': 'new_paid_order', 'order': {'id': 2}, 'seq': 2}])
+
+    def test_buffer_is_bounded_and_requests_resync_for_evicted_events(self):
+        for i in range(STREAM_MAXLEN + 5):
+            publish_tenant_event(self.tenant.pk, {'type': 'new_paid_order', 'order': {'id': i}})
+        self.assertEqual(get_redis_connection('default').zcard(f"notif:buffer:{self.tenant.pk}"), STREAM_MAXLEN)
+
+        events, current = replay_events(self.tenant.pk, 2)
+        self.assertIsNone(events)
+        self.assertEqual(current, STREAM_MAXLEN + 5)
+        events, _ = replay_events(self.tenant.pk, 5)
+        self.assertEqual(len(events), STREAM_MAXLEN)
+
+    async def test_reconnecting_client_receives_only_missed_events(self):
+        client = await self._connect()
+        await client.send_json({'action': 'resume', 'last_seq': 0})
+        self.assertEqual(await client.receive_json(), {'type': 'replay_complete', 'seq': 0})
+
+        await self.publish({'type': 'new_paid_order', 'order': {'id': 1}})
+        self.assertEqual((await client.receive_json())['seq'], 1)
+        await client.disconnect()
+
+        # Selama koneksi putus dua order lunas
+        await self.publish({'type': 'new_paid_order', 'order': {'id': 2}})
+        await self.publish({'type': 'new_paid_order', 'order': {'id': 3}})
+
+        client = await self._connect()
+        await client.send_json({'action': 'resume', 'last_seq': 1})
+        replayed = [await client.receive_json() for _ in range(3)]
+        self.assertEqual([event['order']['id'] for event in replayed[:2]], [2, 3])
+        self.assertEqual(replayed[2], {'type': 'replay_complete', 'seq': 3})
+        self.assertTrue(await client.receive_nothing(0.1))
+        await client.disconnect()
+
+    async def test_resume_from_unknown_sequence_requires_resync(self):
+        await self.publish({'type': 'new_paid_order', 'order': {'id': 1}})
+        client = await self._connect()
+        # Nomor urut klien di depan server (mis. Redis di-reset)
+        await client.send_json({'action': 'resume', 'last_seq': 10})
+        self.assertEqual(await client.receive_json(), {'type': 'resync_required', 'seq': 1})
+        await client.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class JWTSocketAuthTests(TransactionTestCase):
+    """Tes: WebSocket tenant diautentikasi access token JWT dan peta keanggotaan yang di-cache."""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Stand JWT", active=True)
+        self.seller = User.objects.create_user(username="seller_jwt", password="x")
+        self.tenant.staff.add(self.seller)
+        cache.delete(f"tenant_membership_{self.seller.pk}")
+        self.token = str(AccessToken.for_user(self.seller))
+        self.path = f"/ws/tenant/{self.tenant.pk}/notifications/"
+        self.application = JWTAuthMiddlewareStack(URLRouter(routing.websocket_urlpatterns))
+
+    async def _connect_and_close(self):
+        client = WebsocketClient(
+            self.path, application=self.application, query_string=f"access_token={self.token}".encode()
+        )
+        self.assertTrue(await client.connect())
+        await client.disconnect()
+
+    def _connect_counting_queries(self):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        # Sinkron: kode database consumer berjalan di thread ini (thread-sensitive)
+        with connection.execute_wrapper(record):
+            async_to_sync(self._connect_and_close)()
+        return queries
+
+    def test_access_token_in_query_string_connects_without_database_when_cached(self):
+        # Cache kosong: peta keanggotaan dimuat sekali dari database
+        self.assertEqual(len(self._connect_counting_queries()), 1)
+        # Reconnect: token diverifikasi tanpa database, keanggotaan dari cache
+        self.assertEqual(self._connect_counting_queries(), [])
+
+    async def test_access_token_in_subprotocol_is_echoed(self):
+        client = WebsocketClient(self.path, application=self.application, subprotocols=['bearer', self.token])
+        self.assertTrue(await client.connect())
+        self.assertEqual(client.accept_message.get('subprotocol'), 'bearer')
+        await client.disconnect()
+
+    async def test_invalid_token_is_rejected(self):
+        client = WebsocketClient(self.path, application=self.application, query_string=b"access_token=bukan-token")
+        self.assertFalse(await client.connect())
+
+    def test_membership_cache_is_invalidated_on_staff_change(self):
+        self.assertEqual(tenant_ids_for_user(self.seller.pk), {self.tenant.pk})
+        other = Tenant.objects.create(name="Stand JWT 2", active=True)
+        self.seller.tenants.add(other)
+        self.assertEqual(tenant_ids_for_user(self.seller.pk), {self.tenant.pk, other.pk})
+        self.tenant.staff.remove(self.seller)
+        self.assertEqual(tenant_ids_for_user(self.seller.pk), {other.pk})
+        other.staff.clear()
+        self.assertEqual(tenant_ids_for_user(self.seller.pk), frozenset())
+
+    async def test_removed_staff_cannot_reconnect(self):
+        await sync_to_async(tenant_ids_for_user)(self.seller.pk)
+        await sync_to_async(self.tenant.staff.remove)(self.seller)
+        client = WebsocketClient(
+            self.path, application=self.application, query_string=f"access_token={self.token}".encode()
+        )
+        self.assertFalse(await client.connect())